@@ -1,19 +1,141 @@
 import os
+import hashlib
+import threading
+import time
+from datetime import date, timedelta
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, Response, abort, jsonify, make_response, send_file
+from markupsafe import Markup, escape
 from functools import wraps
 import database as db
 import config
+import exportacao
+import importacao
+import validacao
+import metricas
+from cache import CacheLRU
+import manutencao
+import tarefas_pdf
+import auditoria
+import senhas
 
 load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY')
+app.teardown_appcontext(db.fechar_conexao)
+# Quando ativado (ex.: em homologação), cada resposta traz o detalhamento de tempo no cabeçalho X-SGA-Tempos
+app.config['METRICAS_CABECALHO'] = os.getenv('METRICAS_CABECALHO') == '1'
+
+# --- INICIALIZAÇÃO DO PROCESSO ---
+# Nada que abra conexões ou inicie threads roda na importação do módulo: um servidor com fork
+# (servidor.py) importa a aplicação no processo mestre e só depois cria os processos de trabalho.
+_pid_iniciado = None
+_lock_inicio = threading.Lock()
+
+def iniciar_processo(manutencao_automatica=None):
+    """
+    Prepara o processo atual para atender requisições: aplica as migrações pendentes (abrindo a
+    primeira conexão do pool), inicia a manutenção automática e pré-compila os templates e as rotas,
+    para que a primeira requisição não pague por isso. servidor.py chama esta função em cada processo
+    depois do fork; em outros servidores ela roda na primeira requisição do processo.
+    """
+    global _pid_iniciado
+    with _lock_inicio:
+        if _pid_iniciado == os.getpid():
+            return
+        with app.app_context():
+            db.inicializar_banco()
+        if config.MANUTENCAO_AUTOMATICA if manutencao_automatica is None else manutencao_automatica:
+            manutencao.iniciar_manutencao_automatica()
+        for nome in app.jinja_env.list_templates():
+            app.jinja_env.get_template(nome)
+        app.url_map.update()
+        _pid_iniciado = os.getpid()
+
+def encerrar_processo():
+    """Para as threads de segundo plano, gravando a auditoria pendente (usada pelo servidor.py)."""
+    manutencao.parar_manutencao_automatica()
+    tarefas_pdf.encerrar()
+    senhas.encerrar()
+    importacao.encerrar()
+    auditoria.encerrar()
+
+@app.before_request
+def garantir_processo_iniciado():
+    if _pid_iniciado != os.getpid():
+        iniciar_processo()
+
+# --- INSTRUMENTAÇÃO ---
+@app.before_request
+def iniciar_metricas():
+    metricas.iniciar_requisicao()
+
+@app.after_request
+def registrar_metricas(response):
+    return metricas.finalizar_requisicao(response, request.endpoint, app.config['METRICAS_CABECALHO'])
+
+@app.route('/metrics')
+def metrics():
+    return Response(metricas.gerar_texto_prometheus(), mimetype='text/plain; version=0.0.4')
+
+# --- CACHE DE PÁGINAS E GET CONDICIONAL ---
+cache_paginas = CacheLRU(config.CACHE_PAGINAS_MAX_BYTES)
+# Muda a cada inicialização, para que um deploy com templates novos não reaproveite ETags antigas
+ASSINATURA_INICIALIZACAO = str(time.time())
+
+def _pagina_com_cache(chave, renderizar):
+    """
+    Serve a página identificada por `chave` (que deve conter a versão dos dados exibidos) com
+    ETag forte: devolve 304 se o navegador já tiver esta versão e, se não, o HTML do cache LRU,
+    renderizando-o só na primeira vez. Com mensagens flash pendentes, a página é sempre renderizada.
+    """
+    if '_flashes' in session:
+        return renderizar()
+    etag = hashlib.sha256(repr((ASSINATURA_INICIALIZACAO,) + chave).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        html = cache_paginas.obter(etag)
+        if html is None:
+            html = renderizar()
+            cache_paginas.guardar(etag, html)
+        resposta = make_response(html)
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+# --- FILTROS DE TEMPLATE ---
+@app.template_filter('destacar')
+def destacar(trecho):
+    """Escapa o trecho da pesquisa e converte os marcadores de destaque em <mark>."""
+    return (escape(trecho or '')
+            .replace(db.MARCA_INICIO, Markup('<mark>'))
+            .replace(db.MARCA_FIM, Markup('</mark>')))
 
 # --- DECORADORES ---
+def _sessao_atualizada():
+    """
+    Confere se os dados do usuário na sessão ainda valem, comparando a geração gravada neles com
+    db.geracao_usuarios(), sem consulta ao banco na maioria das requisições. Se algum usuário mudou
+    (por exemplo, um admin trocou o papel dele), relê o usuário e atualiza a sessão.
+    Retorna False se o usuário não existe mais.
+    """
+    dados = session['dados_usuario']
+    geracao = db.geracao_usuarios()
+    if dados.get('geracao') == geracao:
+        return True
+    usuario = db.buscar_usuario_por_id(dados['id'])
+    if usuario is None:
+        session.pop('dados_usuario', None)
+        return False
+    session['dados_usuario'] = dict(dados, codigo=usuario['codigo'], nome=usuario['nome_completo'],
+                                    role=usuario['role'], geracao=geracao)
+    return True
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'dados_usuario' not in session:
+        if 'dados_usuario' not in session or not _sessao_atualizada():
             flash('Por favor, faça o login para acessar esta página.', 'info')
             return redirect(url_for('login'))
         return f(*args, **kwargs)
@@ -23,7 +145,7 @@ def role_required(*roles):
     def wrapper(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if session['dados_usuario'].get('role') not in roles:
+            if not _sessao_atualizada() or session['dados_usuario'].get('role') not in roles:
                 flash('Você não tem permissão para aceder a esta página.', 'danger')
                 return redirect(url_for('dashboard'))
             return f(*args, **kwargs)
@@ -31,6 +153,12 @@ def role_required(*roles):
     return wrapper
 
 # --- ROTAS DE AUTENTICAÇÃO ---
+@app.errorhandler(senhas.SistemaOcupado)
+def sistema_ocupado(erro):
+    """Pool de cálculo de senhas sobrecarregado fora do login (criação ou troca de senha)."""
+    return Response('Sistema ocupado. Tente novamente em alguns segundos.', 503, {'Retry-After': '5'},
+                    mimetype='text/plain')
+
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -40,9 +168,15 @@ def login():
     if request.method == 'POST':
         codigo = request.form['codigo']
         senha = request.form['senha']
-        dados_usuario = db.verificar_login(codigo, senha)
+        # Lida antes do usuário, para que uma alteração feita no meio do login seja percebida depois
+        geracao = db.geracao_usuarios()
+        try:
+            dados_usuario = db.verificar_login(codigo, senha)
+        except senhas.SistemaOcupado:
+            flash('Muitos acessos ao mesmo tempo. Tente novamente em alguns segundos.', 'danger')
+            return render_template('login.html'), 503, {'Retry-After': '5'}
         if dados_usuario:
-            session['dados_usuario'] = dados_usuario
+            session['dados_usuario'] = dict(dados_usuario, geracao=geracao)
             flash('Login realizado com sucesso!', 'success')
             return redirect(url_for('dashboard'))
         else:
@@ -62,8 +196,75 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    lista_de_casos = db.buscar_casos()
-    return render_template('dashboard.html', casos=lista_de_casos)
+    filtros = {
+        'status': request.args.get('status') or None,
+        'tipo': request.args.get('tipo') or None,
+        'ano': request.args.get('ano', type=int),
+    }
+    usuario = session['dados_usuario']
+
+    def renderizar():
+        pagina = db.buscar_casos_paginados(**filtros, cursor_pagina=request.args.get('apos'),
+                                           limite=config.RELATORIOS_POR_PAGINA)
+        estatisticas = db.buscar_estatisticas_situacao(caso['id'] for caso in pagina['casos'])
+        return render_template('dashboard.html', casos=pagina['casos'], proximo_cursor=pagina['proximo_cursor'],
+                               filtros=filtros, opcoes_status=config.LISTA_STATUS_RELATORIO,
+                               opcoes_tipo=config.LISTA_TIPOS_RELATORIO, estatisticas=estatisticas,
+                               opcoes_situacao=config.LISTA_SITUACAO)
+    chave = ('dashboard', db.buscar_versao_casos(), tuple(sorted(request.args.items())),
+             usuario['id'], usuario['nome'], usuario['role'])
+    return _pagina_com_cache(chave, renderizar)
+
+@app.route('/estatisticas')
+@login_required
+def estatisticas():
+    """Quantidade de atividades por situação, no geral e para os casos pedidos em ?caso_id=1&caso_id=2."""
+    casos_ids = request.args.getlist('caso_id', type=int)
+    dados = db.buscar_estatisticas_situacao(casos_ids)
+    return jsonify({'geral': dados['geral'],
+                    'por_caso': {str(caso_id): contagens for caso_id, contagens in dados['por_caso'].items()}})
+
+@app.route('/pesquisa')
+@login_required
+def pesquisa():
+    termos = request.args.get('q', '').strip()
+    resultados = db.pesquisar(termos) if termos else {'relatorios': [], 'atividades': []}
+    return render_template('pesquisa.html', termos=termos, resultados=resultados)
+
+@app.route('/linha-do-tempo')
+@login_required
+def linha_do_tempo():
+    """
+    Atividades por auditor e tipo ao longo de um intervalo (padrão: mês atual), a partir dos períodos
+    informados nas atividades. Com ?dia=, lista também as atividades que cobriram aquele dia.
+    """
+    hoje = date.today()
+    try:
+        data_de = validacao.normalizar_data(request.args.get('de')) or hoje.replace(day=1).isoformat()
+        data_ate = validacao.normalizar_data(request.args.get('ate')) or \
+            ((date.fromisoformat(data_de).replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)).isoformat()
+        dia = validacao.normalizar_data(request.args.get('dia'))
+    except ValueError:
+        flash('Data inválida. Use AAAA-MM-DD ou DD/MM/AAAA.', 'danger')
+        return redirect(url_for('linha_do_tempo'))
+    if data_de > data_ate:
+        flash("A data 'De' do período não pode ser posterior à data 'Até'.", 'danger')
+        return redirect(url_for('linha_do_tempo'))
+    limite = date.fromisoformat(data_de) + timedelta(days=config.LINHA_DO_TEMPO_MAX_DIAS - 1)
+    if date.fromisoformat(data_ate) > limite:
+        flash(f'A linha do tempo mostra no máximo {config.LINHA_DO_TEMPO_MAX_DIAS} dias por vez.', 'info')
+        data_ate = limite.isoformat()
+    filtros = {
+        'de': data_de, 'ate': data_ate,
+        'auditor': request.args.get('auditor', type=int),
+        'atividade': request.args.get('atividade') or None,
+    }
+    linha = db.buscar_linha_do_tempo(data_de, data_ate, realizado_por_id=filtros['auditor'],
+                                     atividade_desc=filtros['atividade'])
+    atividades_do_dia = db.buscar_atividades_no_periodo(dia, realizado_por_id=filtros['auditor']) if dia else []
+    return render_template('linha_do_tempo.html', linha=linha, filtros=filtros, dia=dia,
+                           atividades_do_dia=atividades_do_dia, usuarios=db.buscar_todos_usuarios(),
+                           opcoes_atividade=config.LISTA_ATIVIDADES)
 
 @app.route('/relatorio/novo', methods=['POST'])
 @login_required
@@ -80,16 +281,25 @@ def novo_relatorio():
 @app.route('/relatorio/<int:id_caso>', methods=['GET'])
 @login_required
 def ver_relatorio(id_caso):
-    dados_caso = db.buscar_caso_por_id(id_caso)
-    lista_atividades = db.buscar_atividades_completas_por_caso_id(id_caso)
-    if not dados_caso:
+    versao = db.buscar_versao_caso(id_caso)
+    if versao is None:
         flash(f'Relatório com ID {id_caso} não encontrado.', 'danger')
         return redirect(url_for('dashboard'))
-    atividade_para_editar = None
     id_atividade_edicao = request.args.get('editar', type=int)
+
+    def renderizar():
+        dados_caso = db.buscar_caso_por_id(id_caso)
+        lista_atividades = db.buscar_atividades_completas_por_caso_id(id_caso)
+        atividade_para_editar = None
+        if id_atividade_edicao:
+            atividade_para_editar = db.buscar_atividade_por_id(id_atividade_edicao)
+        return render_template('relatorio.html', caso=dados_caso, atividades=lista_atividades, atividade_edicao=atividade_para_editar, opcoes_atividade=config.LISTA_ATIVIDADES, opcoes_situacao=config.LISTA_SITUACAO)
     if id_atividade_edicao:
-        atividade_para_editar = db.buscar_atividade_por_id(id_atividade_edicao)
-    return render_template('relatorio.html', caso=dados_caso, atividades=lista_atividades, atividade_edicao=atividade_para_editar, opcoes_atividade=config.LISTA_ATIVIDADES, opcoes_situacao=config.LISTA_SITUACAO)
+        # A versão do caso não cobre a atividade em edição (que pode ser de outro caso): sem cache
+        return renderizar()
+    # A geração dos usuários entra na chave porque a página mostra o nome de quem realizou cada atividade
+    chave = ('relatorio', id_caso, versao, db.geracao_usuarios(), session['dados_usuario']['role'])
+    return _pagina_com_cache(chave, renderizar)
 
 @app.route('/relatorio/deletar/<int:id_caso>', methods=['POST'])
 @login_required
@@ -103,30 +313,113 @@ def deletar_relatorio_rota(id_caso):
     return redirect(url_for('dashboard'))
 
 
+# --- ROTAS DE EXPORTAÇÃO ---
+FORMATOS_EXPORTACAO = {
+    'csv': (exportacao.gerar_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (exportacao.gerar_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+def _resposta_exportacao(formato, nome_arquivo, linhas):
+    """Monta a resposta em streaming (chunked) para o formato pedido."""
+    if formato not in FORMATOS_EXPORTACAO:
+        abort(404)
+    gerador, mimetype = FORMATOS_EXPORTACAO[formato]
+    cabecalho = [titulo for _, titulo in db.COLUNAS_EXPORTACAO]
+    return Response(gerador(cabecalho, linhas), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}.{formato}"'})
+
+@app.route('/relatorio/<int:id_caso>/exportar.<formato>')
+@login_required
+def exportar_relatorio(id_caso, formato):
+    dados_caso = db.buscar_caso_por_id(id_caso)
+    if not dados_caso:
+        flash(f'Relatório com ID {id_caso} não encontrado.', 'danger')
+        return redirect(url_for('dashboard'))
+    nome_arquivo = f"relatorio_{dados_caso['numero_relatorio'] or id_caso}"
+    return _resposta_exportacao(formato, nome_arquivo, db.iterar_atividades_para_exportacao(id_caso=id_caso))
+
+@app.route('/relatorios/exportar.<formato>')
+@login_required
+def exportar_periodo(formato):
+    data_de = request.args.get('de')
+    data_ate = request.args.get('ate')
+    if data_de and data_ate and data_de > data_ate:
+        flash("A data 'De' do período não pode ser posterior à data 'Até'.", 'danger')
+        return redirect(url_for('dashboard'))
+    nome_arquivo = f"atividades_{data_de or 'inicio'}_{data_ate or 'hoje'}"
+    return _resposta_exportacao(formato, nome_arquivo,
+                                db.iterar_atividades_para_exportacao(data_de=data_de, data_ate=data_ate))
+
+
+# --- ROTAS DE PDF ---
+# O PDF é gerado em segundo plano (tarefas_pdf.py): a página pede a geração, acompanha o status
+# e baixa o arquivo quando a tarefa for concluída.
+def _tarefa_pdf_json(tarefa):
+    return {
+        'tarefa': tarefa['id'], 'status': tarefa['status'], 'erro': tarefa['erro'],
+        'url_status': url_for('status_pdf', id_tarefa=tarefa['id']),
+        'url_download': url_for('baixar_pdf', id_tarefa=tarefa['id']) if tarefa['status'] == 'CONCLUIDA' else None,
+    }
+
+@app.route('/relatorio/<int:id_caso>/pdf', methods=['POST'])
+@login_required
+def solicitar_pdf(id_caso):
+    tarefa = tarefas_pdf.solicitar(id_caso)
+    if tarefa is None:
+        return jsonify({'erro': f'Relatório com ID {id_caso} não encontrado.'}), 404
+    return jsonify(_tarefa_pdf_json(tarefa)), (200 if tarefa['status'] == 'CONCLUIDA' else 202)
+
+@app.route('/pdf/<int:id_tarefa>')
+@login_required
+def status_pdf(id_tarefa):
+    tarefa = db.buscar_tarefa_pdf(id_tarefa)
+    if tarefa is None:
+        abort(404)
+    return jsonify(_tarefa_pdf_json(tarefa))
+
+@app.route('/pdf/<int:id_tarefa>/download')
+@login_required
+def baixar_pdf(id_tarefa):
+    tarefa = db.buscar_tarefa_pdf(id_tarefa)
+    if tarefa is None or tarefa['status'] != 'CONCLUIDA' or not os.path.exists(tarefas_pdf.caminho_pdf(tarefa)):
+        abort(404)
+    caso = db.buscar_caso_por_id(tarefa['caso_id'])
+    nome = (caso and caso['numero_relatorio']) or tarefa['caso_id']
+    return send_file(os.path.abspath(tarefas_pdf.caminho_pdf(tarefa)), mimetype='application/pdf',
+                     as_attachment=True, download_name=f"relatorio_{nome}.pdf")
+
+
 # --- ROTAS PARA GERENCIAR ATIVIDADES ---
+MENSAGEM_ARQUIVADO = 'Este relatório está arquivado e não pode mais ser alterado.'
+
+def _caso_arquivado(id_caso):
+    """Relatórios arquivados são somente leitura (ver db.arquivar_casos_antigos)."""
+    caso = db.buscar_caso_por_id(id_caso)
+    return bool(caso and caso['arquivado'])
+
+def _dados_atividade(origem):
+    """Campos editáveis da atividade vindos do formulário (ou de um corpo JSON); ausentes ou nulos viram ''."""
+    dados = {campo: origem.get(campo) for campo in db.CAMPOS_EDITAVEIS_ATIVIDADE}
+    return {campo: '' if valor is None else valor for campo, valor in dados.items()}
+
+def _completar_nova_atividade(dados, id_caso):
+    dados.update({
+        "caso_id": id_caso,
+        "realizado_por_id": session['dados_usuario']['id'],
+        "data_registro": db.date.today().strftime("%Y-%m-%d"),
+        "nao_conformidade": "", "reincidente": 0, "recomendacao": "", "data_p_solucao": ""
+    })
+    return dados
+
 @app.route('/relatorio/<int:id_caso>/atividade/salvar', methods=['POST'])
 @login_required
 def salvar_atividade_rota(id_caso):
+    if _caso_arquivado(id_caso):
+        flash(MENSAGEM_ARQUIVADO, 'danger')
+        return redirect(url_for('ver_relatorio', id_caso=id_caso))
     id_atividade = request.form.get('id_atividade')
-    dados = {
-        "atividade_desc": request.form.get('atividade_desc'),
-        "testes_realizados": request.form.get('testes_realizados'),
-        "extensao_exames": request.form.get('extensao_exames'),
-        "criterio_amostragem": request.form.get('criterio_amostragem'),
-        "periodo_inicio": request.form.get('periodo_inicio'),
-        "periodo_fim": request.form.get('periodo_fim'),
-        "situacao": request.form.get('situacao'),
-        "observacao_resumo": request.form.get('observacao_resumo')
-    }
-    erros = []
-    if not dados.get('atividade_desc'):
-        erros.append("O campo 'Atividade' é obrigatório.")
-    if not dados.get('situacao'):
-        erros.append("O campo 'Situação da Atividade' é obrigatório.")
-    inicio = dados.get('periodo_inicio')
-    fim = dados.get('periodo_fim')
-    if inicio and fim and inicio > fim:
-        erros.append("A data 'De' do período não pode ser posterior à data 'Até'.")
+    dados = _dados_atividade(request.form)
+    erros = validacao.validar_atividade(dados)
     if erros:
         for erro in erros:
             flash(erro, 'danger')
@@ -137,13 +430,7 @@ def salvar_atividade_rota(id_caso):
         if sucesso:
             flash('Atividade atualizada com sucesso!', 'success')
     else:
-        dados.update({
-            "caso_id": id_caso,
-            "realizado_por_id": session['dados_usuario']['id'],
-            "data_registro": db.date.today().strftime("%Y-%m-%d"),
-            "nao_conformidade": "", "reincidente": 0, "recomendacao": "", "data_p_solucao": ""
-        })
-        sucesso = db.salvar_atividade(dados)
+        sucesso = db.salvar_atividade(_completar_nova_atividade(dados, id_caso))
         if sucesso:
             flash('Nova atividade adicionada com sucesso!', 'success')
     if not sucesso:
@@ -154,13 +441,144 @@ def salvar_atividade_rota(id_caso):
 @login_required
 def deletar_atividade_rota(id_atividade):
     id_caso = request.form.get('id_caso')
-    if db.deletar_atividade_por_id(id_atividade):
+    atividade = db.buscar_atividade_por_id(id_atividade)
+    if atividade and atividade['arquivado']:
+        flash(MENSAGEM_ARQUIVADO, 'danger')
+    elif db.deletar_atividade_por_id(id_atividade):
         flash(f'Atividade ID {id_atividade} deletada com sucesso.', 'success')
     else:
         flash(f'Erro ao deletar a atividade ID {id_atividade}.', 'danger')
     return redirect(url_for('ver_relatorio', id_caso=id_caso))
 
 
+# --- FRAGMENTOS DE ATIVIDADES ---
+# Usados pelo JavaScript de relatorio.html para criar, editar e excluir uma atividade sem
+# recarregar o relatório inteiro: devolvem só a linha da tabela ou o formulário (HTML) ou,
+# se o cliente pedir application/json, a atividade em JSON.
+def _quer_json():
+    return request.is_json or request.accept_mimetypes.best == 'application/json'
+
+def _corpo_fragmento():
+    return (request.get_json(silent=True) or {}) if request.is_json else request.form
+
+def _erro_fragmento(mensagens, status):
+    if _quer_json():
+        return jsonify({'erros': mensagens}), status
+    return render_template('_erros.html', erros=mensagens), status
+
+def _resposta_linha(id_caso, id_atividade, status):
+    atividade = db.buscar_atividade_completa_por_id(id_atividade)
+    if _quer_json():
+        return jsonify(atividade), status
+    return render_template('_linha_atividade.html', ativ=atividade, caso={'id': id_caso, 'arquivado': False}), status
+
+@app.route('/relatorio/<int:id_caso>/atividades', methods=['POST'])
+@login_required
+def criar_atividade_fragmento(id_caso):
+    dados = _dados_atividade(_corpo_fragmento())
+    erros = validacao.validar_atividade(dados)
+    if erros:
+        return _erro_fragmento(erros, 400)
+    try:
+        id_atividade = db.salvar_atividade(_completar_nova_atividade(dados, id_caso))
+    except db.sqlite3.IntegrityError:
+        # A chave estrangeira só aceita casos do banco ativo: inexistente ou arquivado
+        return _erro_fragmento([f'Relatório com ID {id_caso} não encontrado ou arquivado.'], 404)
+    return _resposta_linha(id_caso, id_atividade, 201)
+
+@app.route('/relatorio/<int:id_caso>/atividades/<int:id_atividade>', methods=['POST', 'PUT'])
+@login_required
+def atualizar_atividade_fragmento(id_caso, id_atividade):
+    dados = _dados_atividade(_corpo_fragmento())
+    erros = validacao.validar_atividade(dados)
+    if erros:
+        return _erro_fragmento(erros, 400)
+    if not db.atualizar_atividade(id_atividade, dados, caso_id=id_caso):
+        return _erro_fragmento([f'Atividade ID {id_atividade} não encontrada neste relatório ou arquivada.'], 404)
+    return _resposta_linha(id_caso, id_atividade, 200)
+
+@app.route('/relatorio/<int:id_caso>/atividades/<int:id_atividade>', methods=['DELETE'])
+@login_required
+def deletar_atividade_fragmento(id_caso, id_atividade):
+    if not db.deletar_atividade_por_id(id_atividade, caso_id=id_caso):
+        return _erro_fragmento([f'Atividade ID {id_atividade} não encontrada neste relatório ou arquivada.'], 404)
+    return ('', 204)
+
+@app.route('/relatorio/<int:id_caso>/atividades/formulario')
+@app.route('/relatorio/<int:id_caso>/atividades/<int:id_atividade>/formulario')
+@login_required
+def formulario_atividade_fragmento(id_caso, id_atividade=None):
+    atividade = None
+    if id_atividade is not None:
+        atividade = db.buscar_atividade_por_id(id_atividade)
+        if not atividade or atividade['caso_id'] != id_caso or atividade['arquivado']:
+            return _erro_fragmento([f'Atividade ID {id_atividade} não encontrada neste relatório ou arquivada.'], 404)
+    return render_template('_formulario_atividade.html', caso={'id': id_caso, 'arquivado': False},
+                           atividade_edicao=atividade, opcoes_atividade=config.LISTA_ATIVIDADES,
+                           opcoes_situacao=config.LISTA_SITUACAO)
+
+
+# --- ROTAS DE IMPORTAÇÃO EM LOTE ---
+# Aceitam um arquivo .csv/.json enviado pelo formulário (campo "arquivo") ou um corpo JSON com a
+# lista de registros; neste caso, a resposta também é JSON.
+MAX_ERROS_EXIBIDOS = 20
+
+def _registros_da_requisicao():
+    if request.is_json:
+        return importacao.normalizar_registros(request.get_json(silent=True))
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        raise ValueError("Selecione um arquivo .csv ou .json para importar.")
+    return importacao.ler_registros(arquivo.filename, arquivo.read())
+
+def _resposta_importacao(inseridos, erros, destino):
+    if request.is_json:
+        corpo = {'inseridos': inseridos, 'erros': [{'linha': linha, 'mensagens': msgs} for linha, msgs in erros]}
+        return jsonify(corpo), (400 if erros else 200)
+    erros_de_linha = [(linha, msgs) for linha, msgs in erros if linha]
+    if erros_de_linha:
+        flash(f'Importação cancelada: {len(erros_de_linha)} linha(s) com erro. Nenhum registro foi gravado.', 'danger')
+        for linha, mensagens in erros_de_linha[:MAX_ERROS_EXIBIDOS]:
+            flash(f'Linha {linha}: {" ".join(mensagens)}', 'danger')
+    elif erros:
+        # Erros sem linha (linha 0) dizem respeito à requisição ou ao arquivo como um todo
+        for _, mensagens in erros:
+            flash(f'Importação cancelada: {" ".join(mensagens)}', 'danger')
+    elif inseridos:
+        flash(f'{inseridos} registro(s) importado(s) com sucesso!', 'success')
+    else:
+        flash('O arquivo não contém registros.', 'info')
+    return redirect(destino)
+
+@app.route('/relatorio/<int:id_caso>/atividades/importar', methods=['POST'])
+@login_required
+def importar_atividades_rota(id_caso):
+    destino = url_for('ver_relatorio', id_caso=id_caso)
+    caso = db.buscar_caso_por_id(id_caso)
+    if not caso:
+        return _resposta_importacao(0, [(0, [f'Relatório com ID {id_caso} não encontrado.'])], url_for('dashboard'))
+    if caso['arquivado']:
+        return _resposta_importacao(0, [(0, [MENSAGEM_ARQUIVADO])], destino)
+    try:
+        registros = _registros_da_requisicao()
+    except ValueError as e:
+        return _resposta_importacao(0, [(0, [str(e)])], destino)
+    inseridos, erros = importacao.importar_atividades(id_caso, registros, session['dados_usuario']['id'])
+    return _resposta_importacao(inseridos, erros, destino)
+
+@app.route('/admin/usuarios/importar', methods=['POST'])
+@login_required
+@role_required('Admin')
+def importar_usuarios_rota():
+    destino = url_for('gestao_usuarios')
+    try:
+        registros = _registros_da_requisicao()
+    except ValueError as e:
+        return _resposta_importacao(0, [(0, [str(e)])], destino)
+    inseridos, erros = importacao.importar_usuarios(registros)
+    return _resposta_importacao(inseridos, erros, destino)
+
+
 # --- ROTAS DE ADMINISTRAÇÃO ---
 @app.route('/admin/usuarios')
 @login_required
@@ -174,19 +592,14 @@ def gestao_usuarios():
 @role_required('Admin')
 def criar_usuario():
     if request.method == 'POST':
-        codigo = request.form.get('codigo', '').strip().upper()
-        nome = request.form.get('nome_completo', '').strip().upper()
-        senha = request.form.get('senha')
-        role = request.form.get('role')
-        username = ""
-        if nome:
-            partes_nome = nome.lower().split()
-            primeiro_nome = partes_nome[0]
-            username = f"{primeiro_nome}.{partes_nome[-1]}" if len(partes_nome) > 1 else primeiro_nome
-        if not all([codigo, nome, senha, role]):
-            flash('Todos os campos são obrigatórios.', 'danger')
+        dados, erros = validacao.preparar_usuario(request.form.get('codigo'), request.form.get('nome_completo'),
+                                                  request.form.get('senha'), request.form.get('role'))
+        if erros:
+            for erro in erros:
+                flash(erro, 'danger')
             return redirect(url_for('criar_usuario'))
-        sucesso = db.adicionar_usuario(codigo, nome, username, senha, role)
+        codigo, username = dados['codigo'], dados['username']
+        sucesso = db.adicionar_usuario(codigo, dados['nome_completo'], username, dados['senha'], dados['role'])
         if sucesso:
             flash(f'Usuário "{username}" criado com sucesso!', 'success')
             return redirect(url_for('gestao_usuarios'))
@@ -0,0 +1,124 @@
+"""
+Trilha de auditoria com gravação em segundo plano (write-behind).
+
+As funções de database.py que alteram dados chamam `registrar_evento` depois do COMMIT; o evento
+entra em uma fila em memória e a requisição segue sem esperar. Uma thread gravadora esvazia a
+fila em lotes, cada lote em uma única transação na tabela log_auditoria. Se a fila encher, os
+novos eventos são descartados (e contados em /metrics) em vez de atrasar as requisições.
+Os eventos pendentes são gravados no encerramento do processo (ver `encerrar`).
+"""
+import atexit
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from flask import has_request_context, session
+import database as db
+import metricas
+
+# Eventos aguardando gravação; acima disso, novos eventos são descartados
+FILA_MAX_EVENTOS = 10_000
+# Maior lote gravado em uma transação e tempo máximo que um evento espera por companhia no lote
+LOTE_MAX_EVENTOS = 500
+ESPERA_LOTE_SEGUNDOS = 0.5
+
+_fila = queue.Queue(maxsize=FILA_MAX_EVENTOS)
+_lock = threading.Lock()
+_thread_gravadora = None
+
+EVENTOS_DESCARTADOS = metricas.registrar(metricas.Contador(
+    "sga_auditoria_eventos_descartados_total", "Eventos de auditoria descartados (fila cheia ou erro na gravação)."))
+EVENTOS_GRAVADOS = metricas.registrar(metricas.Contador(
+    "sga_auditoria_eventos_gravados_total", "Eventos de auditoria gravados no banco."))
+metricas.registrar(metricas.Medidor(
+    "sga_auditoria_fila_eventos", "Eventos de auditoria aguardando gravação.", _fila.qsize))
+
+def _usuario_atual():
+    if has_request_context():
+        dados = session.get('dados_usuario') or {}
+        return dados.get('codigo'), dados.get('nome')
+    return None, None
+
+def registrar_evento(tabela, registro_id, acao, antes=None, depois=None):
+    """
+    Enfileira um evento de auditoria (acao: 'UPDATE' ou 'DELETE'; antes/depois: dicts ou None).
+    Retorna False se o evento foi descartado por a fila estar cheia.
+    """
+    usuario_codigo, usuario_nome = _usuario_atual()
+    evento = (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), tabela, registro_id, acao, usuario_codigo, usuario_nome,
+              json.dumps(antes, ensure_ascii=False) if antes is not None else None,
+              json.dumps(depois, ensure_ascii=False) if depois is not None else None)
+    _iniciar_gravadora()
+    try:
+        _fila.put_nowait(evento)
+        return True
+    except queue.Full:
+        EVENTOS_DESCARTADOS.incrementar(motivo="fila_cheia")
+        return False
+
+def _coletar_lote(parar):
+    """Espera o primeiro evento e junta outros que cheguem em até ESPERA_LOTE_SEGUNDOS."""
+    try:
+        lote = [_fila.get(timeout=ESPERA_LOTE_SEGUNDOS)]
+    except queue.Empty:
+        return []
+    limite = time.monotonic() + ESPERA_LOTE_SEGUNDOS
+    while len(lote) < LOTE_MAX_EVENTOS:
+        restante = 0 if parar.is_set() else limite - time.monotonic()
+        try:
+            lote.append(_fila.get(timeout=restante) if restante > 0 else _fila.get_nowait())
+        except queue.Empty:
+            break
+    return lote
+
+def _gravar(lote):
+    try:
+        db.gravar_eventos_auditoria(lote)
+        EVENTOS_GRAVADOS.incrementar(len(lote))
+    except Exception as e:
+        print(f"Erro ao gravar {len(lote)} evento(s) de auditoria: {e}")
+        EVENTOS_DESCARTADOS.incrementar(len(lote), motivo="erro_gravacao")
+
+def _laco_gravacao(parar):
+    while not (parar.is_set() and _fila.empty()):
+        lote = _coletar_lote(parar)
+        if lote:
+            _gravar(lote)
+
+def _iniciar_gravadora():
+    """Inicia a thread gravadora no primeiro evento do processo."""
+    global _thread_gravadora
+    if _thread_gravadora is not None:
+        return
+    with _lock:
+        if _thread_gravadora is None:
+            parar = threading.Event()
+            thread = threading.Thread(target=_laco_gravacao, args=(parar,), name="auditoria-sga", daemon=True)
+            thread.parar = parar
+            thread.start()
+            _thread_gravadora = thread
+
+def descarregar():
+    """Grava imediatamente, na thread atual, os eventos que estiverem na fila."""
+    while True:
+        lote = []
+        while len(lote) < LOTE_MAX_EVENTOS:
+            try:
+                lote.append(_fila.get_nowait())
+            except queue.Empty:
+                break
+        if not lote:
+            return
+        _gravar(lote)
+
+@atexit.register
+def encerrar(tempo_limite=5):
+    """Para a thread gravadora, esperando que ela esvazie a fila, e grava o que restar."""
+    global _thread_gravadora
+    with _lock:
+        thread, _thread_gravadora = _thread_gravadora, None
+    if thread is not None:
+        thread.parar.set()
+        thread.join(tempo_limite)
+    descarregar()
@@ -0,0 +1,198 @@
+"""
+Benchmark das rotas principais usando o test client do Flask.
+
+Uso:
+    python dados_sinteticos.py bench.db
+    python benchmark.py bench.db --concorrencia 8 --requisicoes 500 --salvar-baseline baseline.json
+    python benchmark.py bench.db --concorrencia 8 --requisicoes 500 --baseline baseline.json --tolerancia 0.2
+    python benchmark.py bench.db --cenarios login --concorrencia 64 --requisicoes 640   # rajada de logins
+    python benchmark.py bench.db --cenarios dashboard_frio,dashboard_quente
+
+Para cada cenário, mede p50/p95/p99 da latência e a vazão (requisições por segundo). As threads
+começam juntas, como numa troca de turno; "recusadas" conta as respostas 503 (pool de senhas
+cheio, ver senhas.py), que também entram em "erros".
+O dashboard é medido duas vezes, com filtros sorteados a cada requisição: dashboard_frio com o cache
+de páginas desligado (sempre renderiza) e dashboard_quente com o cache já preenchido para todas
+as combinações de filtros (mede os acertos do cache).
+Com --baseline, termina com código 1 se o p95 de algum cenário piorar, ou a vazão cair,
+mais do que a tolerância em relação ao baseline salvo.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import config
+import database as db
+
+def _percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, max(0, round(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+class Cenario:
+    """
+    Uma rota a ser medida. `requisicao(cliente, rng)` faz a chamada e devolve a resposta; com
+    `cache_paginas=False`, o cache de páginas fica desligado durante o cenário e, com `aquecer`,
+    `aquecer(cliente)` é chamado antes da medição.
+    """
+    def __init__(self, nome, requisicao, precisa_login=True, cache_paginas=True, aquecer=None):
+        self.nome, self.requisicao, self.precisa_login = nome, requisicao, precisa_login
+        self.cache_paginas, self.aquecer = cache_paginas, aquecer
+
+def _cenarios(total_casos, total_usuarios, senha, anos):
+    # Todas as combinações de filtros do dashboard (status e ano; "" = todos)
+    filtros_dashboard = [{'status': status, 'ano': ano}
+                         for status in [''] + config.LISTA_STATUS_RELATORIO for ano in [''] + anos]
+
+    def login(cliente, rng):
+        return cliente.post('/login', data={'codigo': f"B{rng.randint(1, total_usuarios):04d}", 'senha': senha})
+
+    def dashboard(cliente, rng):
+        return cliente.get('/dashboard', query_string=rng.choice(filtros_dashboard))
+
+    def aquecer_dashboard(cliente):
+        for filtros in filtros_dashboard:
+            cliente.get('/dashboard', query_string=filtros)
+
+    def ver_relatorio(cliente, rng):
+        return cliente.get(f'/relatorio/{rng.randint(1, total_casos)}')
+
+    def salvar_atividade(cliente, rng):
+        return cliente.post(f'/relatorio/{rng.randint(1, total_casos)}/atividade/salvar', data={
+            'atividade_desc': 'Coleta de amostras para classificação', 'situacao': 'ABERTO',
+            'testes_realizados': 'Benchmark', 'periodo_inicio': '2025-01-01', 'periodo_fim': '2025-01-02',
+        })
+
+    return {
+        'login': Cenario('login', login, precisa_login=False),
+        'dashboard_frio': Cenario('dashboard_frio', dashboard, cache_paginas=False),
+        'dashboard_quente': Cenario('dashboard_quente', dashboard, aquecer=aquecer_dashboard),
+        'ver_relatorio': Cenario('ver_relatorio', ver_relatorio),
+        'salvar_atividade_rota': Cenario('salvar_atividade_rota', salvar_atividade),
+    }
+
+def executar_cenario(app, cenario, concorrencia, requisicoes, senha, semente=0):
+    """Dispara `requisicoes` chamadas divididas entre `concorrencia` threads e devolve as estatísticas."""
+    from app import cache_paginas
+    limite_cache = cache_paginas.max_bytes
+    cache_paginas.limpar()
+    if not cenario.cache_paginas:
+        cache_paginas.max_bytes = 0
+    try:
+        return _medir(app, cenario, concorrencia, requisicoes, senha, semente)
+    finally:
+        cache_paginas.max_bytes = limite_cache
+
+def _medir(app, cenario, concorrencia, requisicoes, senha, semente):
+    latencias, erros, recusadas = [], [], []
+    lock = threading.Lock()
+    largada = threading.Barrier(concorrencia)
+    por_thread = [requisicoes // concorrencia + (1 if i < requisicoes % concorrencia else 0)
+                  for i in range(concorrencia)]
+
+    if cenario.aquecer:
+        cliente = app.test_client()
+        cliente.post('/login', data={'codigo': 'B0001', 'senha': senha})
+        cenario.aquecer(cliente)
+
+    def trabalhador(indice):
+        rng = random.Random(semente * 1000 + indice)
+        cliente = app.test_client()
+        if cenario.precisa_login:
+            cliente.post('/login', data={'codigo': 'B0001', 'senha': senha})
+        locais, erros_locais, recusadas_locais = [], 0, 0
+        largada.wait()
+        for _ in range(por_thread[indice]):
+            inicio = time.perf_counter()
+            resposta = cenario.requisicao(cliente, rng)
+            locais.append(time.perf_counter() - inicio)
+            if resposta.status_code >= 400:
+                erros_locais += 1
+            if resposta.status_code == 503:
+                recusadas_locais += 1
+        with lock:
+            latencias.extend(locais)
+            erros.append(erros_locais)
+            recusadas.append(recusadas_locais)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        list(executor.map(trabalhador, range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        'requisicoes': len(latencias),
+        'erros': sum(erros),
+        'recusadas': sum(recusadas),
+        'p50_ms': _percentil(latencias, 50) * 1000,
+        'p95_ms': _percentil(latencias, 95) * 1000,
+        'p99_ms': _percentil(latencias, 99) * 1000,
+        'vazao_rps': len(latencias) / duracao if duracao else 0.0,
+    }
+
+def comparar_com_baseline(resultados, baseline, tolerancia):
+    """Devolve a lista de regressões (mensagens) em relação ao baseline."""
+    regressoes = []
+    for nome, atual in resultados.items():
+        anterior = baseline.get(nome)
+        if not anterior:
+            continue
+        if atual['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia):
+            regressoes.append(f"{nome}: p95 {atual['p95_ms']:.1f} ms > baseline {anterior['p95_ms']:.1f} ms")
+        if atual['vazao_rps'] < anterior['vazao_rps'] * (1 - tolerancia):
+            regressoes.append(f"{nome}: vazão {atual['vazao_rps']:.1f} req/s < baseline {anterior['vazao_rps']:.1f} req/s")
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das rotas do SGA com o test client do Flask.")
+    parser.add_argument("banco", help="banco gerado por dados_sinteticos.py")
+    parser.add_argument("--concorrencia", type=int, default=4)
+    parser.add_argument("--requisicoes", type=int, default=200, help="requisições por cenário")
+    parser.add_argument("--cenarios", default="login,dashboard_frio,dashboard_quente,ver_relatorio,salvar_atividade_rota")
+    parser.add_argument("--senha", default="senha123")
+    parser.add_argument("--baseline", help="arquivo JSON com o baseline a comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="piora máxima aceita (0.2 = 20%%)")
+    parser.add_argument("--salvar-baseline", help="grava os resultados como novo baseline neste arquivo")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.banco):
+        parser.error(f"banco {args.banco} não encontrado; gere-o com dados_sinteticos.py")
+    # Precisa ser definido antes da primeira requisição, que inicializa o banco (app.iniciar_processo)
+    db.DB_NAME = args.banco
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    from app import app
+
+    with sqlite3.connect(args.banco) as conn:
+        total_casos, total_usuarios = conn.execute(
+            "SELECT (SELECT MAX(id) FROM casos), (SELECT COUNT(*) FROM usuarios)").fetchone()
+        anos = [ano for (ano,) in conn.execute("SELECT DISTINCT substr(data_inicio, 1, 4) FROM casos ORDER BY 1")]
+    cenarios = _cenarios(total_casos or 1, total_usuarios or 1, args.senha, anos)
+    resultados = {}
+    print(f"{'cenário':<24}{'req':>7}{'erros':>7}{'503':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for nome in args.cenarios.split(','):
+        r = executar_cenario(app, cenarios[nome.strip()], args.concorrencia, args.requisicoes, args.senha)
+        resultados[nome.strip()] = r
+        print(f"{nome:<24}{r['requisicoes']:>7}{r['erros']:>7}{r['recusadas']:>7}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['vazao_rps']:>10.1f}")
+
+    if args.salvar_baseline:
+        with open(args.salvar_baseline, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultados, arquivo, indent=2)
+        print(f"Baseline salvo em {args.salvar_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as arquivo:
+            regressoes = comparar_com_baseline(resultados, json.load(arquivo), args.tolerancia)
+        for regressao in regressoes:
+            print(f"REGRESSÃO {regressao}")
+        if regressoes:
+            sys.exit(1)
+        print("Sem regressões em relação ao baseline.")
+
+if __name__ == '__main__':
+    main()
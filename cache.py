@@ -0,0 +1,81 @@
+"""
+Caches em memória, locais a cada processo e seguros para uso entre threads.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+class CacheLRU:
+    """
+    Cache LRU limitado pelo tamanho total dos valores em bytes (texto é contado em UTF-8).
+    Ao ultrapassar o limite, descarta as entradas usadas há mais tempo.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._itens = OrderedDict()  # chave -> (valor, tamanho em bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.acertos = self.falhas = 0
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return item[0]
+
+    def guardar(self, chave, valor):
+        tamanho = len(valor.encode()) if isinstance(valor, str) else len(valor)
+        if tamanho > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._itens.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= anterior[1]
+            self._itens[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            while self._bytes > self.max_bytes:
+                _, (_, tamanho_descartado) = self._itens.popitem(last=False)
+                self._bytes -= tamanho_descartado
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+class CacheTTL:
+    """
+    Cache em que cada valor expira `ttl` segundos depois de guardado. Não limita o número de
+    entradas: serve para conjuntos pequenos e conhecidos, como os usuários.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._itens = {}
+        self._lock = threading.Lock()
+        self.acertos = self.falhas = 0
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or item[0] < time.monotonic():
+                self.falhas += 1
+                return None
+            self.acertos += 1
+            return item[1]
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
@@ -12,6 +12,56 @@ LISTA_ATIVIDADES = [
 # Lista de opções para o dropdown de situação das atividades
 LISTA_SITUACAO = ["ABERTO", "FINALIZADO", "AGUARD. JUSTIF.", "PENDENTE"]
 
+# Lista de opções para os filtros de relatórios no dashboard
+LISTA_STATUS_RELATORIO = ["PLANEJADO", "ABERTO", "FINALIZADO"]
+LISTA_TIPOS_RELATORIO = ["Auditoria"]
+
+# Quantidade de relatórios exibidos por página no dashboard
+RELATORIOS_POR_PAGINA = 50
+
+# Limite de memória (por processo) do cache de páginas renderizadas
+CACHE_PAGINAS_MAX_BYTES = 32 * 1024 * 1024
+
+# Manutenção automática em segundo plano: remove atividades órfãs e devolve ao disco o espaço
+# liberado por exclusões (requer auto_vacuum=INCREMENTAL; ver manutencao.py)
+MANUTENCAO_AUTOMATICA = True
+MANUTENCAO_INTERVALO_SEGUNDOS = 3600
+
+# Relatórios FINALIZADOS há mais do que isto (em dias) são movidos para o banco de arquivo
+# (somente leitura), mantendo o banco ativo pequeno. Desativado por padrão (None): defina um número
+# de dias para a manutenção automática arquivar, ou use `python manutencao.py arquivar --idade-dias N`.
+ARQUIVAMENTO_IDADE_DIAS = None
+
+# Tempo máximo, em segundos, que cada processo guarda os dados de usuários em cache e até que
+# perceba uma alteração feita por outro processo (as do próprio processo valem na hora)
+USUARIOS_CACHE_TTL_SEGUNDOS = 30
+
+# Cópias de segurança online (ver manutencao.py): feitas pela manutenção automática quando a mais
+# recente tiver mais de BACKUP_INTERVALO_HORAS (None desativa), mantendo as BACKUP_MANTER últimas.
+# A cópia lê BACKUP_PAGINAS_POR_PASSO páginas por vez, com uma pausa entre os passos.
+BACKUP_INTERVALO_HORAS = 24
+BACKUP_MANTER = 7
+BACKUP_PAGINAS_POR_PASSO = 256
+BACKUP_PAUSA_SEGUNDOS = 0.01
+
+# Maior intervalo, em dias, exibido de uma vez na linha do tempo das atividades
+LINHA_DO_TEMPO_MAX_DIAS = 62
+
+# Servidor de produção (servidor.py): processos de trabalho, threads por processo e tempo máximo,
+# em segundos, para as requisições em andamento terminarem no encerramento
+SERVIDOR_PROCESSOS = 4
+SERVIDOR_THREADS = 8
+SERVIDOR_TEMPO_ENCERRAMENTO = 30
+
+# Cálculo dos hashes de senha (ver senhas.py): threads por processo, cálculos que podem aguardar
+# na fila e espera máxima na fila, em segundos, antes de o login responder "sistema ocupado"
+SENHAS_TRABALHADORES = 2
+SENHAS_FILA_MAX = 32
+SENHAS_ESPERA_MAX_SEGUNDOS = 5
+
+# Threads (por processo) que geram os PDFs dos relatórios em segundo plano (ver tarefas_pdf.py)
+PDF_TRABALHADORES = 2
+
 # Lista de opções para o dropdown de níveis de acesso de usuários
 LISTA_NIVEIS_ACESSO = ["Junior", "Pleno", "Senior", "Manager", "Admin"]
 
@@ -0,0 +1,122 @@
+"""
+Gerador reprodutível de dados sintéticos na escala de produção, para benchmarks.
+
+Uso:
+    python dados_sinteticos.py bench.db                       # 20 mil casos, 2 milhões de atividades, 500 usuários
+    python dados_sinteticos.py bench.db --casos 2000 --atividades 200000 --usuarios 50
+
+Todos os usuários gerados têm a senha SENHA_PADRAO; o primeiro (código B0001) é Admin.
+A mesma semente sempre gera o mesmo banco.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+import config
+import database as db
+import migracoes
+
+SENHA_PADRAO = "senha123"
+LOTE = 50_000
+
+_PALAVRAS = (
+    "verificação coleta amostras veículos caminhões pesagem balança tíquete portaria registro "
+    "moega formulários divergência tara classificação umidade impureza terceiros descarga "
+    "conferência lacre nota fiscal romaneio controle procedimento irregularidade conformidade"
+).split()
+
+def _texto(rng, minimo, maximo):
+    return " ".join(rng.choices(_PALAVRAS, k=rng.randint(minimo, maximo))).capitalize() + "."
+
+def _codigo_usuario(i):
+    return f"B{i:04d}"
+
+def gerar(caminho, casos=20_000, atividades=2_000_000, usuarios=500, semente=42, anos=5):
+    """Cria (ou recria) o banco em `caminho` com os volumes pedidos."""
+    if os.path.exists(caminho):
+        os.remove(caminho)
+    rng = random.Random(semente)
+    conn = sqlite3.connect(caminho)
+    migracoes.aplicar_migracoes(conn)
+    # Durabilidade é irrelevante para um banco descartável; isto só acelera a carga
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    cursor = conn.cursor()
+
+    inicio = time.perf_counter()
+    senha_hash = db.gerar_hash_senha(SENHA_PADRAO)
+    cursor.executemany(
+        "INSERT INTO usuarios (codigo, nome_completo, username, password_hash, role) VALUES (?, ?, ?, ?, ?)",
+        ((_codigo_usuario(i), f"AUDITOR SINTETICO {i:04d}", f"auditor.{i:04d}", senha_hash,
+          "Admin" if i == 1 else rng.choice(config.LISTA_ROLES))
+         for i in range(1, usuarios + 1)))
+    conn.commit()
+
+    hoje = date.today()
+    primeiro_dia = date(hoje.year - anos + 1, 1, 1)
+    total_dias = (hoje - primeiro_dia).days
+    datas = sorted(primeiro_dia + timedelta(days=rng.randrange(total_dias + 1)) for _ in range(casos))
+    sequencias = {}
+    linhas_casos = []
+    for data_inicio in datas:
+        sequencias[data_inicio.year] = sequencias.get(data_inicio.year, 0) + 1
+        finalizado = data_inicio < hoje - timedelta(days=90)
+        linhas_casos.append((
+            f"RELATÓRIO SINTÉTICO {data_inicio.year}.{sequencias[data_inicio.year]:03d} - {_texto(rng, 2, 5)}",
+            f"{data_inicio.year}.{sequencias[data_inicio.year]:03d}", rng.choice(config.LISTA_TIPOS_RELATORIO),
+            data_inicio.isoformat(), (data_inicio + timedelta(days=30)).isoformat() if finalizado else None,
+            "FINALIZADO" if finalizado else rng.choice(["PLANEJADO", "ABERTO"]),
+        ))
+    cursor.executemany(
+        "INSERT INTO casos (titulo, numero_relatorio, tipo, data_inicio, data_final, status) VALUES (?, ?, ?, ?, ?, ?)",
+        linhas_casos)
+    cursor.executemany(
+        "INSERT INTO sequencias_relatorio (ano, ultimo_numero) VALUES (?, ?) "
+        "ON CONFLICT (ano) DO UPDATE SET ultimo_numero = excluded.ultimo_numero",
+        sequencias.items())
+    conn.commit()
+    print(f"{usuarios} usuários e {casos} casos gerados em {time.perf_counter() - inicio:.1f}s")
+
+    datas_por_caso = {i: datas[i - 1] for i in range(1, casos + 1)}
+    gerados = 0
+    while gerados < atividades:
+        lote = []
+        for _ in range(min(LOTE, atividades - gerados)):
+            caso_id = rng.randint(1, casos)
+            periodo_inicio = datas_por_caso[caso_id] + timedelta(days=rng.randint(0, 20))
+            tem_nc = rng.random() < 0.15
+            lote.append((
+                caso_id, rng.choice(config.LISTA_ATIVIDADES), _texto(rng, 6, 14),
+                f"{rng.randint(1, 50)} veículos", _texto(rng, 3, 8),
+                periodo_inicio.isoformat(), (periodo_inicio + timedelta(days=rng.randint(0, 10))).isoformat(),
+                _texto(rng, 3, 10), rng.randint(1, usuarios),
+                _texto(rng, 4, 10) if tem_nc else "", int(tem_nc and rng.random() < 0.3),
+                _texto(rng, 4, 10) if tem_nc else "", "",
+                periodo_inicio.isoformat(), rng.choice(config.LISTA_SITUACAO),
+            ))
+        cursor.executemany("""
+            INSERT INTO atividades (caso_id, atividade_desc, testes_realizados, extensao_exames,
+                                    criterio_amostragem, periodo_inicio, periodo_fim, observacao_resumo,
+                                    realizado_por_id, nao_conformidade, reincidente, recomendacao,
+                                    data_p_solucao, data_registro, situacao)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, lote)
+        conn.commit()
+        gerados += len(lote)
+        print(f"  {gerados}/{atividades} atividades ({time.perf_counter() - inicio:.1f}s)")
+
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"Banco sintético gerado em {caminho} em {time.perf_counter() - inicio:.1f}s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gera um banco SQLite com dados sintéticos para benchmarks.")
+    parser.add_argument("caminho", help="arquivo do banco a ser criado (será sobrescrito)")
+    parser.add_argument("--casos", type=int, default=20_000)
+    parser.add_argument("--atividades", type=int, default=2_000_000)
+    parser.add_argument("--usuarios", type=int, default=500)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+    gerar(args.caminho, args.casos, args.atividades, args.usuarios, args.semente)
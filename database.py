@@ -1,182 +1,526 @@
+import os
 import sqlite3
-import hashlib
-from datetime import date, datetime
+import heapq
+import queue
+import time
+from datetime import date, datetime, timedelta
 from contextlib import contextmanager
+from urllib.parse import quote
+from flask import g, has_app_context
+import config
+import migracoes
+import metricas
+import auditoria
+import senhas
+from cache import CacheTTL
 
 DB_NAME = 'gerenciador.db'
 
+# Ajustes aplicados uma única vez a cada conexão aberta pelo pool
+POOL_MAX_CONEXOES = 8
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 16384
+
+_pool = queue.LifoQueue(maxsize=POOL_MAX_CONEXOES)
+_pool_pid = os.getpid()
+# Conexões herdadas de um processo pai: não podem ser usadas nem fechadas no filho (o fechamento
+# poderia fazer checkpoint do WAL em uso pelo pai), então só ficam guardadas aqui
+_conexoes_herdadas = []
+
+def caminho_arquivo():
+    """Arquivo do banco de arquivo (relatórios antigos), ao lado do banco principal: gerenciador_arquivo.db."""
+    return os.path.splitext(DB_NAME)[0] + '_arquivo.db'
+
+def _anexar_arquivo(conn, somente_leitura=True):
+    """
+    Anexa o banco de arquivo como o esquema "arquivo", se ele existir. As conexões da aplicação o
+    anexam somente para leitura; apenas o arquivamento (arquivar_casos_antigos) escreve nele.
+    """
+    caminho = caminho_arquivo()
+    if somente_leitura and not os.path.exists(caminho):
+        return False
+    uri = f"file:{quote(os.path.abspath(caminho))}?mode={'ro' if somente_leitura else 'rwc'}"
+    conn.execute("ATTACH DATABASE ? AS arquivo", (uri,))
+    conn.arquivo_anexado = True
+    return True
+
+def _abrir_conexao(arquivo_somente_leitura=True):
+    """Abre uma nova conexão e aplica os PRAGMAs de desempenho e integridade."""
+    conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                           factory=metricas.ConexaoInstrumentada, uri=True)
+    conn.arquivo_anexado = False
+    conn.pid = os.getpid()
+    # auto_vacuum só tem efeito em bancos novos (e precisa vir antes do WAL); bancos existentes
+    # são convertidos uma única vez com `python manutencao.py ativar-vacuo-incremental`
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    _anexar_arquivo(conn, arquivo_somente_leitura)
+    return conn
+
+def _obter_do_pool():
+    global _pool, _pool_pid
+    if _pool_pid != os.getpid():
+        # Processo criado por fork (ver servidor.py): descarta o pool do pai e começa um novo
+        while not _pool.empty():
+            _conexoes_herdadas.append(_pool.get_nowait())
+        _pool, _pool_pid = queue.LifoQueue(maxsize=POOL_MAX_CONEXOES), os.getpid()
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        return _abrir_conexao()
+    if not conn.arquivo_anexado:
+        # O arquivo pode ter sido criado depois que a conexão foi aberta
+        _anexar_arquivo(conn)
+    return conn
+
+def _devolver_ao_pool(conn):
+    """Desfaz qualquer transação pendente e devolve a conexão ao pool (ou fecha, se estiver cheio)."""
+    if conn.in_transaction:
+        conn.rollback()
+    conn.row_factory = None
+    if conn.pid != os.getpid():
+        _conexoes_herdadas.append(conn)
+        return
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
 @contextmanager
 def get_db_conn():
     """
     Gerenciador de contexto para conexões com o banco de dados.
-    Garante que a conexão seja sempre fechada de forma segura.
+    Dentro de uma requisição Flask, reutiliza a mesma conexão do pool (guardada em `g`)
+    para todas as funções chamadas; fora dela, empresta uma conexão e a devolve ao final.
     """
-    conn = None
+    if has_app_context():
+        if 'db_conn' not in g:
+            g.db_conn = _obter_do_pool()
+        conn, emprestada = g.db_conn, False
+    else:
+        conn, emprestada = _obter_do_pool(), True
     try:
-        conn = sqlite3.connect(DB_NAME)
         yield conn
     except sqlite3.Error as e:
         print(f"Erro de banco de dados: {e}")
+        conn.rollback()
         raise
     finally:
-        if conn:
-            conn.close()
+        if emprestada:
+            _devolver_ao_pool(conn)
+
+def fechar_conexao(exc=None):
+    """Devolve ao pool a conexão da requisição atual. Registrada em `app.teardown_appcontext`."""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        _devolver_ao_pool(conn)
+
+# Esquemas em que os casos podem estar, com o valor da coluna `arquivado` de cada um
+ESQUEMAS = [('main', 0), ('arquivo', 1)]
+
+def _esquemas(conn):
+    return ESQUEMAS if conn.arquivo_anexado else ESQUEMAS[:1]
+
+def unir_esquemas(modelo, esquemas=ESQUEMAS):
+    """Repete a consulta `modelo` (com os campos {esquema} e {arquivado}) em cada esquema, com UNION ALL."""
+    return " UNION ALL ".join(modelo.format(esquema=esquema, arquivado=arquivado) for esquema, arquivado in esquemas)
+
+def _unir_esquemas(conn, modelo, params=()):
+    """unir_esquemas() para o banco ativo e, se anexado, o arquivo. Retorna (sql, params)."""
+    esquemas = _esquemas(conn)
+    return unir_esquemas(modelo, esquemas), list(params) * len(esquemas)
+
+# As consultas e alterações com filtro ficam em constantes SQL_* e em funções montar_sql_*, que
+# devolvem (sql, params). `python migracoes.py` confere o plano de cada uma (ver
+# migracoes.CONSULTAS_VERIFICADAS) e falha se alguma não estiver registrada lá.
 
 def inicializar_banco():
-    """Cria e inicializa o banco de dados e suas tabelas se não existirem."""
+    """Cria o banco de dados, se necessário, e aplica as migrações de esquema pendentes."""
     with get_db_conn() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            codigo TEXT UNIQUE NOT NULL,
-            nome_completo TEXT NOT NULL,
-            username TEXT UNIQUE NOT NULL, 
-            password_hash TEXT NOT NULL,
-            role TEXT NOT NULL DEFAULT 'Auditor'
-        )''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS casos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, titulo TEXT NOT NULL, numero_relatorio TEXT UNIQUE,
-            tipo TEXT NOT NULL, data_inicio TEXT NOT NULL, data_final TEXT, status TEXT NOT NULL
-        )''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS atividades (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, caso_id INTEGER NOT NULL, atividade_desc TEXT,
-            testes_realizados TEXT, extensao_exames TEXT, criterio_amostragem TEXT,
-            periodo_inicio TEXT,
-            periodo_fim TEXT,
-            observacao_resumo TEXT, 
-            realizado_por_id INTEGER,
-            nao_conformidade TEXT, reincidente INTEGER, recomendacao TEXT,
-            data_p_solucao TEXT, data_registro TEXT NOT NULL, situacao TEXT,
-            FOREIGN KEY (caso_id) REFERENCES casos (id) ON DELETE CASCADE,
-            FOREIGN KEY (realizado_por_id) REFERENCES usuarios (id)
-        )''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS log_exclusoes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, id_caso_excluido INTEGER NOT NULL,
-            numero_relatorio_excluido TEXT, titulo_excluido TEXT,
-            usuario_codigo TEXT NOT NULL, usuario_nome TEXT NOT NULL, data_exclusao TEXT NOT NULL
-        )''')
-        conn.commit()
-        cursor.execute("PRAGMA foreign_keys = ON;")
+        aplicadas = migracoes.aplicar_migracoes(conn)
+        if aplicadas:
+            print(f"Migrações de esquema aplicadas: {aplicadas}")
+
 
+def gerar_hash_senha(senha):
+    """Hash scrypt da senha, calculado na thread atual (ver senhas.py)."""
+    return senhas.gerar_hash(senha)
 
 def adicionar_usuario(codigo, nome_completo, username, senha, role):
+    senha_hash = senhas.executar(senhas.gerar_hash, senha)
     try:
         with get_db_conn() as conn:
             cursor = conn.cursor()
-            senha_hash = hashlib.sha256(senha.encode()).hexdigest()
             cursor.execute('INSERT INTO usuarios (codigo, nome_completo, username, password_hash, role) VALUES (?, ?, ?, ?, ?)', 
                            (codigo, nome_completo, username, senha_hash, role))
             conn.commit()
+        _invalidar_usuarios()
         return True
     except sqlite3.IntegrityError:
         print(f"Erro: Usuário com código '{codigo}' ou username '{username}' já existe.")
         return False
 
+def adicionar_usuarios_em_lote(usuarios):
+    """
+    Insere vários usuários (dicts com codigo, nome_completo, username, password_hash e role)
+    em uma única transação. Se qualquer linha violar uma restrição, nenhuma é gravada.
+    """
+    try:
+        with get_db_conn() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO usuarios (codigo, nome_completo, username, password_hash, role)
+                VALUES (:codigo, :nome_completo, :username, :password_hash, :role)
+            """, usuarios)
+            conn.commit()
+        _invalidar_usuarios()
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+SQL_USUARIOS_EXISTENTES = "SELECT {coluna} FROM usuarios WHERE {coluna} IN ({marcadores})"
+
+def buscar_codigos_e_usernames_existentes(codigos, usernames):
+    """Retorna (codigos, usernames) já cadastrados dentre os informados."""
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        existentes_codigos, existentes_usernames = set(), set()
+        for coluna, valores, destino in (("codigo", list(codigos), existentes_codigos),
+                                         ("username", list(usernames), existentes_usernames)):
+            # Consulta em blocos para respeitar o limite de parâmetros do SQLite
+            for i in range(0, len(valores), 500):
+                bloco = valores[i:i + 500]
+                marcadores = ", ".join("?" * len(bloco))
+                cursor.execute(SQL_USUARIOS_EXISTENTES.format(coluna=coluna, marcadores=marcadores), bloco)
+                destino.update(row[0] for row in cursor.fetchall())
+        return existentes_codigos, existentes_usernames
+
+SQL_LOGIN = "SELECT id, codigo, nome_completo, password_hash, role FROM usuarios WHERE codigo = ?"
+SQL_REGRAVAR_HASH_SENHA = "UPDATE usuarios SET password_hash = ? WHERE id = ? AND password_hash = ?"
+
 def verificar_login(codigo, senha):
+    """
+    Confere código e senha e devolve os dados do usuário, ou None. A senha é verificada no pool de
+    senhas.executar, que pode lançar senhas.SistemaOcupado. Hashes antigos (SHA-256) ou com
+    parâmetros desatualizados são regravados com scrypt no primeiro login correto.
+    """
     with get_db_conn() as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute("SELECT id, codigo, nome_completo, password_hash, role FROM usuarios WHERE codigo = ?", (codigo,))
+        cursor.execute(SQL_LOGIN, (codigo,))
         usuario = cursor.fetchone()
-        if usuario:
-            senha_digitada_hash = hashlib.sha256(senha.encode()).hexdigest()
-            if senha_digitada_hash == usuario['password_hash']:
-                return {
-                    'id': usuario['id'],
-                    'codigo': usuario['codigo'],
-                    'nome': usuario['nome_completo'],
-                    'role': usuario['role']
-                }
-    return None
+    if not usuario:
+        # Mesmo custo de um código existente, para que o tempo de resposta não revele os códigos válidos
+        senhas.executar(senhas.verificar, senha, senhas.hash_ficticio())
+        return None
+    if not senhas.executar(senhas.verificar, senha, usuario['password_hash']):
+        return None
+    if senhas.precisa_atualizar(usuario['password_hash']):
+        _regravar_hash_senha(usuario['id'], usuario['password_hash'], senhas.executar(senhas.gerar_hash, senha))
+    return {
+        'id': usuario['id'],
+        'codigo': usuario['codigo'],
+        'nome': usuario['nome_completo'],
+        'role': usuario['role']
+    }
+
+def _regravar_hash_senha(user_id, hash_antigo, hash_novo):
+    """Troca o hash, a menos que a senha tenha sido alterada nesse meio tempo."""
+    try:
+        with get_db_conn() as conn:
+            conn.execute(SQL_REGRAVAR_HASH_SENHA, (hash_novo, user_id, hash_antigo))
+            conn.commit()
+    except sqlite3.Error:
+        # O login continua válido; a atualização é tentada de novo no próximo
+        pass
+
+SQL_CASO_PARA_EXCLUSAO = "SELECT numero_relatorio, titulo FROM casos WHERE id = ?"
+SQL_EXCLUIR_CASO = "DELETE FROM casos WHERE id = ?"
 
 def deletar_relatorio_e_registrar_log(id_caso, usuario_codigo, usuario_nome):
     try:
         with get_db_conn() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT numero_relatorio, titulo FROM casos WHERE id = ?", (id_caso,))
+            cursor.execute(SQL_CASO_PARA_EXCLUSAO, (id_caso,))
             dados_caso = cursor.fetchone()
             if not dados_caso: return False
             num_relatorio, titulo = dados_caso
             data_hora_agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             cursor.execute("INSERT INTO log_exclusoes (id_caso_excluido, numero_relatorio_excluido, titulo_excluido, usuario_codigo, usuario_nome, data_exclusao) VALUES (?, ?, ?, ?, ?, ?)",
                            (id_caso, num_relatorio, titulo, usuario_codigo, usuario_nome, data_hora_agora))
-            cursor.execute("DELETE FROM casos WHERE id = ?", (id_caso,))
+            cursor.execute(SQL_EXCLUIR_CASO, (id_caso,))
             conn.commit()
         return True
     except sqlite3.Error as e:
         print(f"Ocorreu um erro na exclusão segura: {e}")
         return False
 
+SQL_TODOS_USUARIOS = "SELECT id, codigo, nome_completo, username, role FROM usuarios ORDER BY nome_completo"
+SQL_USUARIO_POR_ID = "SELECT id, codigo, nome_completo, username, role FROM usuarios WHERE id = ?"
+
 def buscar_todos_usuarios():
-    """Busca todos os usuários cadastrados no sistema."""
-    with get_db_conn() as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, codigo, nome_completo, username, role FROM usuarios ORDER BY nome_completo")
-        return [dict(row) for row in cursor.fetchall()]
+    """Busca todos os usuários cadastrados no sistema (pelo cache de usuários)."""
+    chave = (geracao_usuarios(), 'todos')
+    usuarios = _cache_usuarios.obter(chave)
+    if usuarios is None:
+        with get_db_conn() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(SQL_TODOS_USUARIOS)
+            usuarios = [dict(row) for row in cursor.fetchall()]
+        _cache_usuarios.guardar(chave, usuarios)
+    return [dict(usuario) for usuario in usuarios]
 
 def buscar_usuario_por_id(user_id):
-    """Busca um único usuário pelo seu ID."""
-    with get_db_conn() as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, codigo, nome_completo, username, role FROM usuarios WHERE id = ?", (user_id,))
-        usuario = cursor.fetchone()
-        return dict(usuario) if usuario else None
+    """Busca um único usuário pelo seu ID (pelo cache de usuários)."""
+    chave = (geracao_usuarios(), 'id', user_id)
+    usuario = _cache_usuarios.obter(chave)
+    if usuario is None:
+        with get_db_conn() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(SQL_USUARIO_POR_ID, (user_id,))
+            usuario = cursor.fetchone()
+        if usuario is None:
+            return None
+        usuario = dict(usuario)
+        _cache_usuarios.guardar(chave, usuario)
+    return dict(usuario)
+
+# Campos alterados por atualizar_usuario, além da senha
+CAMPOS_EDITAVEIS_USUARIO = ['codigo', 'nome_completo', 'username', 'role']
+SQL_VALORES_USUARIO = f"SELECT {', '.join(CAMPOS_EDITAVEIS_USUARIO)} FROM usuarios WHERE id = ?"
+SQL_ATUALIZAR_USUARIO = "UPDATE usuarios SET codigo = ?, nome_completo = ?, username = ?, role = ? WHERE id = ?"
+SQL_ATUALIZAR_USUARIO_E_SENHA = ("UPDATE usuarios SET codigo = ?, nome_completo = ?, username = ?, role = ?, "
+                                 "password_hash = ? WHERE id = ?")
 
 def atualizar_usuario(user_id, dados):
-    """Atualiza os dados de um usuário no banco de dados."""
-    query = "UPDATE usuarios SET codigo = ?, nome_completo = ?, username = ?, role = ?"
-    params = [dados['codigo'], dados['nome_completo'], dados['username'], dados['role']]
+    """Atualiza os dados de um usuário no banco de dados e registra a alteração na auditoria."""
+    campos = CAMPOS_EDITAVEIS_USUARIO
+    query = SQL_ATUALIZAR_USUARIO
+    params = [dados[campo] for campo in campos]
 
     if dados.get('nova_senha'):
-        nova_senha_hash = hashlib.sha256(dados['nova_senha'].encode()).hexdigest()
-        query += ", password_hash = ?"
+        nova_senha_hash = senhas.executar(senhas.gerar_hash, dados['nova_senha'])
+        query = SQL_ATUALIZAR_USUARIO_E_SENHA
         params.append(nova_senha_hash)
 
-    query += " WHERE id = ?"
     params.append(user_id)
 
     try:
         with get_db_conn() as conn:
             cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(SQL_VALORES_USUARIO, (user_id,))
+            anteriores = cursor.fetchone()
             cursor.execute(query, tuple(params))
             conn.commit()
-        return True
     except sqlite3.IntegrityError:
         return False
+    _invalidar_usuarios()
+    if anteriores:
+        antes, depois = _diferencas(dict(zip(campos, anteriores)), {campo: dados[campo] for campo in campos})
+        if dados.get('nova_senha'):
+            # O hash da senha nunca vai para a auditoria, apenas o fato de ter sido trocada
+            depois['senha'] = 'alterada'
+        if depois:
+            auditoria.registrar_evento('usuarios', user_id, 'UPDATE', antes, depois)
+    return True
+
+def _codificar_cursor(data_inicio, id_caso):
+    return f"{data_inicio}|{id_caso}"
+
+def _decodificar_cursor(cursor_pagina):
+    """Converte o cursor 'data_inicio|id' de volta em tupla; retorna None se for inválido."""
+    try:
+        data_inicio, id_caso = cursor_pagina.rsplit('|', 1)
+        return data_inicio, int(id_caso)
+    except (AttributeError, ValueError):
+        return None
+
+def montar_sql_casos_paginados(status=None, tipo=None, ano=None, posicao=None, limite=50):
+    """Modelo (para _unir_esquemas) de uma página da listagem de casos, após `posicao` (data_inicio, id)."""
+    condicoes, params = [], []
+    if status:
+        condicoes.append("status = ?")
+        params.append(status)
+    if tipo:
+        condicoes.append("tipo = ?")
+        params.append(tipo)
+    if ano:
+        # Faixa de texto equivalente a LIKE 'ano.%', mas que aproveita o índice de numero_relatorio
+        condicoes.append("numero_relatorio >= ? AND numero_relatorio < ?")
+        params.extend([f"{ano}.", f"{ano}/"])
+    if posicao:
+        condicoes.append("(data_inicio, id) < (?, ?)")
+        params.extend(posicao)
+    modelo = ("SELECT id, titulo, tipo, data_inicio, data_final, status, numero_relatorio, {arquivado} as arquivado "
+              "FROM {esquema}.casos")
+    if condicoes:
+        modelo += " WHERE " + " AND ".join(condicoes)
+    modelo = "SELECT * FROM (" + modelo + " ORDER BY data_inicio DESC, id DESC LIMIT ?)"
+    params.append(limite)
+    return modelo, params
 
-def buscar_casos():
+def buscar_casos_paginados(status=None, tipo=None, ano=None, cursor_pagina=None, limite=50):
+    """
+    Lista os casos com paginação por chave (keyset) em (data_inicio, id), do mais recente ao mais antigo.
+    Em vez de OFFSET, a próxima página começa logo após o último item da anterior, informado em
+    `cursor_pagina`. Retorna um dicionário com os casos e o cursor da próxima página (ou None).
+    """
+    posicao = _decodificar_cursor(cursor_pagina) if cursor_pagina else None
     with get_db_conn() as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute("SELECT id, titulo, data_inicio, data_final, status, numero_relatorio FROM casos ORDER BY data_inicio DESC")
-        return [dict(row) for row in cursor.fetchall()]
+        query, params = _unir_esquemas(conn, *montar_sql_casos_paginados(status, tipo, ano, posicao, limite + 1))
+        cursor.execute(query + " ORDER BY data_inicio DESC, id DESC LIMIT ?", params + [limite + 1])
+        casos = [dict(row) for row in cursor.fetchall()]
+    proximo_cursor = None
+    if len(casos) > limite:
+        casos = casos[:limite]
+        proximo_cursor = _codificar_cursor(casos[-1]['data_inicio'], casos[-1]['id'])
+    return {'casos': casos, 'proximo_cursor': proximo_cursor}
+
+def _formatar_numero_relatorio(ano, numero):
+    return f"{ano}.{numero:03d}"
+
+def _reservar_numeros(cursor, ano, quantidade):
+    """
+    Avança a sequência do ano em `quantidade` e devolve os números reservados.
+    Deve ser chamada dentro de uma transação BEGIN IMMEDIATE, que serializa os escritores.
+    """
+    cursor.execute("""
+        INSERT INTO sequencias_relatorio (ano, ultimo_numero) VALUES (?, ?)
+        ON CONFLICT (ano) DO UPDATE SET ultimo_numero = ultimo_numero + excluded.ultimo_numero
+        RETURNING ultimo_numero
+    """, (ano, quantidade))
+    ultimo = cursor.fetchone()[0]
+    return [_formatar_numero_relatorio(ano, n) for n in range(ultimo - quantidade + 1, ultimo + 1)]
+
+def reservar_numeros_relatorio(quantidade, ano=None):
+    """Reserva `quantidade` números de relatório consecutivos do ano (padrão: ano atual) em uma única transação."""
+    if quantidade < 1:
+        return []
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        numeros = _reservar_numeros(cursor, ano or date.today().year, quantidade)
+        conn.commit()
+        return numeros
 
 def adicionar_novo_caso(titulo, tipo, data_inicio, status):
     with get_db_conn() as conn:
         cursor = conn.cursor()
-        ano_atual = date.today().year
-        cursor.execute("SELECT numero_relatorio FROM casos WHERE numero_relatorio LIKE ? ORDER BY numero_relatorio DESC LIMIT 1", (f"{ano_atual}.%",))
-        resultado = cursor.fetchone()
-        ultimo_num = int(resultado[0].split('.')[1]) if resultado else 0
-        numero_relatorio_gerado = f"{ano_atual}.{ultimo_num + 1:03d}"
+        cursor.execute("BEGIN IMMEDIATE")
+        numero_relatorio_gerado = _reservar_numeros(cursor, date.today().year, 1)[0]
         cursor.execute("INSERT INTO casos (titulo, tipo, data_inicio, status, numero_relatorio) VALUES (?, ?, ?, ?, ?)",
                        (titulo, tipo, data_inicio, status, numero_relatorio_gerado))
         conn.commit()
         return cursor.lastrowid
 
+SQL_CASO_POR_ID = "SELECT *, {arquivado} as arquivado FROM {esquema}.casos WHERE id = ?"
+SQL_VERSAO_CASO = "SELECT versao FROM {esquema}.casos WHERE id = ?"
+SQL_VERSAO_CASOS = "SELECT valor FROM versoes WHERE chave = 'casos'"
+
 def buscar_caso_por_id(id_caso):
+    """Busca o caso no banco ativo e, se não estiver lá, no arquivo (com arquivado = 1)."""
     with get_db_conn() as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM casos WHERE id = ?", (id_caso,))
+        for esquema, arquivado in _esquemas(conn):
+            cursor.execute(SQL_CASO_POR_ID.format(esquema=esquema, arquivado=arquivado), (id_caso,))
+            resultado = cursor.fetchone()
+            if resultado:
+                return dict(resultado)
+        return None
+
+def buscar_versao_caso(id_caso):
+    """Versão atual do caso (muda a cada escrita nele ou em suas atividades), ou None se não existir."""
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        for esquema, arquivado in _esquemas(conn):
+            cursor.execute(SQL_VERSAO_CASO.format(esquema=esquema, arquivado=arquivado), (id_caso,))
+            resultado = cursor.fetchone()
+            if resultado:
+                return resultado[0]
+        return None
+
+def buscar_versao_casos():
+    """Versão da listagem de casos (muda quando um caso é criado, alterado ou excluído)."""
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_VERSAO_CASOS)
         resultado = cursor.fetchone()
-        return dict(resultado) if resultado else None
+        return resultado[0] if resultado else 0
+
+def montar_sql_estatisticas_situacao(casos_ids):
+    """Modelo (para _unir_esquemas) do resumo de situações do total geral (caso 0) e dos casos pedidos."""
+    marcadores = ", ".join(["?"] * (len(casos_ids) + 1))
+    return (f"SELECT caso_id, situacao, quantidade FROM {{esquema}}.resumo_situacoes WHERE caso_id IN ({marcadores})",
+            [0] + list(casos_ids))
+
+def buscar_estatisticas_situacao(casos_ids=()):
+    """
+    Lê do resumo materializado a quantidade de atividades por situação, no geral e para cada
+    caso pedido. Retorna {'geral': {situacao: n}, 'por_caso': {caso_id: {situacao: n}}}.
+    """
+    casos_ids = list(casos_ids)
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        query, params = _unir_esquemas(conn, *montar_sql_estatisticas_situacao(casos_ids))
+        cursor.execute(query, params)
+        estatisticas = {'geral': {}, 'por_caso': {caso_id: {} for caso_id in casos_ids}}
+        for caso_id, situacao, quantidade in cursor.fetchall():
+            if not quantidade:
+                continue
+            # O total geral (caso_id 0) é a soma do banco ativo com o do arquivo
+            destino = estatisticas['geral'] if caso_id == 0 else estatisticas['por_caso'][caso_id]
+            destino[situacao] = destino.get(situacao, 0) + quantidade
+        return estatisticas
+
+SQL_RESUMO_REAL = """
+    SELECT caso_id, COALESCE(situacao, '') as situacao, COUNT(*) as quantidade FROM atividades GROUP BY 1, 2
+    UNION ALL
+    SELECT 0, COALESCE(situacao, ''), COUNT(*) FROM atividades GROUP BY 2
+"""
+SQL_DIVERGENCIAS_RESUMO = f"""
+    WITH real AS ({SQL_RESUMO_REAL}),
+         resumo AS (SELECT caso_id, situacao, quantidade FROM resumo_situacoes WHERE quantidade <> 0)
+    SELECT real.caso_id, real.situacao, COALESCE(resumo.quantidade, 0), real.quantidade
+    FROM real LEFT JOIN resumo USING (caso_id, situacao)
+    WHERE real.quantidade IS NOT COALESCE(resumo.quantidade, 0)
+    UNION ALL
+    SELECT resumo.caso_id, resumo.situacao, resumo.quantidade, 0
+    FROM resumo LEFT JOIN real USING (caso_id, situacao)
+    WHERE real.quantidade IS NULL
+"""
+SQL_LIMPAR_RESUMO = "DELETE FROM resumo_situacoes"
+SQL_RECONSTRUIR_RESUMO = f"INSERT INTO resumo_situacoes (caso_id, situacao, quantidade) {SQL_RESUMO_REAL}"
+SQL_AVANCAR_VERSAO_CASOS = "UPDATE versoes SET valor = valor + 1 WHERE chave = 'casos'"
+
+def verificar_resumo_situacoes():
+    """
+    Compara o resumo materializado com a contagem real em atividades.
+    Retorna a lista de divergências (caso_id, situacao, quantidade_no_resumo, quantidade_real).
+    """
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_DIVERGENCIAS_RESUMO)
+        return cursor.fetchall()
+
+def reconstruir_resumo_situacoes():
+    """Recalcula todo o resumo materializado a partir da tabela atividades."""
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(SQL_LIMPAR_RESUMO)
+        cursor.execute(SQL_RECONSTRUIR_RESUMO)
+        cursor.execute(SQL_AVANCAR_VERSAO_CASOS)
+        conn.commit()
 
 def salvar_atividade(dados_atividade):
     with get_db_conn() as conn:
@@ -192,69 +536,777 @@ def salvar_atividade(dados_atividade):
                     :data_p_solucao, :data_registro, :situacao)
         """, dados_atividade)
         conn.commit()
+    return cursor.lastrowid
+
+def salvar_atividades_em_lote(lista_atividades):
+    """Insere várias atividades com executemany em uma única transação."""
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO atividades (caso_id, atividade_desc, testes_realizados, extensao_exames,
+                                  criterio_amostragem, periodo_inicio, periodo_fim, observacao_resumo,
+                                  realizado_por_id, nao_conformidade, reincidente, recomendacao,
+                                  data_p_solucao, data_registro, situacao)
+            VALUES (:caso_id, :atividade_desc, :testes_realizados, :extensao_exames,
+                    :criterio_amostragem, :periodo_inicio, :periodo_fim, :observacao_resumo,
+                    :realizado_por_id, :nao_conformidade, :reincidente, :recomendacao,
+                    :data_p_solucao, :data_registro, :situacao)
+        """, lista_atividades)
+        conn.commit()
     return True
 
+SQL_ATIVIDADE_POR_ID = "SELECT *, {arquivado} as arquivado FROM {esquema}.atividades WHERE id = ?"
+
 def buscar_atividade_por_id(id_atividade):
     with get_db_conn() as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM atividades WHERE id = ?", (id_atividade,))
-        atividade = cursor.fetchone()
-        return dict(atividade) if atividade else None
+        for esquema, arquivado in _esquemas(conn):
+            cursor.execute(SQL_ATIVIDADE_POR_ID.format(esquema=esquema, arquivado=arquivado), (id_atividade,))
+            atividade = cursor.fetchone()
+            if atividade:
+                return dict(atividade)
+        return None
+
+# Campos alterados por atualizar_atividade (os demais só são definidos na criação)
+CAMPOS_EDITAVEIS_ATIVIDADE = ['atividade_desc', 'testes_realizados', 'observacao_resumo', 'extensao_exames',
+                              'criterio_amostragem', 'periodo_inicio', 'periodo_fim', 'situacao']
+SQL_VALORES_ATIVIDADE = (f"SELECT {', '.join(CAMPOS_EDITAVEIS_ATIVIDADE)} FROM atividades "
+                         "WHERE id = ? AND caso_id = IFNULL(?, caso_id)")
+SQL_ATUALIZAR_ATIVIDADE = """
+    UPDATE atividades SET 
+        atividade_desc = :atividade_desc, testes_realizados = :testes_realizados, 
+        observacao_resumo = :observacao_resumo, extensao_exames = :extensao_exames, 
+        criterio_amostragem = :criterio_amostragem, periodo_inicio = :periodo_inicio, 
+        periodo_fim = :periodo_fim, situacao = :situacao 
+    WHERE id = :id
+"""
+SQL_EXCLUIR_ATIVIDADE = "DELETE FROM atividades WHERE id = ? AND caso_id = IFNULL(?, caso_id) RETURNING *"
 
-def atualizar_atividade(id_atividade, dados_atividade):
+def atualizar_atividade(id_atividade, dados_atividade, caso_id=None):
+    """
+    Atualiza a atividade e registra os valores anteriores na auditoria. Retorna False se ela não
+    existir (ou, com `caso_id`, se não pertencer a esse caso).
+    """
     with get_db_conn() as conn:
         cursor = conn.cursor()
-        query = """
-            UPDATE atividades SET 
-                atividade_desc = :atividade_desc, testes_realizados = :testes_realizados, 
-                observacao_resumo = :observacao_resumo, extensao_exames = :extensao_exames, 
-                criterio_amostragem = :criterio_amostragem, periodo_inicio = :periodo_inicio, 
-                periodo_fim = :periodo_fim, situacao = :situacao 
-            WHERE id = :id
-        """
-        cursor.execute(query, {**dados_atividade, 'id': id_atividade})
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(SQL_VALORES_ATIVIDADE, (id_atividade, caso_id))
+        anteriores = cursor.fetchone()
+        if anteriores is None:
+            conn.rollback()
+            return False
+        cursor.execute(SQL_ATUALIZAR_ATIVIDADE, {**dados_atividade, 'id': id_atividade})
         conn.commit()
+    antes, depois = _diferencas(dict(zip(CAMPOS_EDITAVEIS_ATIVIDADE, anteriores)),
+                                {campo: dados_atividade[campo] for campo in CAMPOS_EDITAVEIS_ATIVIDADE})
+    if depois:
+        auditoria.registrar_evento('atividades', id_atividade, 'UPDATE', antes, depois)
     return True
 
-def deletar_atividade_por_id(id_atividade):
+def deletar_atividade_por_id(id_atividade, caso_id=None):
+    """
+    Exclui a atividade e registra a linha excluída na auditoria. Retorna False se ela não existir
+    (ou, com `caso_id`, se não pertencer a esse caso).
+    """
     with get_db_conn() as conn:
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM atividades WHERE id = ?", (id_atividade,))
+        cursor.execute(SQL_EXCLUIR_ATIVIDADE, (id_atividade, caso_id))
+        excluida = cursor.fetchone()
+        colunas = [descricao[0] for descricao in cursor.description]
         conn.commit()
+    if excluida is None:
+        return False
+    auditoria.registrar_evento('atividades', id_atividade, 'DELETE', dict(zip(colunas, excluida)))
     return True
 
+def buscar_atividade_completa_por_id(id_atividade):
+    """Uma atividade com o nome de quem a realizou (a linha da tabela do relatório)."""
+    with get_db_conn() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        for esquema, arquivado in _esquemas(conn):
+            cursor.execute(SQL_ATIVIDADE_POR_ID.format(esquema=esquema, arquivado=arquivado), (id_atividade,))
+            atividade = cursor.fetchone()
+            if atividade:
+                atividade = dict(atividade)
+                atividade['realizado_por_nome'] = _nomes_usuarios().get(atividade['realizado_por_id'])
+                return atividade
+        return None
+
+SQL_ATIVIDADES_DO_CASO = "SELECT * FROM {esquema}.atividades WHERE caso_id = ? ORDER BY id"
+
 def buscar_atividades_completas_por_caso_id(id_caso):
     with get_db_conn() as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        query = """
-            SELECT 
-                ativ.*, 
-                user.nome_completo as realizado_por_nome
-            FROM 
-                atividades as ativ
-            LEFT JOIN 
-                usuarios as user ON ativ.realizado_por_id = user.id
-            WHERE 
-                ativ.caso_id = ? 
-            ORDER BY 
-                ativ.id
-        """
-        cursor.execute(query, (id_caso,))
+        # O nome de quem realizou vem do cache de usuários, em vez de um JOIN com usuarios
+        nomes = _nomes_usuarios()
+        # O caso está inteiro em um só dos bancos; o outro devolve uma lista vazia
+        atividades = []
+        for esquema, arquivado in _esquemas(conn):
+            cursor.execute(SQL_ATIVIDADES_DO_CASO.format(esquema=esquema, arquivado=arquivado), (id_caso,))
+            for row in cursor.fetchall():
+                atividade = dict(row)
+                atividade['realizado_por_nome'] = nomes.get(atividade['realizado_por_id'])
+                atividades.append(atividade)
+        return atividades
+
+# Colunas das exportações, na ordem em que aparecem no arquivo: (expressão SQL, título da coluna)
+COLUNAS_EXPORTACAO = [
+    ("caso.numero_relatorio", "Nº Relatório"),
+    ("caso.titulo", "Título do Relatório"),
+    ("ativ.id", "Nº Atividade"),
+    ("ativ.atividade_desc", "Atividade"),
+    ("ativ.testes_realizados", "Testes Realizados"),
+    ("ativ.extensao_exames", "Extensão dos Exames"),
+    ("ativ.criterio_amostragem", "Critério da Amostragem"),
+    ("ativ.periodo_inicio", "Período - De"),
+    ("ativ.periodo_fim", "Período - Até"),
+    ("ativ.observacao_resumo", "Observação / Resumo"),
+    ("user.nome_completo", "Realizado Por"),
+    ("ativ.nao_conformidade", "Não Conformidade"),
+    ("ativ.reincidente", "Reincidente"),
+    ("ativ.recomendacao", "Recomendação"),
+    ("ativ.data_p_solucao", "Data p/ Solução"),
+    ("ativ.data_registro", "Data de Registro"),
+    ("ativ.situacao", "Situação"),
+]
+
+def montar_sql_exportacao(id_caso=None, data_de=None, data_ate=None):
+    """Modelo (com {esquema}) das linhas exportadas, precedidas das três colunas de ordenação."""
+    condicoes, params = [], []
+    if id_caso is not None:
+        condicoes.append("caso.id = ?")
+        params.append(id_caso)
+    if data_de:
+        condicoes.append("caso.data_inicio >= ?")
+        params.append(data_de)
+    if data_ate:
+        condicoes.append("caso.data_inicio <= ?")
+        params.append(data_ate)
+    # As três primeiras colunas são a chave de ordenação, usada para intercalar banco ativo e arquivo
+    query = f"""
+        SELECT caso.data_inicio, caso.id, ativ.id, {', '.join(expressao for expressao, _ in COLUNAS_EXPORTACAO)}
+        FROM {{esquema}}.casos as caso
+        JOIN {{esquema}}.atividades as ativ ON ativ.caso_id = caso.id
+        LEFT JOIN main.usuarios as user ON ativ.realizado_por_id = user.id
+    """
+    if condicoes:
+        query += " WHERE " + " AND ".join(condicoes)
+    query += " ORDER BY caso.data_inicio, caso.id, ativ.id"
+    return query, params
+
+def iterar_atividades_para_exportacao(id_caso=None, data_de=None, data_ate=None, tamanho_lote=500):
+    """
+    Gera, uma a uma, as linhas (tuplas na ordem de COLUNAS_EXPORTACAO) das atividades de um caso
+    ou dos casos com data_inicio entre `data_de` e `data_ate`. As linhas são lidas do cursor em
+    lotes, sem carregar o resultado inteiro na memória. Usa uma conexão própria do pool, pois o
+    gerador continua sendo consumido depois que a rota já retornou a resposta.
+    """
+    query, params = montar_sql_exportacao(id_caso, data_de, data_ate)
+
+    def ler_em_lotes(cursor):
+        while True:
+            lote = cursor.fetchmany(tamanho_lote)
+            if not lote:
+                break
+            yield from lote
+
+    conn = _obter_do_pool()
+    try:
+        leitores = []
+        for esquema, _ in _esquemas(conn):
+            cursor = conn.cursor()
+            cursor.execute(query.format(esquema=esquema), params)
+            leitores.append(ler_em_lotes(cursor))
+        for linha in heapq.merge(*leitores, key=lambda linha: linha[:3]):
+            yield linha[3:]
+    finally:
+        _devolver_ao_pool(conn)
+
+# Marcadores de destaque devolvidos nos trechos da pesquisa; o template os converte em <mark>
+MARCA_INICIO, MARCA_FIM = '\x02', '\x03'
+
+def _montar_consulta_fts(termos):
+    """
+    Converte o texto digitado em uma expressão MATCH segura do FTS5: cada palavra vira um
+    termo entre aspas com busca por prefixo ("conform"* encontra "conformidade").
+    """
+    palavras = [p.replace('"', '') for p in termos.split()]
+    return ' '.join(f'"{p}"*' for p in palavras if p)
+
+# Modelos da pesquisa (para _unir_esquemas): cada banco tem o seu índice
+SQL_PESQUISA_RELATORIOS = """
+    SELECT * FROM (
+        SELECT caso.id, caso.numero_relatorio, caso.status,
+               highlight(casos_fts, 0, ?, ?) as trecho, rank as relevancia, {arquivado} as arquivado
+        FROM {esquema}.casos_fts
+        JOIN {esquema}.casos as caso ON caso.id = casos_fts.rowid
+        WHERE casos_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    )"""
+SQL_PESQUISA_ATIVIDADES = """
+    SELECT * FROM (
+        SELECT ativ.id, ativ.caso_id, ativ.atividade_desc, ativ.situacao,
+               caso.numero_relatorio, caso.titulo,
+               snippet(atividades_fts, -1, ?, ?, '…', 16) as trecho, rank as relevancia,
+               {arquivado} as arquivado
+        FROM {esquema}.atividades_fts
+        JOIN {esquema}.atividades as ativ ON ativ.id = atividades_fts.rowid
+        JOIN {esquema}.casos as caso ON caso.id = ativ.caso_id
+        WHERE atividades_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    )"""
+
+def pesquisar(termos, limite=50):
+    """
+    Pesquisa de texto completo (FTS5) nos títulos dos relatórios e nos campos descritivos das atividades.
+    Ignora acentos e maiúsculas, ordena por relevância (bm25) e devolve trechos com os termos destacados.
+    """
+    consulta = _montar_consulta_fts(termos or '')
+    if not consulta:
+        return {'relatorios': [], 'atividades': []}
+    with get_db_conn() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        # Os melhores de cada banco são reordenados juntos pela relevância
+        query, params = _unir_esquemas(conn, SQL_PESQUISA_RELATORIOS, (MARCA_INICIO, MARCA_FIM, consulta, limite))
+        cursor.execute(query + " ORDER BY relevancia LIMIT ?", params + [limite])
+        relatorios = [dict(row) for row in cursor.fetchall()]
+        query, params = _unir_esquemas(conn, SQL_PESQUISA_ATIVIDADES, (MARCA_INICIO, MARCA_FIM, consulta, limite))
+        cursor.execute(query + " ORDER BY relevancia LIMIT ?", params + [limite])
+        atividades = [dict(row) for row in cursor.fetchall()]
+    return {'relatorios': relatorios, 'atividades': atividades}
+
+def reconstruir_indice_pesquisa():
+    """Reconstrói os índices FTS5 a partir das tabelas de origem (ex.: após importações fora da aplicação)."""
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO atividades_fts (atividades_fts) VALUES ('rebuild')")
+        cursor.execute("INSERT INTO casos_fts (casos_fts) VALUES ('rebuild')")
+        conn.commit()
+
+# --- PERÍODOS DAS ATIVIDADES ---
+# Consultas por intervalo de datas sobre o índice R*Tree atividades_periodos (migração 10), que guarda
+# cada período como dias inteiros AAAAMMDD e tem o auditor e o tipo da atividade como dimensões.
+def _dia(data_iso):
+    return int(data_iso.replace('-', ''))
+
+def _condicoes_periodo(data_de, data_ate, realizado_por_id=None, tipo_id=None):
+    condicoes, params = ["periodo.inicio <= ?", "periodo.fim >= ?"], [_dia(data_ate), _dia(data_de)]
+    if realizado_por_id is not None:
+        condicoes.append("periodo.auditor_min <= ? AND periodo.auditor_max >= ?")
+        params += [realizado_por_id, realizado_por_id]
+    if tipo_id is not None:
+        condicoes.append("periodo.tipo_min <= ? AND periodo.tipo_max >= ?")
+        params += [tipo_id, tipo_id]
+    return " AND ".join(condicoes), params
+
+def montar_sql_atividades_no_periodo(data_de, data_ate, realizado_por_id=None, limite=200):
+    condicoes, params = _condicoes_periodo(data_de, data_ate, realizado_por_id)
+    return f"""
+        SELECT * FROM (
+            SELECT ativ.id, ativ.caso_id, ativ.atividade_desc, ativ.periodo_inicio, ativ.periodo_fim,
+                   ativ.situacao, caso.numero_relatorio, user.nome_completo as realizado_por_nome,
+                   {{arquivado}} as arquivado
+            FROM {{esquema}}.atividades_periodos as periodo
+            JOIN {{esquema}}.atividades as ativ ON ativ.id = periodo.id
+            JOIN {{esquema}}.casos as caso ON caso.id = ativ.caso_id
+            LEFT JOIN main.usuarios as user ON user.id = ativ.realizado_por_id
+            WHERE {condicoes}
+            ORDER BY ativ.periodo_inicio, ativ.id
+            LIMIT ?
+        )""", params + [limite]
+
+def buscar_atividades_no_periodo(data_de, data_ate=None, realizado_por_id=None, limite=200):
+    """
+    Atividades cujo período cruza o intervalo [data_de, data_ate] (datas AAAA-MM-DD; sem data_ate,
+    as que cobriram o dia data_de), opcionalmente de um só auditor, ordenadas pelo início do período.
+    """
+    with get_db_conn() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        query, params = _unir_esquemas(
+            conn, *montar_sql_atividades_no_periodo(data_de, data_ate or data_de, realizado_por_id, limite))
+        cursor.execute(query + " ORDER BY periodo_inicio, id LIMIT ?", params + [limite])
         return [dict(row) for row in cursor.fetchall()]
 
+def montar_sql_linha_do_tempo(data_de, data_ate, realizado_por_id=None, tipo_id=None):
+    """Grupos (auditor, tipo, primeiro e último dia dentro do intervalo) com a quantidade de atividades."""
+    condicoes, params = _condicoes_periodo(data_de, data_ate, realizado_por_id, tipo_id)
+    return f"""
+        SELECT periodo.auditor_min, periodo.tipo_min, MAX(periodo.inicio, ?), MIN(periodo.fim, ?), COUNT(*)
+        FROM {{esquema}}.atividades_periodos as periodo
+        WHERE {condicoes}
+        GROUP BY 1, 2, 3, 4""", [_dia(data_de), _dia(data_ate)] + params
+
+SQL_TIPO_ATIVIDADE = "SELECT id FROM tipos_atividade WHERE descricao = ?"
+SQL_NOMES_USUARIOS = "SELECT id, nome_completo FROM usuarios"
+SQL_DESCRICOES_TIPOS = "SELECT id, descricao FROM tipos_atividade"
+
+def buscar_linha_do_tempo(data_de, data_ate, realizado_por_id=None, atividade_desc=None):
+    """
+    Linha do tempo das atividades entre data_de e data_ate, agrupada por auditor e tipo de atividade.
+    Retorna {'dias': [datas AAAA-MM-DD], 'auditores': [{'id', 'nome', 'tipos': [{'atividade_desc',
+    'quantidade', 'por_dia'}]}]}, onde por_dia traz, para cada dia, quantas atividades o cobriram.
+    O agrupamento é feito sobre o índice, com os períodos já recortados ao intervalo pedido; só os
+    grupos distintos chegam ao Python.
+    """
+    inicio, fim = date.fromisoformat(data_de), date.fromisoformat(data_ate)
+    dias = [(inicio + timedelta(days=i)).isoformat() for i in range((fim - inicio).days + 1)]
+    posicao = {_dia(dia): i for i, dia in enumerate(dias)}
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        tipo_id = None
+        if atividade_desc:
+            cursor.execute(SQL_TIPO_ATIVIDADE, (atividade_desc,))
+            row = cursor.fetchone()
+            if row is None:
+                return {'dias': dias, 'auditores': []}
+            tipo_id = row[0]
+        query, params = _unir_esquemas(conn, *montar_sql_linha_do_tempo(data_de, data_ate, realizado_por_id, tipo_id))
+        cursor.execute(query, params)
+        grupos = cursor.fetchall()
+        cursor.execute(SQL_NOMES_USUARIOS)
+        nomes = dict(cursor.fetchall())
+        cursor.execute(SQL_DESCRICOES_TIPOS)
+        descricoes = dict(cursor.fetchall())
+
+    auditores = {}
+    for auditor, tipo_id, dia_inicio, dia_fim, quantidade in grupos:
+        tipos = auditores.setdefault(auditor, {})
+        tipo = tipos.setdefault(tipo_id, {'atividade_desc': descricoes.get(tipo_id) or '', 'quantidade': 0,
+                                          'por_dia': [0] * len(dias)})
+        tipo['quantidade'] += quantidade
+        for i in range(posicao[dia_inicio], posicao[dia_fim] + 1):
+            tipo['por_dia'][i] += quantidade
+
+    ordem_tipos = {atividade: i for i, atividade in enumerate(config.LISTA_ATIVIDADES)}
+    resultado = []
+    for auditor, tipos in auditores.items():
+        resultado.append({
+            'id': auditor or None, 'nome': nomes.get(auditor) or 'Sem auditor',
+            'tipos': sorted(tipos.values(), key=lambda tipo: (ordem_tipos.get(tipo['atividade_desc'], len(ordem_tipos)),
+                                                              tipo['atividade_desc'])),
+        })
+    resultado.sort(key=lambda auditor: auditor['nome'])
+    return {'dias': dias, 'auditores': resultado}
+
+# --- TAREFAS DE PDF ---
+def _agora():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+SQL_TAREFA_PDF_DA_VERSAO = "SELECT * FROM tarefas_pdf WHERE caso_id = ? AND versao = ?"
+SQL_TAREFA_PDF_POR_ID = "SELECT * FROM tarefas_pdf WHERE id = ?"
+SQL_DEVOLVER_TAREFAS_PDF_PARADAS = "UPDATE tarefas_pdf SET status = 'PENDENTE' WHERE status = 'PROCESSANDO' AND iniciada_em < ?"
+SQL_RESERVAR_TAREFA_PDF = """
+    UPDATE tarefas_pdf SET status = 'PROCESSANDO', iniciada_em = ?
+    WHERE id = (SELECT id FROM tarefas_pdf WHERE status = 'PENDENTE' ORDER BY id LIMIT 1)
+    RETURNING *
+"""
+SQL_CONCLUIR_TAREFA_PDF = ("UPDATE tarefas_pdf SET status = 'CONCLUIDA', concluida_em = ?, arquivo = ? WHERE id = ? "
+                           "RETURNING caso_id, versao")
+SQL_EXCLUIR_TAREFAS_PDF_ANTERIORES = "DELETE FROM tarefas_pdf WHERE caso_id = ? AND versao < ? RETURNING arquivo"
+SQL_FALHAR_TAREFA_PDF = "UPDATE tarefas_pdf SET status = 'ERRO', concluida_em = ?, erro = ? WHERE id = ?"
+SQL_REABRIR_TAREFA_PDF = "UPDATE tarefas_pdf SET status = 'PENDENTE', arquivo = NULL WHERE id = ?"
+
+def solicitar_tarefa_pdf(caso_id, versao):
+    """
+    Cria a tarefa de gerar o PDF da versão do caso, ou reaproveita a existente (uma tarefa com erro
+    volta para a fila). Retorna a tarefa como dicionário.
+    """
+    with get_db_conn() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO tarefas_pdf (caso_id, versao, criada_em) VALUES (?, ?, ?)
+            ON CONFLICT (caso_id, versao) DO UPDATE SET status = 'PENDENTE', erro = NULL, criada_em = excluded.criada_em
+            WHERE status = 'ERRO'
+        """, (caso_id, versao, _agora()))
+        conn.commit()
+        cursor.execute(SQL_TAREFA_PDF_DA_VERSAO, (caso_id, versao))
+        return dict(cursor.fetchone())
+
+def buscar_tarefa_pdf(id_tarefa):
+    with get_db_conn() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(SQL_TAREFA_PDF_POR_ID, (id_tarefa,))
+        tarefa = cursor.fetchone()
+        return dict(tarefa) if tarefa else None
+
+def reservar_tarefa_pdf(tempo_limite_segundos):
+    """
+    Marca como PROCESSANDO e devolve a tarefa pendente mais antiga (ou None). Tarefas em
+    processamento há mais de `tempo_limite_segundos` (trabalhador que caiu) voltam para a fila antes.
+    """
+    limite = (datetime.now() - timedelta(seconds=tempo_limite_segundos)).strftime("%Y-%m-%d %H:%M:%S")
+    with get_db_conn() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(SQL_DEVOLVER_TAREFAS_PDF_PARADAS, (limite,))
+        cursor.execute(SQL_RESERVAR_TAREFA_PDF, (_agora(),))
+        tarefa = cursor.fetchone()
+        conn.commit()
+        return dict(tarefa) if tarefa else None
+
+def concluir_tarefa_pdf(id_tarefa, arquivo):
+    """
+    Registra o arquivo gerado e remove as tarefas de versões anteriores do mesmo caso.
+    Retorna os arquivos dessas versões, que o chamador deve apagar.
+    """
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_CONCLUIR_TAREFA_PDF, (_agora(), arquivo, id_tarefa))
+        caso_id, versao = cursor.fetchone()
+        cursor.execute(SQL_EXCLUIR_TAREFAS_PDF_ANTERIORES, (caso_id, versao))
+        antigos = [row[0] for row in cursor.fetchall() if row[0]]
+        conn.commit()
+        return antigos
+
+def falhar_tarefa_pdf(id_tarefa, erro):
+    with get_db_conn() as conn:
+        conn.execute(SQL_FALHAR_TAREFA_PDF, (_agora(), erro, id_tarefa))
+        conn.commit()
+
+def reabrir_tarefa_pdf(id_tarefa):
+    """Devolve para a fila uma tarefa concluída cujo arquivo não existe mais."""
+    with get_db_conn() as conn:
+        conn.execute(SQL_REABRIR_TAREFA_PDF, (id_tarefa,))
+        conn.commit()
+
+# --- AUDITORIA ---
+def _diferencas(antes, depois):
+    """Reduz os dicionários antes/depois aos campos que realmente mudaram."""
+    # None e '' são equivalentes: o formulário envia '' para campos que estavam nulos no banco
+    alterados = [campo for campo in depois if (antes.get(campo) or '') != (depois[campo] or '')]
+    return {campo: antes.get(campo) for campo in alterados}, {campo: depois[campo] for campo in alterados}
+
+def gravar_eventos_auditoria(eventos):
+    """Grava um lote de eventos (tuplas na ordem das colunas de log_auditoria) em uma transação."""
+    with get_db_conn() as conn:
+        conn.executemany("""
+            INSERT INTO log_auditoria (data_hora, tabela, registro_id, acao, usuario_codigo, usuario_nome, antes, depois)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, eventos)
+        conn.commit()
+
+# --- MANUTENÇÃO ---
+SQL_CASOS_ORFAOS = """
+    SELECT DISTINCT ativ.caso_id FROM atividades as ativ
+    WHERE NOT EXISTS (SELECT 1 FROM casos WHERE casos.id = ativ.caso_id)
+"""
+SQL_EXCLUIR_LOTE_DO_CASO = """
+    DELETE FROM atividades WHERE id IN (
+        SELECT id FROM atividades WHERE caso_id = ? LIMIT ?
+    )
+"""
+SQL_LIMPAR_RESUMO_ORFAO = "DELETE FROM resumo_situacoes WHERE caso_id <> 0 AND caso_id NOT IN (SELECT id FROM casos)"
+
+def remover_atividades_orfas(tamanho_lote=200, pausa=0.05):
+    """
+    Remove atividades cujo caso não existe mais, em lotes de `tamanho_lote` linhas por transação,
+    com uma pausa entre os lotes para que as requisições consigam o lock de escrita.
+    Retorna a quantidade de atividades removidas.
+    """
+    with get_db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_CASOS_ORFAOS)
+        casos_orfaos = [row[0] for row in cursor.fetchall()]
+    removidas = 0
+    for caso_id in casos_orfaos:
+        while True:
+            with get_db_conn() as conn:
+                cursor = conn.cursor()
+                cursor.execute(SQL_EXCLUIR_LOTE_DO_CASO, (caso_id, tamanho_lote))
+                quantidade = cursor.rowcount
+                conn.commit()
+            removidas += quantidade
+            if quantidade < tamanho_lote:
+                break
+            time.sleep(pausa)
+    if casos_orfaos:
+        with get_db_conn() as conn:
+            conn.execute(SQL_LIMPAR_RESUMO_ORFAO)
+            conn.commit()
+    return removidas
+
+def vacuo_incremental_ativo():
+    with get_db_conn() as conn:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+def ativar_vacuo_incremental():
+    """Converte o banco para auto_vacuum=INCREMENTAL. Roda um VACUUM completo: use fora do horário de uso."""
+    with get_db_conn() as conn:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+def recuperar_espaco_livre(paginas_por_passo=256, pausa=0.05):
+    """
+    Devolve ao sistema de arquivos as páginas livres do banco (após grandes exclusões), em passos
+    curtos de `incremental_vacuum` para não segurar o lock de escrita. Retorna as páginas liberadas.
+    """
+    if not vacuo_incremental_ativo():
+        return 0
+    liberadas = 0
+    while True:
+        with get_db_conn() as conn:
+            livres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not livres:
+                break
+            # executescript percorre o PRAGMA até o fim; execute() liberaria uma única página
+            conn.executescript(f"PRAGMA incremental_vacuum({paginas_por_passo});")
+            passo = livres - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if passo <= 0:
+            break
+        liberadas += passo
+        time.sleep(pausa)
+    return liberadas
+
+# --- ARQUIVAMENTO ---
+SQL_ARQUIVO_TEM_PERIODOS = "SELECT 1 FROM arquivo.atividades_periodos LIMIT 1"
+SQL_CASOS_PARA_ARQUIVAR = """
+    SELECT id FROM main.casos
+    WHERE status = 'FINALIZADO' AND COALESCE(data_final, data_inicio) < ?
+    LIMIT ?
+"""
+# Modelos de cada lote arquivado: {marcadores} recebe um "?" por caso; {colunas_caso}, {valores_caso}
+# e {colunas_atividade} vêm das tabelas do arquivo (ver _colunas)
+SQL_ARQUIVAR_CASOS_FTS = """
+    INSERT INTO arquivo.casos_fts (rowid, titulo)
+    SELECT id, titulo FROM main.casos
+    WHERE id IN ({marcadores}) AND id NOT IN (SELECT id FROM arquivo.casos)
+"""
+SQL_ARQUIVAR_CASOS = """
+    INSERT INTO arquivo.casos ({colunas_caso})
+    SELECT {valores_caso} FROM main.casos
+    WHERE id IN ({marcadores}) AND id NOT IN (SELECT id FROM arquivo.casos)
+"""
+SQL_ARQUIVAR_ATIVIDADES_FTS = """
+    INSERT INTO arquivo.atividades_fts (rowid, testes_realizados, observacao_resumo,
+                                        nao_conformidade, recomendacao)
+    SELECT id, testes_realizados, observacao_resumo, nao_conformidade, recomendacao
+    FROM main.atividades
+    WHERE caso_id IN ({marcadores}) AND id NOT IN (SELECT id FROM arquivo.atividades)
+"""
+SQL_ARQUIVAR_PERIODOS = f"""
+    INSERT INTO arquivo.atividades_periodos ({migracoes.COLUNAS_PERIODOS})
+    SELECT periodo.* FROM main.atividades as ativ
+    JOIN main.atividades_periodos as periodo ON periodo.id = ativ.id
+    WHERE ativ.caso_id IN ({{marcadores}}) AND ativ.id NOT IN (SELECT id FROM arquivo.atividades)
+"""
+SQL_ARQUIVAR_ATIVIDADES = """
+    INSERT INTO arquivo.atividades ({colunas_atividade})
+    SELECT {colunas_atividade} FROM main.atividades
+    WHERE caso_id IN ({marcadores}) AND id NOT IN (SELECT id FROM arquivo.atividades)
+"""
+SQL_LIMPAR_RESUMO_ARQUIVADO = "DELETE FROM arquivo.resumo_situacoes WHERE caso_id IN (0, {marcadores})"
+SQL_RESUMO_ARQUIVADO = """
+    INSERT INTO arquivo.resumo_situacoes (caso_id, situacao, quantidade)
+    SELECT caso_id, COALESCE(situacao, ''), COUNT(*) FROM arquivo.atividades
+    WHERE caso_id IN ({marcadores}) GROUP BY 1, 2
+"""
+SQL_TOTAL_RESUMO_ARQUIVADO = """
+    INSERT INTO arquivo.resumo_situacoes (caso_id, situacao, quantidade)
+    SELECT 0, situacao, SUM(quantidade) FROM arquivo.resumo_situacoes GROUP BY situacao
+"""
+SQL_REMOVER_ATIVIDADES_ARQUIVADAS = "DELETE FROM atividades WHERE caso_id IN ({marcadores})"
+SQL_REMOVER_CASOS_ARQUIVADOS = "DELETE FROM casos WHERE id IN ({marcadores})"
+
+def _preparar_arquivo(conn):
+    """Cria (se preciso) as tabelas do banco de arquivo, anexado com escrita em `conn`."""
+    conn.execute("PRAGMA arquivo.journal_mode = WAL")
+    for comando in migracoes.ESQUEMA_ARQUIVO:
+        conn.execute(comando)
+    if not conn.execute(SQL_ARQUIVO_TEM_PERIODOS).fetchone():
+        for comando in migracoes.PREENCHER_PERIODOS_ARQUIVO:
+            conn.execute(comando)
+    conn.commit()
+
+def _colunas(cursor, tabela):
+    """Colunas da tabela no arquivo, para copiar apenas o que ele guarda."""
+    cursor.execute(f"PRAGMA arquivo.table_info({tabela})")
+    return [row[1] for row in cursor.fetchall()]
+
+def arquivar_casos_antigos(idade_dias, tamanho_lote=10, pausa=0.05):
+    """
+    Move para o banco de arquivo (caminho_arquivo) os relatórios FINALIZADOS cuja data final
+    (ou de início, se não houver) tem mais de `idade_dias` dias, com suas atividades, em lotes de
+    `tamanho_lote` casos. Depois disso continuam visíveis nas consultas, mas somente para leitura.
+    Retorna a quantidade de casos arquivados.
+
+    Com WAL, um COMMIT que envolve dois bancos não é atômico. Por isso cada lote é gravado primeiro
+    no arquivo e só então removido do banco ativo, cujo lock de escrita fica retido durante todo o
+    lote para que ninguém altere os casos no meio do caminho. Se o processo cair entre as duas
+    etapas, os casos ficam nos dois bancos e a próxima execução apenas conclui a remoção.
+    """
+    data_limite = (date.today() - timedelta(days=idade_dias)).isoformat()
+    conn_arquivo = _abrir_conexao(arquivo_somente_leitura=False)
+    arquivados = 0
+    try:
+        _preparar_arquivo(conn_arquivo)
+        cursor_arquivo = conn_arquivo.cursor()
+        colunas_caso = _colunas(cursor_arquivo, 'casos')
+        colunas_atividade = ", ".join(_colunas(cursor_arquivo, 'atividades'))
+        # A versão avança para invalidar as páginas em cache, que passam a ser somente leitura
+        valores_caso = ", ".join('versao + 1' if coluna == 'versao' else coluna for coluna in colunas_caso)
+        colunas_caso = ", ".join(colunas_caso)
+        while True:
+            with get_db_conn() as conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(SQL_CASOS_PARA_ARQUIVAR, (data_limite, tamanho_lote))
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    conn.rollback()
+                    break
+                campos = {'marcadores': ", ".join("?" * len(ids)), 'colunas_caso': colunas_caso,
+                          'valores_caso': valores_caso, 'colunas_atividade': colunas_atividade}
+
+                # 1) Copia para o arquivo o que ainda não estiver lá (índice de texto primeiro)
+                # BEGIN simples: IMMEDIATE tentaria travar também o banco ativo, já travado por `conn`
+                cursor_arquivo.execute("BEGIN")
+                for modelo in (SQL_ARQUIVAR_CASOS_FTS, SQL_ARQUIVAR_CASOS, SQL_ARQUIVAR_ATIVIDADES_FTS,
+                               SQL_ARQUIVAR_PERIODOS, SQL_ARQUIVAR_ATIVIDADES, SQL_LIMPAR_RESUMO_ARQUIVADO,
+                               SQL_RESUMO_ARQUIVADO):
+                    cursor_arquivo.execute(modelo.format(**campos), ids)
+                cursor_arquivo.execute(SQL_TOTAL_RESUMO_ARQUIVADO)
+                conn_arquivo.commit()
+
+                # 2) Remove do banco ativo; os triggers atualizam o índice de texto, o resumo e as versões
+                cursor.execute(SQL_REMOVER_ATIVIDADES_ARQUIVADAS.format(**campos), ids)
+                cursor.execute(SQL_REMOVER_CASOS_ARQUIVADOS.format(**campos), ids)
+                conn.commit()
+            arquivados += len(ids)
+            time.sleep(pausa)
+    finally:
+        conn_arquivo.close()
+    return arquivados
+
+# --- CACHE DE USUÁRIOS ---
+# Usuários lidos em quase toda requisição, guardados por processo. As chaves incluem a geração dos
+# usuários, então uma alteração torna as entradas anteriores inalcançáveis de imediato.
+_cache_usuarios = CacheTTL(config.USUARIOS_CACHE_TTL_SEGUNDOS)
+_geracao_usuarios = {'valor': None, 'lida_em': 0.0}
+
+SQL_GERACAO_USUARIOS = "SELECT valor FROM versoes WHERE chave = 'usuarios'"
+
+def geracao_usuarios():
+    """
+    Versão dos dados de usuários (versoes['usuarios'], alterada por triggers a cada escrita em
+    usuarios). Cada processo a relê do banco no máximo a cada USUARIOS_CACHE_TTL_SEGUNDOS, e na
+    hora após as próprias escritas; nas demais chamadas não há consulta.
+    """
+    if time.monotonic() - _geracao_usuarios['lida_em'] >= config.USUARIOS_CACHE_TTL_SEGUNDOS:
+        _reler_geracao_usuarios()
+    return _geracao_usuarios['valor']
+
+def _reler_geracao_usuarios():
+    with get_db_conn() as conn:
+        resultado = conn.execute(SQL_GERACAO_USUARIOS).fetchone()
+    valor = resultado[0] if resultado else 0
+    if valor != _geracao_usuarios['valor']:
+        # As entradas da geração anterior não seriam mais lidas; só libera a memória
+        _cache_usuarios.limpar()
+    _geracao_usuarios.update(valor=valor, lida_em=time.monotonic())
+
+def _invalidar_usuarios():
+    """Chamada após cada escrita em usuarios feita por este processo."""
+    _reler_geracao_usuarios()
+
+def _nomes_usuarios():
+    """{id: nome_completo} de todos os usuários, pelo cache."""
+    chave = (geracao_usuarios(), 'nomes')
+    nomes = _cache_usuarios.obter(chave)
+    if nomes is None:
+        nomes = {usuario['id']: usuario['nome_completo'] for usuario in buscar_todos_usuarios()}
+        _cache_usuarios.guardar(chave, nomes)
+    return nomes
+
+# --- CÓPIAS DE SEGURANÇA ---
+SQL_LER_ESQUEMA = "SELECT COUNT(*) FROM {esquema}.sqlite_master"
+
+def copiar_banco_online(destino, destino_arquivo=None, paginas_por_passo=256, pausa=0.01):
+    """
+    Copia o banco ativo para `destino` (e o de arquivo, se existir, para `destino_arquivo`) com a
+    API de backup do SQLite, `paginas_por_passo` páginas por vez e `pausa` segundos entre os passos.
+    Uma transação de leitura fica aberta do início ao fim: com WAL ela não bloqueia as escritas, e a
+    cópia sai como o banco estava no início, em vez de recomeçar a cada escrita de outra conexão.
+    As cópias são gravadas sem WAL, em um único arquivo cada. Retorna as páginas copiadas.
+    """
+    origem = _abrir_conexao()
+    copiadas = 0
+
+    def progresso(status, restantes, total):
+        time.sleep(pausa)
+
+    try:
+        origem.execute("BEGIN")
+        # A primeira leitura de cada esquema fixa o instante copiado
+        origem.execute(SQL_LER_ESQUEMA.format(esquema='main')).fetchone()
+        copias = [('main', destino)]
+        if destino_arquivo and origem.arquivo_anexado:
+            origem.execute(SQL_LER_ESQUEMA.format(esquema='arquivo')).fetchone()
+            copias.append(('arquivo', destino_arquivo))
+        for esquema, caminho in copias:
+            conn_destino = sqlite3.connect(caminho)
+            try:
+                origem.backup(conn_destino, pages=paginas_por_passo, progress=progresso, name=esquema)
+                conn_destino.execute("PRAGMA journal_mode = DELETE")
+                copiadas += conn_destino.execute("PRAGMA page_count").fetchone()[0]
+            finally:
+                conn_destino.close()
+    finally:
+        origem.rollback()
+        origem.close()
+    return copiadas
+
+def verificar_integridade(caminho):
+    """Roda PRAGMA integrity_check no arquivo, somente leitura. Retorna os problemas (lista vazia se íntegro)."""
+    try:
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(caminho))}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        return [str(e)]
+    try:
+        resultado = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall()]
+    except sqlite3.Error as e:
+        return [str(e)]
+    finally:
+        conn.close()
+    return [] if resultado == ['ok'] else resultado
+
+def restaurar_banco(origem, arquivo=False):
+    """
+    Substitui o conteúdo do banco ativo (ou do de arquivo, com `arquivo=True`) pelo de `origem`,
+    com a API de backup em um único passo. Ao contrário de trocar o arquivo em disco, isso é seguro
+    com WAL: as demais conexões esperam o fim da cópia e passam a ver o conteúdo restaurado.
+    """
+    conn_origem = sqlite3.connect(f"file:{quote(os.path.abspath(origem))}?mode=ro", uri=True)
+    conn_destino = sqlite3.connect(caminho_arquivo() if arquivo else DB_NAME, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        conn_origem.backup(conn_destino)
+    finally:
+        conn_destino.close()
+        conn_origem.close()
+
+SQL_ALGUM_CASO = "SELECT id FROM casos"
+SQL_ATIVIDADES_EXEMPLO = "SELECT id FROM atividades WHERE caso_id = ?"
+
 def adicionar_caso_exemplo():
     with get_db_conn() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT id FROM casos")
+        cursor.execute(SQL_ALGUM_CASO)
         if cursor.fetchone() is None:
             adicionar_novo_caso('PRIMEIRO RELATÓRIO DO ANO', 'Auditoria', date.today().strftime("%Y-%m-%d"), 'ABERTO')
 
 def adicionar_atividade_exemplo():
     with get_db_conn() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT id FROM atividades WHERE caso_id = ?", (1,))
+        cursor.execute(SQL_ATIVIDADES_EXEMPLO, (1,))
         if cursor.fetchone() is None:
             dados_ativ = {
                 "caso_id": 1, 
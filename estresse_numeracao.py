@@ -0,0 +1,112 @@
+"""
+Teste de estresse da numeração dos relatórios com vários processos escrevendo ao mesmo tempo.
+
+Uso:
+    python estresse_numeracao.py --processos 8 --casos 50
+    python estresse_numeracao.py --processos 8 --casos 50 --lote 5 --banco estresse.db
+
+Cada processo cria `--casos` relatórios com database.adicionar_novo_caso e, entre um e outro,
+reserva `--lote` números com database.reservar_numeros_relatorio (0 desliga as reservas). Todos
+começam juntos. No fim, confere para cada ano que os números (dos relatórios criados e das reservas)
+não se repetem, formam uma sequência sem buracos e terminam no último número de
+sequencias_relatorio. Termina com código 1 se algo falhar.
+
+Sem --banco, usa um banco novo em uma pasta temporária. Um banco existente não pode estar em uso
+por outra aplicação durante o teste, senão os números criados por ela pareceriam buracos.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import database as db
+
+def _trabalhar(banco, casos, lote, barreira, resultados):
+    """Corpo de um processo: devolve em `resultados` (ids dos casos, números reservados, erro)."""
+    db.DB_NAME = banco
+    ids, reservados, erro = [], [], None
+    barreira.wait()
+    try:
+        for i in range(casos):
+            ids.append(db.adicionar_novo_caso(f"Estresse {os.getpid()}-{i}", "Auditoria", "2026-01-01", "PLANEJADO"))
+            if lote:
+                reservados.extend(db.reservar_numeros_relatorio(lote))
+    except sqlite3.Error as e:
+        erro = str(e)
+    resultados.put((ids, reservados, erro))
+
+def _numero(numero_relatorio):
+    ano, numero = numero_relatorio.split('.')
+    return int(ano), int(numero)
+
+def verificar_numeros(numeros, ultimos_da_sequencia):
+    """
+    Confere os números de relatório obtidos no teste. `ultimos_da_sequencia` é {ano: ultimo_numero}
+    de sequencias_relatorio. Devolve a lista de problemas encontrados (vazia se tudo certo).
+    """
+    problemas, por_ano = [], {}
+    for numero_relatorio in numeros:
+        ano, numero = _numero(numero_relatorio)
+        por_ano.setdefault(ano, []).append(numero)
+    for ano, lista in sorted(por_ano.items()):
+        distintos = set(lista)
+        if len(distintos) != len(lista):
+            problemas.append(f"{ano}: {len(lista) - len(distintos)} número(s) repetido(s)")
+        primeiro, ultimo = min(distintos), max(distintos)
+        faltando = (ultimo - primeiro + 1) - len(distintos)
+        if faltando:
+            problemas.append(f"{ano}: {faltando} buraco(s) entre {primeiro} e {ultimo}")
+        if ultimos_da_sequencia.get(ano) != ultimo:
+            problemas.append(f"{ano}: sequência em {ultimos_da_sequencia.get(ano)}, mas o maior número obtido foi {ultimo}")
+    return problemas
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de estresse da numeração dos relatórios.")
+    parser.add_argument("--processos", type=int, default=8)
+    parser.add_argument("--casos", type=int, default=50, help="relatórios criados por processo")
+    parser.add_argument("--lote", type=int, default=3, help="números reservados a cada relatório criado")
+    parser.add_argument("--banco", help="banco a usar (padrão: um banco novo em uma pasta temporária)")
+    args = parser.parse_args()
+
+    banco = args.banco or os.path.join(tempfile.mkdtemp(prefix="sga-estresse-"), "estresse.db")
+    db.DB_NAME = banco
+    db.inicializar_banco()
+
+    barreira = multiprocessing.Barrier(args.processos)
+    resultados = multiprocessing.Queue()
+    processos = [multiprocessing.Process(target=_trabalhar, args=(banco, args.casos, args.lote, barreira, resultados))
+                 for _ in range(args.processos)]
+    inicio = time.perf_counter()
+    for processo in processos:
+        processo.start()
+    # Lê antes do join: um processo só termina depois que a fila entrega o que ele escreveu
+    saidas = [resultados.get() for _ in processos]
+    for processo in processos:
+        processo.join()
+    duracao = time.perf_counter() - inicio
+
+    problemas = [f"processo com erro: {erro}" for _, _, erro in saidas if erro]
+    numeros = [numero for _, reservados, _ in saidas for numero in reservados]
+    for ids, _, _ in saidas:
+        numeros.extend(db.buscar_caso_por_id(id_caso)['numero_relatorio'] for id_caso in ids)
+    with sqlite3.connect(banco) as conn:
+        ultimos = dict(conn.execute("SELECT ano, ultimo_numero FROM sequencias_relatorio").fetchall())
+    if numeros:
+        problemas.extend(verificar_numeros(numeros, ultimos))
+
+    total_casos = sum(len(ids) for ids, _, _ in saidas)
+    print(f"Banco: {banco}")
+    print(f"{args.processos} processo(s): {total_casos} relatório(s) criado(s) e {len(numeros) - total_casos} "
+          f"número(s) reservado(s) em {duracao:.1f} s")
+    for problema in problemas:
+        print(f"Erro: {problema}")
+    if problemas or len(numeros) != args.processos * args.casos * (1 + args.lote):
+        print("Falhou.")
+        return 1
+    print("Nenhum número repetido ou faltando.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Geradores de exportação em CSV, XLSX e PDF.
+
+CSV e XLSX consomem um iterador de linhas (tuplas) e produzem o arquivo em pedaços de bytes,
+prontos para uma `Response` do Flask em streaming: o primeiro pedaço sai antes de a consulta
+terminar e a memória usada não cresce com o número de linhas.
+"""
+import csv
+import io
+import textwrap
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+LINHAS_POR_PEDACO = 500
+
+class _BufferDeSaida(io.RawIOBase):
+    """Arquivo somente-escrita, não posicionável, cujo conteúdo é retirado em pedaços por `esvaziar`."""
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def esvaziar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+def gerar_csv(cabecalho, linhas):
+    """Gera um CSV (UTF-8 com BOM, separado por ';' para abrir direto no Excel em pt-BR)."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';')
+    escritor.writerow(cabecalho)
+    yield '\ufeff'.encode('utf-8') + buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    for i, linha in enumerate(linhas, 1):
+        escritor.writerow(linha)
+        if i % LINHAS_POR_PEDACO == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+# --- XLSX ---
+# Pacote mínimo de uma planilha: uma única aba com strings inline (sem sharedStrings),
+# o que permite escrever as linhas na ordem em que chegam.
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{nome}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_INICIO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_FIM = '</sheetData></worksheet>'
+
+def _celula(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(valor))}</t></is></c>'
+
+def _linha_xml(linha):
+    return '<row>' + ''.join(_celula(valor) for valor in linha) + '</row>'
+
+def gerar_xlsx(cabecalho, linhas, nome_aba='Atividades'):
+    """Gera um arquivo XLSX em streaming, escrevendo o ZIP diretamente em pedaços."""
+    saida = _BufferDeSaida()
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as pacote:
+        pacote.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        pacote.writestr('_rels/.rels', _RELS)
+        pacote.writestr('xl/workbook.xml', _WORKBOOK.format(nome=escape(nome_aba)))
+        pacote.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        with pacote.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as aba:
+            aba.write((_SHEET_INICIO + _linha_xml(cabecalho)).encode('utf-8'))
+            yield saida.esvaziar()
+            pedaco = []
+            for i, linha in enumerate(linhas, 1):
+                pedaco.append(_linha_xml(linha))
+                if i % LINHAS_POR_PEDACO == 0:
+                    aba.write(''.join(pedaco).encode('utf-8'))
+                    pedaco = []
+                    yield saida.esvaziar()
+            aba.write((''.join(pedaco) + _SHEET_FIM).encode('utf-8'))
+    yield saida.esvaziar()
+
+
+# --- PDF ---
+# Documento PDF mínimo, só com texto nas fontes padrão Helvetica (que todo leitor de PDF já tem),
+# codificado em WinAnsi (cp1252), o que cobre a acentuação do português.
+PDF_LARGURA, PDF_ALTURA, PDF_MARGEM = 595, 842, 40  # A4 em pontos
+# Largura média aproximada de um caractere da Helvetica, em frações do tamanho da fonte
+_PDF_LARGURA_MEDIA_CARACTERE = 0.55
+
+def _texto_pdf(texto):
+    bruto = str(texto).encode('cp1252', errors='replace')
+    return bruto.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)').replace(b'\r', b'')
+
+class DocumentoPDF:
+    """
+    Monta um PDF de texto corrido, página a página, quebrando as linhas pela largura aproximada.
+    Uso: doc.paragrafo('...'), doc.espaco(), ... e por fim doc.gerar() devolve os bytes.
+    """
+    def __init__(self, rodape=''):
+        self.rodape = rodape
+        self._paginas = []
+        self._nova_pagina()
+
+    def _nova_pagina(self):
+        self._conteudo = []
+        self._paginas.append(self._conteudo)
+        self._y = PDF_ALTURA - PDF_MARGEM
+
+    def _linha(self, texto, tamanho, negrito):
+        altura = tamanho * 1.35
+        if self._y - altura < PDF_MARGEM + 20:
+            self._nova_pagina()
+        self._y -= altura
+        fonte = b'/F2' if negrito else b'/F1'
+        self._conteudo.append(b'BT %s %d Tf %d %.1f Td (%s) Tj ET' % (
+            fonte, tamanho, PDF_MARGEM, self._y, _texto_pdf(texto)))
+
+    def paragrafo(self, texto, tamanho=9, negrito=False):
+        caracteres_por_linha = int((PDF_LARGURA - 2 * PDF_MARGEM) / (tamanho * _PDF_LARGURA_MEDIA_CARACTERE))
+        for trecho in str(texto).splitlines() or ['']:
+            for linha in textwrap.wrap(trecho, caracteres_por_linha) or ['']:
+                self._linha(linha, tamanho, negrito)
+
+    def espaco(self, pontos=8):
+        self._y -= pontos
+
+    def gerar(self):
+        objetos = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            None,  # /Pages, preenchido depois de conhecer as páginas
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        ]
+        referencias_paginas = []
+        total = len(self._paginas)
+        for numero, conteudo in enumerate(self._paginas, 1):
+            rodape = f"{self.rodape}  -  Página {numero} de {total}".strip(' -')
+            comandos = conteudo + [b'BT /F1 8 Tf %d %d Td (%s) Tj ET' % (PDF_MARGEM, PDF_MARGEM - 10, _texto_pdf(rodape))]
+            fluxo = zlib.compress(b'\n'.join(comandos))
+            objetos.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(fluxo), fluxo))
+            objetos.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+                           b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>'
+                           % (PDF_LARGURA, PDF_ALTURA, len(objetos)))
+            referencias_paginas.append(b'%d 0 R' % len(objetos))
+        objetos[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(referencias_paginas), total)
+
+        saida = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        posicoes = []
+        for numero, objeto in enumerate(objetos, 1):
+            posicoes.append(len(saida))
+            saida += b'%d 0 obj\n%s\nendobj\n' % (numero, objeto)
+        inicio_xref = len(saida)
+        saida += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1)
+        saida += b''.join(b'%010d 00000 n \n' % posicao for posicao in posicoes)
+        saida += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objetos) + 1, inicio_xref)
+        return bytes(saida)
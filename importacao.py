@@ -0,0 +1,168 @@
+"""
+Importação em lote de atividades e usuários a partir de arquivos CSV ou JSON.
+
+Todas as linhas são validadas antes de qualquer gravação, com as mesmas regras dos formulários
+(ver validacao.py). Havendo qualquer erro, nada é gravado e os erros são devolvidos por linha;
+caso contrário, todas as linhas são inseridas com executemany em uma única transação.
+"""
+import csv
+import io
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import database as db
+import validacao
+
+# Colunas aceitas no arquivo de atividades; as ausentes ficam vazias
+CAMPOS_ATIVIDADE = [
+    "atividade_desc", "testes_realizados", "extensao_exames", "criterio_amostragem",
+    "periodo_inicio", "periodo_fim", "situacao", "observacao_resumo",
+    "nao_conformidade", "reincidente", "recomendacao", "data_p_solucao",
+]
+
+# Colunas do arquivo de usuários
+CAMPOS_USUARIO = ["codigo", "nome_completo", "senha", "role"]
+
+# Processos usados para calcular os hashes de senha de uma importação de usuários
+PROCESSOS_HASH = 4
+
+_lock_executor = threading.Lock()
+_executor_hash = None
+_pid_executor_hash = None
+
+def _obter_executor_hash():
+    """Cria o pool de processos na primeira importação do processo (e não ao importar o módulo)."""
+    global _executor_hash, _pid_executor_hash
+    with _lock_executor:
+        if _pid_executor_hash != os.getpid():
+            _executor_hash = ProcessPoolExecutor(max_workers=PROCESSOS_HASH)
+            _pid_executor_hash = os.getpid()
+        return _executor_hash
+
+def gerar_hashes_senha(senhas):
+    """
+    Calcula os hashes em paralelo em outros processos, sem ocupar a CPU do processo que atende a
+    requisição; a thread da requisição, porém, fica esperando até o último hash.
+    """
+    if not senhas:
+        return []
+    return list(_obter_executor_hash().map(db.gerar_hash_senha, senhas, chunksize=64))
+
+def encerrar():
+    """Encerra o pool de processos de hash, se este processo tiver criado um (usada pelo servidor.py)."""
+    global _executor_hash, _pid_executor_hash
+    with _lock_executor:
+        if _executor_hash is not None and _pid_executor_hash == os.getpid():
+            _executor_hash.shutdown(wait=True, cancel_futures=True)
+        _executor_hash = _pid_executor_hash = None
+
+def _valor_importado(valor):
+    """Converte um valor escalar do JSON no texto que viria de um CSV; listas e objetos ficam como estão."""
+    if valor is None:
+        return ""
+    if isinstance(valor, bool):
+        return "1" if valor else "0"
+    if isinstance(valor, (int, float)):
+        return str(valor)
+    return valor
+
+def normalizar_registros(registros):
+    """
+    Confere que os registros vindos de um JSON (arquivo ou corpo da requisição) são uma lista de
+    objetos e converte seus valores escalares como _valor_importado. Lança ValueError se não forem.
+    """
+    if not isinstance(registros, list) or not all(isinstance(r, dict) for r in registros):
+        raise ValueError("O JSON deve ser uma lista de objetos.")
+    return [{chave: _valor_importado(valor) for chave, valor in r.items()} for r in registros]
+
+def _erros_de_tipo(registro, campos):
+    """Mensagens para os campos do registro que não são texto (listas e objetos do JSON)."""
+    return [f"O campo '{campo}' tem tipo inválido: use texto ou número." for campo in campos
+            if not isinstance(registro.get(campo) or "", str)]
+
+def ler_registros(nome_arquivo, conteudo):
+    """
+    Converte o conteúdo (bytes) de um arquivo .csv ou .json em uma lista de dicionários.
+    O CSV deve ter cabeçalho com os nomes das colunas e pode ser separado por ',' ou ';'.
+    O JSON deve ser uma lista de objetos. Lança ValueError se o formato for inválido.
+    """
+    texto = conteudo.decode('utf-8-sig')
+    extensao = nome_arquivo.rsplit('.', 1)[-1].lower() if '.' in nome_arquivo else ''
+    if extensao == 'json':
+        try:
+            registros = json.loads(texto)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON inválido: {e}")
+        return normalizar_registros(registros)
+    if extensao == 'csv':
+        primeira_linha = texto.split('\n', 1)[0]
+        delimitador = ';' if primeira_linha.count(';') > primeira_linha.count(',') else ','
+        return [dict(linha) for linha in csv.DictReader(io.StringIO(texto), delimiter=delimitador)]
+    raise ValueError("Formato de arquivo não suportado. Envie um arquivo .csv ou .json.")
+
+def importar_atividades(id_caso, registros, realizado_por_id):
+    """
+    Valida e insere as atividades no caso informado, registradas em nome de `realizado_por_id`.
+    Retorna (quantidade_inserida, erros), onde erros é uma lista de (nº da linha, [mensagens]).
+    """
+    hoje = date.today().strftime("%Y-%m-%d")
+    atividades, erros = [], []
+    for numero_linha, registro in enumerate(registros, 1):
+        erros_tipo = _erros_de_tipo(registro, CAMPOS_ATIVIDADE)
+        if erros_tipo:
+            erros.append((numero_linha, erros_tipo))
+            continue
+        dados = {campo: (registro.get(campo) or "") for campo in CAMPOS_ATIVIDADE}
+        erros_linha = validacao.validar_atividade(dados)
+        try:
+            dados["reincidente"] = int(dados["reincidente"] or 0)
+        except (TypeError, ValueError):
+            erros_linha.append("O campo 'reincidente' deve ser 0 ou 1.")
+        if erros_linha:
+            erros.append((numero_linha, erros_linha))
+            continue
+        dados.update({"caso_id": id_caso, "realizado_por_id": realizado_por_id, "data_registro": hoje})
+        atividades.append(dados)
+    if erros or not atividades:
+        return 0, erros
+    db.salvar_atividades_em_lote(atividades)
+    return len(atividades), []
+
+def importar_usuarios(registros):
+    """
+    Valida e insere os usuários (colunas codigo, nome_completo, senha e role).
+    Retorna (quantidade_inserida, erros), onde erros é uma lista de (nº da linha, [mensagens]).
+    """
+    preparados, erros = [], []
+    for numero_linha, registro in enumerate(registros, 1):
+        erros_tipo = _erros_de_tipo(registro, CAMPOS_USUARIO)
+        if erros_tipo:
+            erros.append((numero_linha, erros_tipo))
+            continue
+        dados, erros_linha = validacao.preparar_usuario(*(registro.get(campo) for campo in CAMPOS_USUARIO))
+        preparados.append((numero_linha, dados, erros_linha))
+
+    codigos_existentes, usernames_existentes = db.buscar_codigos_e_usernames_existentes(
+        {dados['codigo'] for _, dados, _ in preparados}, {dados['username'] for _, dados, _ in preparados})
+    codigos_vistos, usernames_vistos = set(), set()
+    for numero_linha, dados, erros_linha in preparados:
+        if dados['codigo'] in codigos_existentes or dados['codigo'] in codigos_vistos:
+            erros_linha.append(f'O código "{dados["codigo"]}" já existe.')
+        if dados['username'] in usernames_existentes or dados['username'] in usernames_vistos:
+            erros_linha.append(f'O username gerado "{dados["username"]}" já existe.')
+        codigos_vistos.add(dados['codigo'])
+        usernames_vistos.add(dados['username'])
+        if erros_linha:
+            erros.append((numero_linha, erros_linha))
+    if erros or not preparados:
+        return 0, sorted(erros)
+
+    hashes = gerar_hashes_senha([dados['senha'] for _, dados, _ in preparados])
+    usuarios = [{'codigo': dados['codigo'], 'nome_completo': dados['nome_completo'], 'username': dados['username'],
+                 'password_hash': senha_hash, 'role': dados['role']}
+                for (_, dados, _), senha_hash in zip(preparados, hashes)]
+    if not db.adicionar_usuarios_em_lote(usuarios):
+        return 0, [(0, ['Um código ou username foi cadastrado por outro usuário durante a importação.'])]
+    return len(usuarios), []
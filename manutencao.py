@@ -0,0 +1,251 @@
+"""
+Comandos de manutenção do banco de dados.
+
+Uso:
+    python manutencao.py verificar-resumo          # compara o resumo de situações com as atividades
+    python manutencao.py reconstruir-resumo        # recalcula o resumo de situações
+    python manutencao.py remover-orfas             # remove atividades de casos que não existem mais
+    python manutencao.py recuperar-espaco          # devolve ao disco as páginas livres do banco
+    python manutencao.py ativar-vacuo-incremental  # converte um banco antigo (VACUUM completo, bloqueante)
+    python manutencao.py arquivar --idade-dias 730 # move relatórios finalizados antigos para o arquivo
+    python manutencao.py backup                    # cópia de segurança online (a aplicação segue no ar)
+    python manutencao.py listar-backups
+    python manutencao.py restaurar 20261017-030000 # verifica a cópia e restaura (pare a aplicação antes)
+
+Com config.MANUTENCAO_AUTOMATICA, a aplicação executa arquivar (só se config.ARQUIVAMENTO_IDADE_DIAS
+for definido; o padrão é não arquivar), remover-orfas, recuperar-espaco e, a cada config.BACKUP_INTERVALO_HORAS, backup
+periodicamente em uma thread de segundo plano (ver iniciar_manutencao_automatica).
+"""
+import argparse
+import os
+import shutil
+import sys
+import threading
+from datetime import datetime, timedelta
+import config
+import database as db
+
+# Nome de cada cópia (subpasta de pasta_backups()), seguido opcionalmente de "-sufixo"
+FORMATO_NOME_BACKUP = "%Y%m%d-%H%M%S"
+
+_thread_manutencao = None
+
+def executar_manutencao():
+    """Um ciclo da manutenção automática; cada etapa trabalha em lotes curtos."""
+    arquivados = 0
+    if config.ARQUIVAMENTO_IDADE_DIAS is not None:
+        arquivados = db.arquivar_casos_antigos(config.ARQUIVAMENTO_IDADE_DIAS)
+    removidas = db.remover_atividades_orfas()
+    liberadas = db.recuperar_espaco_livre()
+    if arquivados or removidas or liberadas:
+        print(f"Manutenção: {arquivados} relatório(s) arquivado(s), {removidas} atividade(s) órfã(s) removida(s), "
+              f"{liberadas} página(s) liberada(s).")
+    if config.BACKUP_INTERVALO_HORAS is not None and backup_pendente(config.BACKUP_INTERVALO_HORAS):
+        print(f"Manutenção: cópia de segurança criada em {criar_backup()}.")
+        rotacionar_backups(config.BACKUP_MANTER)
+
+def _laco_manutencao(parar, intervalo):
+    while not parar.wait(intervalo):
+        try:
+            executar_manutencao()
+        except Exception as e:
+            print(f"Erro na manutenção automática: {e}")
+
+def iniciar_manutencao_automatica(intervalo=None):
+    """Inicia (uma vez por processo) a thread de manutenção. Retorna o Event que a encerra."""
+    global _thread_manutencao
+    if _thread_manutencao is not None:
+        return _thread_manutencao.parar
+    parar = threading.Event()
+    _thread_manutencao = threading.Thread(target=_laco_manutencao, name="manutencao-sga", daemon=True,
+                                          args=(parar, intervalo or config.MANUTENCAO_INTERVALO_SEGUNDOS))
+    _thread_manutencao.parar = parar
+    _thread_manutencao.start()
+    return parar
+
+def parar_manutencao_automatica(tempo_limite=5):
+    """Encerra a thread de manutenção, esperando o fim do lote em andamento."""
+    global _thread_manutencao
+    thread, _thread_manutencao = _thread_manutencao, None
+    if thread is not None:
+        thread.parar.set()
+        thread.join(tempo_limite)
+
+# --- CÓPIAS DE SEGURANÇA ---
+def pasta_backups():
+    """Pasta das cópias, ao lado do banco principal: gerenciador_backups/, uma subpasta por cópia."""
+    return os.path.splitext(db.DB_NAME)[0] + '_backups'
+
+def _arquivos_backup(pasta):
+    """Caminhos do banco ativo e do de arquivo dentro de uma cópia (com os mesmos nomes dos originais)."""
+    return (os.path.join(pasta, os.path.basename(db.DB_NAME)),
+            os.path.join(pasta, os.path.basename(db.caminho_arquivo())))
+
+def _data_backup(pasta):
+    try:
+        return datetime.strptime(os.path.basename(pasta)[:15], FORMATO_NOME_BACKUP)
+    except ValueError:
+        return None
+
+def listar_backups():
+    """Pastas das cópias concluídas, da mais recente para a mais antiga."""
+    raiz = pasta_backups()
+    if not os.path.isdir(raiz):
+        return []
+    pastas = [os.path.join(raiz, nome) for nome in os.listdir(raiz) if not nome.startswith('.')]
+    return sorted((pasta for pasta in pastas if _data_backup(pasta)), key=os.path.basename, reverse=True)
+
+def backup_pendente(intervalo_horas):
+    """True se não houver cópia ou se a mais recente tiver mais de `intervalo_horas`."""
+    copias = listar_backups()
+    return not copias or datetime.now() - _data_backup(copias[0]) >= timedelta(hours=intervalo_horas)
+
+def criar_backup(sufixo=None):
+    """
+    Copia o banco ativo e o de arquivo para uma nova subpasta de pasta_backups(), sem parar a
+    aplicação (ver db.copiar_banco_online). A cópia é gravada em uma pasta ".parcial-" e só recebe
+    o nome definitivo quando termina. Retorna o caminho da cópia.
+    """
+    nome = datetime.now().strftime(FORMATO_NOME_BACKUP) + (f"-{sufixo}" if sufixo else "")
+    raiz = pasta_backups()
+    parcial = os.path.join(raiz, f".parcial-{nome}")
+    os.makedirs(parcial)
+    try:
+        db.copiar_banco_online(*_arquivos_backup(parcial), paginas_por_passo=config.BACKUP_PAGINAS_POR_PASSO,
+                               pausa=config.BACKUP_PAUSA_SEGUNDOS)
+        final = os.path.join(raiz, nome)
+        os.rename(parcial, final)
+    except BaseException:
+        shutil.rmtree(parcial, ignore_errors=True)
+        raise
+    return final
+
+def rotacionar_backups(manter):
+    """Remove as cópias além das `manter` mais recentes. Retorna quantas foram removidas."""
+    antigas = listar_backups()[manter:]
+    for pasta in antigas:
+        shutil.rmtree(pasta)
+    return len(antigas)
+
+def restaurar_backup(pasta):
+    """
+    Verifica a integridade dos bancos da cópia e, se estiverem íntegros, guarda o estado atual em
+    uma nova cópia ("-antes-restauracao") e restaura o banco ativo e o de arquivo a partir dela.
+    Retorna a lista de problemas encontrados; se não estiver vazia, nada foi alterado.
+    """
+    banco, arquivo = _arquivos_backup(pasta)
+    if not os.path.exists(banco):
+        return [f"{banco} não encontrado."]
+    problemas = [f"{os.path.basename(caminho)}: {problema}" for caminho in (banco, arquivo)
+                 if os.path.exists(caminho) for problema in db.verificar_integridade(caminho)]
+    if problemas:
+        return problemas
+    criar_backup("antes-restauracao")
+    db.restaurar_banco(banco)
+    if os.path.exists(arquivo):
+        db.restaurar_banco(arquivo, arquivo=True)
+    else:
+        # A cópia é de antes do primeiro arquivamento; o arquivo atual fica só na cópia de segurança
+        for sufixo in ("", "-wal", "-shm"):
+            if os.path.exists(db.caminho_arquivo() + sufixo):
+                os.remove(db.caminho_arquivo() + sufixo)
+    # Uma cópia antiga pode estar em uma versão anterior do esquema
+    db.inicializar_banco()
+    return []
+
+def verificar_resumo(args):
+    divergencias = db.verificar_resumo_situacoes()
+    for caso_id, situacao, no_resumo, real in divergencias:
+        escopo = "geral" if caso_id == 0 else f"caso {caso_id}"
+        print(f"Divergência ({escopo}, situação '{situacao}'): resumo={no_resumo}, real={real}")
+    if divergencias:
+        print("Use 'python manutencao.py reconstruir-resumo' para corrigir.")
+        return 1
+    print("Resumo de situações consistente com as atividades.")
+    return 0
+
+def reconstruir_resumo(args):
+    db.reconstruir_resumo_situacoes()
+    print("Resumo de situações reconstruído.")
+    return 0
+
+def remover_orfas(args):
+    print(f"{db.remover_atividades_orfas()} atividade(s) órfã(s) removida(s).")
+    return 0
+
+def recuperar_espaco(args):
+    if not db.vacuo_incremental_ativo():
+        print("O banco não usa auto_vacuum=INCREMENTAL. Rode 'python manutencao.py ativar-vacuo-incremental' antes.")
+        return 1
+    print(f"{db.recuperar_espaco_livre()} página(s) devolvida(s) ao disco.")
+    return 0
+
+def ativar_vacuo_incremental(args):
+    db.ativar_vacuo_incremental()
+    print("auto_vacuum=INCREMENTAL ativado.")
+    return 0
+
+def arquivar(args):
+    arquivados = db.arquivar_casos_antigos(args.idade_dias)
+    print(f"{arquivados} relatório(s) movido(s) para {db.caminho_arquivo()}.")
+    if arquivados:
+        print(f"{db.recuperar_espaco_livre()} página(s) devolvida(s) ao disco.")
+    return 0
+
+def backup(args):
+    print(f"Cópia de segurança criada em {criar_backup()}.")
+    removidas = rotacionar_backups(args.manter)
+    if removidas:
+        print(f"{removidas} cópia(s) antiga(s) removida(s).")
+    return 0
+
+def listar_backups_cmd(args):
+    copias = listar_backups()
+    for pasta in copias:
+        tamanho = sum(os.path.getsize(caminho) for caminho in _arquivos_backup(pasta) if os.path.exists(caminho))
+        print(f"{os.path.basename(pasta):<36}{tamanho / 1024 / 1024:>10.1f} MB")
+    if not copias:
+        print(f"Nenhuma cópia em {pasta_backups()}.")
+    return 0
+
+def restaurar(args):
+    pasta = args.copia if os.path.isdir(args.copia) else os.path.join(pasta_backups(), args.copia)
+    problemas = restaurar_backup(pasta)
+    for problema in problemas:
+        print(f"Problema na cópia: {problema}")
+    if problemas:
+        print("Nada foi restaurado.")
+        return 1
+    print(f"Banco restaurado a partir de {pasta}. Reinicie a aplicação.")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Comandos de manutenção do banco de dados do SGA.")
+    parser.add_argument("--banco", default=db.DB_NAME, help="arquivo do banco (padrão: %(default)s)")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    comandos.add_parser("verificar-resumo", help="verifica o resumo de situações").set_defaults(funcao=verificar_resumo)
+    comandos.add_parser("reconstruir-resumo", help="reconstrói o resumo de situações").set_defaults(funcao=reconstruir_resumo)
+    comandos.add_parser("remover-orfas", help="remove atividades órfãs em lotes").set_defaults(funcao=remover_orfas)
+    comandos.add_parser("recuperar-espaco", help="executa o vácuo incremental").set_defaults(funcao=recuperar_espaco)
+    comandos.add_parser("ativar-vacuo-incremental",
+                        help="converte o banco para auto_vacuum=INCREMENTAL").set_defaults(funcao=ativar_vacuo_incremental)
+    comando_arquivar = comandos.add_parser("arquivar", help="move relatórios finalizados antigos para o banco de arquivo")
+    comando_arquivar.add_argument("--idade-dias", type=int, default=config.ARQUIVAMENTO_IDADE_DIAS,
+                                  required=config.ARQUIVAMENTO_IDADE_DIAS is None,
+                                  help="idade mínima, em dias, da data final (padrão: config.ARQUIVAMENTO_IDADE_DIAS)")
+    comando_arquivar.set_defaults(funcao=arquivar)
+    comando_backup = comandos.add_parser("backup", help="cria uma cópia de segurança sem parar a aplicação")
+    comando_backup.add_argument("--manter", type=int, default=config.BACKUP_MANTER,
+                                help="cópias mantidas, contando a nova (padrão: %(default)s)")
+    comando_backup.set_defaults(funcao=backup)
+    comandos.add_parser("listar-backups", help="lista as cópias de segurança").set_defaults(funcao=listar_backups_cmd)
+    comando_restaurar = comandos.add_parser("restaurar", help="restaura uma cópia depois de verificar sua integridade")
+    comando_restaurar.add_argument("copia", help="nome da cópia (ver listar-backups) ou caminho da pasta")
+    comando_restaurar.set_defaults(funcao=restaurar)
+    args = parser.parse_args()
+    db.DB_NAME = args.banco
+    db.inicializar_banco()
+    sys.exit(args.funcao(args))
+
+if __name__ == '__main__':
+    main()
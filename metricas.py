@@ -0,0 +1,208 @@
+"""
+Instrumentação da aplicação: latência por rota, quantidade e tempo de SQL por requisição
+e log de consultas lentas. Os valores ficam em memória (por processo) e são expostos no
+formato texto do Prometheus pela rota /metrics.
+"""
+import re
+import sqlite3
+import threading
+import time
+from flask import g, has_request_context
+
+# Consultas que demorarem mais do que isto são registradas no log de consultas lentas
+SQL_LENTO_MS = 100
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_QUANTIDADE = (1, 2, 5, 10, 20, 50, 100, 250)
+
+_lock = threading.Lock()
+
+class Histograma:
+    """Histograma cumulativo no estilo Prometheus, com uma série por combinação de rótulos."""
+    def __init__(self, nome, descricao, buckets):
+        self.nome, self.descricao, self.buckets = nome, descricao, buckets
+        self._series = {}
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with _lock:
+            serie = self._series.setdefault(chave, {'contagens': [0] * len(self.buckets), 'soma': 0.0, 'total': 0})
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie['contagens'][i] += 1
+            serie['soma'] += valor
+            serie['total'] += 1
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} histogram"]
+        with _lock:
+            for chave, serie in sorted(self._series.items()):
+                for limite, contagem in zip(self.buckets, serie['contagens']):
+                    linhas.append(f"{self.nome}_bucket{_rotulos(chave, le=limite)} {contagem}")
+                linhas.append(f"{self.nome}_bucket{_rotulos(chave, le='+Inf')} {serie['total']}")
+                linhas.append(f"{self.nome}_sum{_rotulos(chave)} {serie['soma']}")
+                linhas.append(f"{self.nome}_count{_rotulos(chave)} {serie['total']}")
+        return linhas
+
+class Contador:
+    def __init__(self, nome, descricao):
+        self.nome, self.descricao = nome, descricao
+        self._valores = {}
+
+    def incrementar(self, quantidade=1, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with _lock:
+            self._valores[chave] = self._valores.get(chave, 0) + quantidade
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} counter"]
+        with _lock:
+            for chave, valor in sorted(self._valores.items()):
+                linhas.append(f"{self.nome}{_rotulos(chave)} {valor}")
+        return linhas
+
+class Medidor:
+    """Valor instantâneo (gauge), lido de `obter_valor` no momento da exportação."""
+    def __init__(self, nome, descricao, obter_valor):
+        self.nome, self.descricao, self.obter_valor = nome, descricao, obter_valor
+
+    def exportar(self):
+        return [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} gauge",
+                f"{self.nome} {self.obter_valor()}"]
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _rotulos(chave, **extras):
+    pares = list(chave) + list(extras.items())
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+LATENCIA_ROTAS = Histograma("sga_requisicao_duracao_segundos", "Latência das requisições por rota.", BUCKETS_LATENCIA)
+SQL_POR_REQUISICAO = Histograma("sga_sql_comandos_por_requisicao", "Comandos SQL executados por requisição.",
+                                BUCKETS_QUANTIDADE)
+SQL_TEMPO_POR_REQUISICAO = Histograma("sga_sql_duracao_por_requisicao_segundos",
+                                      "Tempo total gasto em SQL por requisição.", BUCKETS_LATENCIA)
+SQL_COMANDOS = Contador("sga_sql_comandos_total", "Total de comandos SQL executados.")
+SQL_LENTOS = Contador("sga_sql_lentos_total", f"Comandos SQL que levaram mais de {SQL_LENTO_MS} ms.")
+
+# Métricas exportadas em /metrics; outros módulos podem acrescentar as suas com `registrar`
+METRICAS = [LATENCIA_ROTAS, SQL_POR_REQUISICAO, SQL_TEMPO_POR_REQUISICAO, SQL_COMANDOS, SQL_LENTOS]
+
+def registrar(metrica):
+    METRICAS.append(metrica)
+    return metrica
+
+def gerar_texto_prometheus():
+    linhas = []
+    for metrica in METRICAS:
+        linhas.extend(metrica.exportar())
+    return "\n".join(linhas) + "\n"
+
+
+# --- SQL ---
+def _resumir_sql(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+def registrar_sql(sql, params, duracao, novo_comando=True):
+    """
+    Contabiliza um comando (ou uma leitura de resultados, com novo_comando=False) na requisição
+    atual e nas métricas globais. Comandos lentos vão para o log sem os valores dos parâmetros.
+    """
+    if has_request_context():
+        g.sql_comandos = g.get('sql_comandos', 0) + (1 if novo_comando else 0)
+        g.sql_tempo = g.get('sql_tempo', 0.0) + duracao
+    if novo_comando:
+        SQL_COMANDOS.incrementar()
+    if duracao * 1000 >= SQL_LENTO_MS:
+        SQL_LENTOS.incrementar()
+        quantidade_params = len(params) if params else 0
+        etapa = "execução" if novo_comando else "leitura dos resultados"
+        print(f"[SQL LENTO] {duracao * 1000:.1f} ms ({etapa}): {_resumir_sql(sql or '')} "
+              f"[{quantidade_params} parâmetro(s) omitido(s)]")
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """Cursor que mede o tempo de execução e de leitura dos resultados de cada comando."""
+    _sql, _params = None, None
+
+    def execute(self, sql, params=()):
+        self._sql, self._params = sql, params
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            registrar_sql(sql, params, time.perf_counter() - inicio)
+
+    def executemany(self, sql, seq_params):
+        self._sql, self._params = sql, None
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_params)
+        finally:
+            registrar_sql(sql, None, time.perf_counter() - inicio)
+
+    def executescript(self, script):
+        self._sql, self._params = script, None
+        inicio = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            registrar_sql(script, None, time.perf_counter() - inicio)
+
+    def _medir_leitura(self, metodo, *args):
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args)
+        finally:
+            registrar_sql(self._sql, self._params, time.perf_counter() - inicio, novo_comando=False)
+
+    def fetchone(self):
+        return self._medir_leitura(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._medir_leitura(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._medir_leitura(super().fetchall)
+
+class ConexaoInstrumentada(sqlite3.Connection):
+    """
+    Conexão cujos cursores são instrumentados. Os atalhos conn.execute, executemany e executescript
+    do sqlite3 usam um cursor interno, sem passar por cursor(), então são refeitos sobre ele.
+    (O set_trace_callback não serve aqui: não informa o fim dos comandos e repete o comando
+    externo a cada trigger disparado, o que distorceria a contagem.)
+    """
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_params):
+        return self.cursor().executemany(sql, seq_params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+# --- REQUISIÇÕES ---
+def iniciar_requisicao():
+    g.metricas_inicio = time.perf_counter()
+
+def finalizar_requisicao(response, endpoint, incluir_cabecalho=False):
+    """Registra a latência da rota e os totais de SQL da requisição; opcionalmente os devolve no cabeçalho."""
+    inicio = g.get('metricas_inicio')
+    if inicio is None:
+        return response
+    duracao = time.perf_counter() - inicio
+    comandos, tempo_sql = g.get('sql_comandos', 0), g.get('sql_tempo', 0.0)
+    rota = endpoint or 'desconhecida'
+    LATENCIA_ROTAS.observar(duracao, rota=rota, status=response.status_code)
+    SQL_POR_REQUISICAO.observar(comandos, rota=rota)
+    SQL_TEMPO_POR_REQUISICAO.observar(tempo_sql, rota=rota)
+    if incluir_cabecalho:
+        response.headers['X-SGA-Tempos'] = (f"total={duracao * 1000:.1f}ms; sql={tempo_sql * 1000:.1f}ms; "
+                                            f"comandos_sql={comandos}")
+    return response
@@ -0,0 +1,565 @@
+"""
+Migrações versionadas do esquema do banco de dados.
+
+A versão atual do esquema fica guardada em `PRAGMA user_version`. Cada item de MIGRACOES
+corresponde a uma versão (o primeiro é a versão 1) e é aplicado uma única vez, em ordem,
+dentro de uma transação. Para alterar o esquema, acrescente uma nova migração ao final
+da lista — nunca edite uma migração que já foi publicada.
+
+Cada passo de uma migração é um comando SQL ou uma função que recebe o cursor.
+"""
+import ast
+import inspect
+import re
+import sys
+import sqlite3
+import validacao
+
+# Colunas do índice de períodos atividades_periodos (R*Tree de inteiros). Além do período, em dias
+# AAAAMMDD, o auditor e o tipo da atividade (código em tipos_atividade) são dimensões do índice:
+# assim a linha do tempo filtra e agrupa lendo só os nós do R*Tree, sem consultar outras tabelas.
+COLUNAS_PERIODOS = "id, inicio, fim, auditor_min, auditor_max, tipo_min, tipo_max"
+
+def _selecionar_periodos(ativ, origem="", tipos="tipos_atividade"):
+    """
+    SELECT das linhas de atividades_periodos para a atividade `ativ` (lida de `origem`, se houver).
+    Se só uma das datas estiver preenchida, o período é aquele único dia; datas inválidas ou
+    invertidas ficam fora do índice.
+    """
+    inicio = f"CAST(strftime('%Y%m%d', COALESCE({ativ}.periodo_inicio, {ativ}.periodo_fim)) AS INTEGER)"
+    fim = f"CAST(strftime('%Y%m%d', COALESCE({ativ}.periodo_fim, {ativ}.periodo_inicio)) AS INTEGER)"
+    auditor = f"COALESCE({ativ}.realizado_por_id, 0)"
+    return (f"SELECT {ativ}.id, {inicio}, {fim}, {auditor}, {auditor}, tipo.id, tipo.id "
+            f"FROM {origem}{tipos} as tipo "
+            f"WHERE tipo.descricao = COALESCE({ativ}.atividade_desc, '') AND {inicio} <= {fim}")
+
+def _normalizar_datas_periodo(cursor):
+    """Regrava em AAAA-MM-DD as datas de período gravadas em outros formatos; vazias viram NULL."""
+    def normalizar(valor):
+        try:
+            return validacao.normalizar_data(valor)
+        except ValueError:
+            return valor  # mantida como está; a atividade apenas fica fora do índice de períodos
+    cursor.connection.create_function("normalizar_data", 1, normalizar, deterministic=True)
+    for coluna in ("periodo_inicio", "periodo_fim"):
+        cursor.execute(f"""
+            UPDATE atividades SET {coluna} = normalizar_data({coluna})
+            WHERE {coluna} IS NOT NULL AND {coluna} NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'""")
+
+MIGRACOES = [
+    # 1 - Esquema inicial (idempotente, pois bancos antigos já possuem as tabelas)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            codigo TEXT UNIQUE NOT NULL,
+            nome_completo TEXT NOT NULL,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'Auditor'
+        )''',
+        '''
+        CREATE TABLE IF NOT EXISTS casos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, titulo TEXT NOT NULL, numero_relatorio TEXT UNIQUE,
+            tipo TEXT NOT NULL, data_inicio TEXT NOT NULL, data_final TEXT, status TEXT NOT NULL
+        )''',
+        '''
+        CREATE TABLE IF NOT EXISTS atividades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, caso_id INTEGER NOT NULL, atividade_desc TEXT,
+            testes_realizados TEXT, extensao_exames TEXT, criterio_amostragem TEXT,
+            periodo_inicio TEXT,
+            periodo_fim TEXT,
+            observacao_resumo TEXT,
+            realizado_por_id INTEGER,
+            nao_conformidade TEXT, reincidente INTEGER, recomendacao TEXT,
+            data_p_solucao TEXT, data_registro TEXT NOT NULL, situacao TEXT,
+            FOREIGN KEY (caso_id) REFERENCES casos (id) ON DELETE CASCADE,
+            FOREIGN KEY (realizado_por_id) REFERENCES usuarios (id)
+        )''',
+        '''
+        CREATE TABLE IF NOT EXISTS log_exclusoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, id_caso_excluido INTEGER NOT NULL,
+            numero_relatorio_excluido TEXT, titulo_excluido TEXT,
+            usuario_codigo TEXT NOT NULL, usuario_nome TEXT NOT NULL, data_exclusao TEXT NOT NULL
+        )''',
+    ],
+    # 2 - Índices de cobertura da listagem paginada do dashboard (buscar_casos_paginados)
+    [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_casos_listagem
+            ON casos (data_inicio, id, status, tipo, numero_relatorio, titulo, data_final)''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_casos_status_listagem
+            ON casos (status, data_inicio, id, tipo, numero_relatorio, titulo, data_final)''',
+    ],
+    # 3 - Índices das chaves estrangeiras de atividades (busca por caso e por auditor)
+    [
+        "CREATE INDEX IF NOT EXISTS idx_atividades_caso ON atividades (caso_id)",
+        "CREATE INDEX IF NOT EXISTS idx_atividades_realizado_por ON atividades (realizado_por_id)",
+    ],
+    # 4 - Sequência anual de numero_relatorio, semeada com o maior número já usado em cada ano
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS sequencias_relatorio (
+            ano INTEGER PRIMARY KEY, ultimo_numero INTEGER NOT NULL
+        )''',
+        '''
+        INSERT OR IGNORE INTO sequencias_relatorio (ano, ultimo_numero)
+        SELECT CAST(substr(numero_relatorio, 1, 4) AS INTEGER),
+               MAX(CAST(substr(numero_relatorio, instr(numero_relatorio, '.') + 1) AS INTEGER))
+        FROM casos WHERE numero_relatorio LIKE '____.%'
+        GROUP BY 1''',
+    ],
+    # 5 - Índice de texto completo (FTS5) de atividades e relatórios, sincronizado por triggers.
+    #     unicode61 com remove_diacritics faz "nao conformidade" encontrar "não conformidade".
+    [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS atividades_fts USING fts5 (
+            testes_realizados, observacao_resumo, nao_conformidade, recomendacao,
+            content = 'atividades', content_rowid = 'id',
+            tokenize = "unicode61 remove_diacritics 2", prefix = '2 3'
+        )''',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS casos_fts USING fts5 (
+            titulo, content = 'casos', content_rowid = 'id',
+            tokenize = "unicode61 remove_diacritics 2", prefix = '2 3'
+        )''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS atividades_fts_insercao AFTER INSERT ON atividades BEGIN
+            INSERT INTO atividades_fts (rowid, testes_realizados, observacao_resumo, nao_conformidade, recomendacao)
+            VALUES (new.id, new.testes_realizados, new.observacao_resumo, new.nao_conformidade, new.recomendacao);
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS atividades_fts_exclusao AFTER DELETE ON atividades BEGIN
+            INSERT INTO atividades_fts (atividades_fts, rowid, testes_realizados, observacao_resumo, nao_conformidade, recomendacao)
+            VALUES ('delete', old.id, old.testes_realizados, old.observacao_resumo, old.nao_conformidade, old.recomendacao);
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS atividades_fts_atualizacao
+        AFTER UPDATE OF testes_realizados, observacao_resumo, nao_conformidade, recomendacao ON atividades BEGIN
+            INSERT INTO atividades_fts (atividades_fts, rowid, testes_realizados, observacao_resumo, nao_conformidade, recomendacao)
+            VALUES ('delete', old.id, old.testes_realizados, old.observacao_resumo, old.nao_conformidade, old.recomendacao);
+            INSERT INTO atividades_fts (rowid, testes_realizados, observacao_resumo, nao_conformidade, recomendacao)
+            VALUES (new.id, new.testes_realizados, new.observacao_resumo, new.nao_conformidade, new.recomendacao);
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS casos_fts_insercao AFTER INSERT ON casos BEGIN
+            INSERT INTO casos_fts (rowid, titulo) VALUES (new.id, new.titulo);
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS casos_fts_exclusao AFTER DELETE ON casos BEGIN
+            INSERT INTO casos_fts (casos_fts, rowid, titulo) VALUES ('delete', old.id, old.titulo);
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS casos_fts_atualizacao AFTER UPDATE OF titulo ON casos BEGIN
+            INSERT INTO casos_fts (casos_fts, rowid, titulo) VALUES ('delete', old.id, old.titulo);
+            INSERT INTO casos_fts (rowid, titulo) VALUES (new.id, new.titulo);
+        END''',
+        "INSERT INTO atividades_fts (atividades_fts) VALUES ('rebuild')",
+        "INSERT INTO casos_fts (casos_fts) VALUES ('rebuild')",
+    ],
+    # 6 - Versões para ETag e cache de páginas: casos.versao muda a cada escrita no caso ou em suas
+    #     atividades; versoes['casos'] muda a cada alteração que aparece na listagem do dashboard.
+    [
+        "ALTER TABLE casos ADD COLUMN versao INTEGER NOT NULL DEFAULT 1",
+        "CREATE TABLE IF NOT EXISTS versoes (chave TEXT PRIMARY KEY, valor INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO versoes (chave, valor) VALUES ('casos', 1)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS atividades_versao_insercao AFTER INSERT ON atividades BEGIN
+            UPDATE casos SET versao = versao + 1 WHERE id = new.caso_id;
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS atividades_versao_atualizacao AFTER UPDATE ON atividades BEGIN
+            UPDATE casos SET versao = versao + 1 WHERE id IN (old.caso_id, new.caso_id);
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS atividades_versao_exclusao AFTER DELETE ON atividades BEGIN
+            UPDATE casos SET versao = versao + 1 WHERE id = old.caso_id;
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS casos_versao_insercao AFTER INSERT ON casos BEGIN
+            UPDATE versoes SET valor = valor + 1 WHERE chave = 'casos';
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS casos_versao_atualizacao
+        AFTER UPDATE OF titulo, numero_relatorio, tipo, data_inicio, data_final, status ON casos BEGIN
+            UPDATE versoes SET valor = valor + 1 WHERE chave = 'casos';
+            UPDATE casos SET versao = versao + 1 WHERE id = new.id;
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS casos_versao_exclusao AFTER DELETE ON casos BEGIN
+            UPDATE versoes SET valor = valor + 1 WHERE chave = 'casos';
+        END''',
+    ],
+    # 7 - Resumo materializado de atividades por situação, por caso e geral (caso_id = 0), mantido
+    #     por triggers. Decrementos usam UPDATE (nunca upsert) para que a ordem entre os triggers
+    #     e a exclusão em cascata de um caso não crie contagens negativas.
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS resumo_situacoes (
+            caso_id INTEGER NOT NULL, situacao TEXT NOT NULL, quantidade INTEGER NOT NULL,
+            PRIMARY KEY (caso_id, situacao)
+        ) WITHOUT ROWID''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS resumo_situacoes_insercao AFTER INSERT ON atividades BEGIN
+            INSERT INTO resumo_situacoes (caso_id, situacao, quantidade)
+            VALUES (new.caso_id, COALESCE(new.situacao, ''), 1), (0, COALESCE(new.situacao, ''), 1)
+            ON CONFLICT (caso_id, situacao) DO UPDATE SET quantidade = quantidade + 1;
+            UPDATE versoes SET valor = valor + 1 WHERE chave = 'casos';
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS resumo_situacoes_exclusao AFTER DELETE ON atividades BEGIN
+            UPDATE resumo_situacoes SET quantidade = quantidade - 1
+            WHERE caso_id IN (old.caso_id, 0) AND situacao = COALESCE(old.situacao, '');
+            UPDATE versoes SET valor = valor + 1 WHERE chave = 'casos';
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS resumo_situacoes_atualizacao AFTER UPDATE OF situacao, caso_id ON atividades
+        WHEN old.situacao IS NOT new.situacao OR old.caso_id <> new.caso_id BEGIN
+            UPDATE resumo_situacoes SET quantidade = quantidade - 1
+            WHERE caso_id IN (old.caso_id, 0) AND situacao = COALESCE(old.situacao, '');
+            INSERT INTO resumo_situacoes (caso_id, situacao, quantidade)
+            VALUES (new.caso_id, COALESCE(new.situacao, ''), 1), (0, COALESCE(new.situacao, ''), 1)
+            ON CONFLICT (caso_id, situacao) DO UPDATE SET quantidade = quantidade + 1;
+            UPDATE versoes SET valor = valor + 1 WHERE chave = 'casos';
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS resumo_situacoes_exclusao_caso AFTER DELETE ON casos BEGIN
+            DELETE FROM resumo_situacoes WHERE caso_id = old.id;
+        END''',
+        "DELETE FROM resumo_situacoes",
+        '''
+        INSERT INTO resumo_situacoes (caso_id, situacao, quantidade)
+        SELECT caso_id, COALESCE(situacao, ''), COUNT(*) FROM atividades GROUP BY 1, 2''',
+        '''
+        INSERT INTO resumo_situacoes (caso_id, situacao, quantidade)
+        SELECT 0, COALESCE(situacao, ''), COUNT(*) FROM atividades GROUP BY 2''',
+    ],
+    # 8 - Trilha de auditoria das alterações (valores antes/depois em JSON), gravada em lotes
+    #     pelo gravador em segundo plano de auditoria.py
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS log_auditoria (
+            id INTEGER PRIMARY KEY, data_hora TEXT NOT NULL, tabela TEXT NOT NULL,
+            registro_id INTEGER NOT NULL, acao TEXT NOT NULL, usuario_codigo TEXT, usuario_nome TEXT,
+            antes TEXT, depois TEXT
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_log_auditoria_registro ON log_auditoria (tabela, registro_id)",
+    ],
+    # 9 - Fila de geração de PDFs (tarefas_pdf.py); cada versão de um caso é gerada uma única vez
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS tarefas_pdf (
+            id INTEGER PRIMARY KEY, caso_id INTEGER NOT NULL, versao INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'PENDENTE', criada_em TEXT NOT NULL, iniciada_em TEXT,
+            concluida_em TEXT, arquivo TEXT, erro TEXT,
+            UNIQUE (caso_id, versao)
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_tarefas_pdf_status ON tarefas_pdf (status, id)",
+    ],
+    # 10 - Datas de período normalizadas (AAAA-MM-DD) e índice de intervalos R*Tree sobre elas, para
+    #      consultas por data e a linha do tempo por auditor e tipo de atividade. Sincronizado por
+    #      triggers, como o índice de texto completo.
+    [
+        _normalizar_datas_periodo,
+        "CREATE TABLE IF NOT EXISTS tipos_atividade (id INTEGER PRIMARY KEY, descricao TEXT NOT NULL UNIQUE)",
+        "INSERT OR IGNORE INTO tipos_atividade (descricao) SELECT DISTINCT COALESCE(atividade_desc, '') FROM atividades",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS atividades_periodos USING rtree_i32 ({COLUNAS_PERIODOS})",
+        f'''
+        CREATE TRIGGER IF NOT EXISTS atividades_periodos_insercao AFTER INSERT ON atividades BEGIN
+            INSERT OR IGNORE INTO tipos_atividade (descricao) VALUES (COALESCE(new.atividade_desc, ''));
+            INSERT INTO atividades_periodos ({COLUNAS_PERIODOS}) {_selecionar_periodos("new")};
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS atividades_periodos_exclusao AFTER DELETE ON atividades BEGIN
+            DELETE FROM atividades_periodos WHERE id = old.id;
+        END''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS atividades_periodos_atualizacao
+        AFTER UPDATE OF periodo_inicio, periodo_fim, realizado_por_id, atividade_desc ON atividades BEGIN
+            DELETE FROM atividades_periodos WHERE id = old.id;
+            INSERT OR IGNORE INTO tipos_atividade (descricao) VALUES (COALESCE(new.atividade_desc, ''));
+            INSERT INTO atividades_periodos ({COLUNAS_PERIODOS}) {_selecionar_periodos("new")};
+        END''',
+        "DELETE FROM atividades_periodos",
+        f"INSERT INTO atividades_periodos ({COLUNAS_PERIODOS}) "
+        + _selecionar_periodos("ativ", "atividades as ativ, "),
+    ],
+    # 11 - Versão dos dados de usuários (versoes['usuarios']), que muda a cada alteração visível de
+    #      um usuário, para o cache de cada processo perceber as dos outros (ver database.geracao_usuarios)
+    [
+        "INSERT OR IGNORE INTO versoes (chave, valor) VALUES ('usuarios', 1)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS usuarios_versao_insercao AFTER INSERT ON usuarios BEGIN
+            UPDATE versoes SET valor = valor + 1 WHERE chave = 'usuarios';
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS usuarios_versao_atualizacao
+        AFTER UPDATE OF codigo, nome_completo, username, role ON usuarios BEGIN
+            UPDATE versoes SET valor = valor + 1 WHERE chave = 'usuarios';
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS usuarios_versao_exclusao AFTER DELETE ON usuarios BEGIN
+            UPDATE versoes SET valor = valor + 1 WHERE chave = 'usuarios';
+        END''',
+    ],
+]
+
+VERSAO_ATUAL = len(MIGRACOES)
+
+# Esquema do banco de arquivo (relatórios finalizados antigos, ver database.arquivar_casos_antigos),
+# criado no banco anexado como "arquivo". Só recebe inserções em lote, por isso o índice de texto
+# completo é alimentado diretamente pelo arquivamento, sem triggers.
+ESQUEMA_ARQUIVO = [
+    '''
+    CREATE TABLE IF NOT EXISTS arquivo.casos (
+        id INTEGER PRIMARY KEY, titulo TEXT NOT NULL, numero_relatorio TEXT UNIQUE,
+        tipo TEXT NOT NULL, data_inicio TEXT NOT NULL, data_final TEXT, status TEXT NOT NULL,
+        versao INTEGER NOT NULL DEFAULT 1
+    )''',
+    '''
+    CREATE TABLE IF NOT EXISTS arquivo.atividades (
+        id INTEGER PRIMARY KEY, caso_id INTEGER NOT NULL, atividade_desc TEXT,
+        testes_realizados TEXT, extensao_exames TEXT, criterio_amostragem TEXT,
+        periodo_inicio TEXT, periodo_fim TEXT, observacao_resumo TEXT, realizado_por_id INTEGER,
+        nao_conformidade TEXT, reincidente INTEGER, recomendacao TEXT,
+        data_p_solucao TEXT, data_registro TEXT NOT NULL, situacao TEXT
+    )''',
+    '''
+    CREATE INDEX IF NOT EXISTS arquivo.idx_casos_listagem
+        ON casos (data_inicio, id, status, tipo, numero_relatorio, titulo, data_final)''',
+    '''
+    CREATE INDEX IF NOT EXISTS arquivo.idx_casos_status_listagem
+        ON casos (status, data_inicio, id, tipo, numero_relatorio, titulo, data_final)''',
+    "CREATE INDEX IF NOT EXISTS arquivo.idx_atividades_caso ON atividades (caso_id)",
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS arquivo.atividades_fts USING fts5 (
+        testes_realizados, observacao_resumo, nao_conformidade, recomendacao,
+        content = 'atividades', content_rowid = 'id',
+        tokenize = "unicode61 remove_diacritics 2", prefix = '2 3'
+    )''',
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS arquivo.casos_fts USING fts5 (
+        titulo, content = 'casos', content_rowid = 'id',
+        tokenize = "unicode61 remove_diacritics 2", prefix = '2 3'
+    )''',
+    '''
+    CREATE TABLE IF NOT EXISTS arquivo.resumo_situacoes (
+        caso_id INTEGER NOT NULL, situacao TEXT NOT NULL, quantidade INTEGER NOT NULL,
+        PRIMARY KEY (caso_id, situacao)
+    ) WITHOUT ROWID''',
+    # Os códigos de tipo são os de main.tipos_atividade
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS arquivo.atividades_periodos USING rtree_i32 ({COLUNAS_PERIODOS})",
+]
+
+# Preenchem o índice de períodos de um arquivo criado antes da migração 10 (ver database._preparar_arquivo)
+PREENCHER_PERIODOS_ARQUIVO = [
+    "INSERT OR IGNORE INTO main.tipos_atividade (descricao) "
+    "SELECT DISTINCT COALESCE(atividade_desc, '') FROM arquivo.atividades",
+    f"INSERT INTO arquivo.atividades_periodos ({COLUNAS_PERIODOS}) "
+    + _selecionar_periodos("ativ", "arquivo.atividades as ativ, ", "main.tipos_atividade"),
+]
+
+def versao_do_banco(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def aplicar_migracoes(conn):
+    """
+    Aplica, em ordem, as migrações ainda não registradas em `PRAGMA user_version`.
+    Cada migração roda em sua própria transação `BEGIN IMMEDIATE`, e a versão é relida
+    depois de obter o lock, de modo que vários processos iniciando juntos não repetem passos.
+    Retorna a lista de versões aplicadas.
+    """
+    aplicadas = []
+    while versao_do_banco(conn) < VERSAO_ATUAL:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            versao = versao_do_banco(conn)
+            if versao >= VERSAO_ATUAL:
+                conn.rollback()
+                break
+            for passo in MIGRACOES[versao]:
+                if callable(passo):
+                    passo(cursor)
+                else:
+                    cursor.execute(passo)
+            cursor.execute(f"PRAGMA user_version = {versao + 1}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        aplicadas.append(versao + 1)
+    return aplicadas
+
+
+# --- VERIFICAÇÃO DOS PLANOS DE CONSULTA ---
+# Cada consulta ou alteração com filtro de database.py (constantes SQL_* e funções montar_sql_*) fica
+# registrada aqui com parâmetros de exemplo: (nome, params) para as constantes, com um dicionário de
+# campos extras para os modelos que os têm, e (nome, argumentos) para as funções. Um mesmo nome pode
+# aparecer mais de uma vez, uma por variação. As que leem a tabela inteira de propósito ficam em
+# CONSULTAS_SEM_INDICE, com o motivo. verificar_planos_de_consulta() falha para qualquer SQL de
+# database.py que não esteja em uma das duas listas.
+_CAMPOS_ARQUIVAMENTO = {'marcadores': '?, ?', 'colunas_caso': 'id', 'valores_caso': 'id', 'colunas_atividade': 'id'}
+_ATIVIDADE_EDITADA = {'atividade_desc': '', 'testes_realizados': '', 'observacao_resumo': '', 'extensao_exames': '',
+                      'criterio_amostragem': '', 'periodo_inicio': '', 'periodo_fim': '', 'situacao': '', 'id': 1}
+CONSULTAS_VERIFICADAS = [
+    ("SQL_USUARIOS_EXISTENTES", ('1', '2'), {'coluna': 'codigo', 'marcadores': '?, ?'}),
+    ("SQL_USUARIOS_EXISTENTES", ('a', 'b'), {'coluna': 'username', 'marcadores': '?, ?'}),
+    ("SQL_LOGIN", ('x',)),
+    ("SQL_REGRAVAR_HASH_SENHA", ('h', 1, 'h')),
+    ("SQL_USUARIO_POR_ID", (1,)),
+    ("SQL_VALORES_USUARIO", (1,)),
+    ("SQL_ATUALIZAR_USUARIO", ('c', 'n', 'u', 'r', 1)),
+    ("SQL_ATUALIZAR_USUARIO_E_SENHA", ('c', 'n', 'u', 'r', 'h', 1)),
+    ("SQL_GERACAO_USUARIOS", ()),
+    ("SQL_CASO_PARA_EXCLUSAO", (1,)),
+    ("SQL_EXCLUIR_CASO", (1,)),
+    ("montar_sql_casos_paginados", {'limite': 51}),
+    ("montar_sql_casos_paginados", {'posicao': ('9999', 0), 'limite': 51}),
+    ("montar_sql_casos_paginados", {'status': 'ABERTO', 'limite': 51}),
+    ("montar_sql_casos_paginados", {'ano': 2026, 'limite': 51}),
+    ("SQL_CASO_POR_ID", (1,)),
+    ("SQL_VERSAO_CASO", (1,)),
+    ("SQL_VERSAO_CASOS", ()),
+    ("SQL_AVANCAR_VERSAO_CASOS", ()),
+    ("montar_sql_estatisticas_situacao", {'casos_ids': [1, 2]}),
+    ("SQL_ATIVIDADE_POR_ID", (1,)),
+    ("SQL_VALORES_ATIVIDADE", (1, None)),
+    ("SQL_ATUALIZAR_ATIVIDADE", _ATIVIDADE_EDITADA),
+    ("SQL_EXCLUIR_ATIVIDADE", (1, None)),
+    ("SQL_ATIVIDADES_DO_CASO", (1,)),
+    ("SQL_ATIVIDADES_EXEMPLO", (1,)),
+    ("montar_sql_exportacao", {'id_caso': 1}),
+    ("montar_sql_exportacao", {'data_de': '2026-01-01', 'data_ate': '2026-12-31'}),
+    ("SQL_PESQUISA_RELATORIOS", ('[', ']', '"x"*', 50)),
+    ("SQL_PESQUISA_ATIVIDADES", ('[', ']', '"x"*', 50)),
+    ("montar_sql_atividades_no_periodo", {'data_de': '2025-08-19', 'data_ate': '2025-08-19'}),
+    ("montar_sql_atividades_no_periodo", {'data_de': '2025-08-01', 'data_ate': '2025-08-31', 'realizado_por_id': 1}),
+    ("montar_sql_linha_do_tempo", {'data_de': '2025-08-01', 'data_ate': '2025-08-31'}),
+    ("montar_sql_linha_do_tempo", {'data_de': '2025-08-01', 'data_ate': '2025-08-31', 'tipo_id': 1}),
+    ("SQL_TIPO_ATIVIDADE", ('x',)),
+    ("SQL_TAREFA_PDF_DA_VERSAO", (1, 1)),
+    ("SQL_TAREFA_PDF_POR_ID", (1,)),
+    ("SQL_DEVOLVER_TAREFAS_PDF_PARADAS", ('2026-01-01 00:00:00',)),
+    ("SQL_RESERVAR_TAREFA_PDF", ('2026-01-01 00:00:00',)),
+    ("SQL_CONCLUIR_TAREFA_PDF", ('2026-01-01 00:00:00', 'x.pdf', 1)),
+    ("SQL_EXCLUIR_TAREFAS_PDF_ANTERIORES", (1, 1)),
+    ("SQL_FALHAR_TAREFA_PDF", ('2026-01-01 00:00:00', 'erro', 1)),
+    ("SQL_REABRIR_TAREFA_PDF", (1,)),
+    ("SQL_CASOS_ORFAOS", ()),
+    ("SQL_EXCLUIR_LOTE_DO_CASO", (1, 200)),
+    ("SQL_CASOS_PARA_ARQUIVAR", ('2024-01-01', 10)),
+    ("SQL_ARQUIVAR_CASOS_FTS", (1, 2), _CAMPOS_ARQUIVAMENTO),
+    ("SQL_ARQUIVAR_CASOS", (1, 2), _CAMPOS_ARQUIVAMENTO),
+    ("SQL_ARQUIVAR_ATIVIDADES_FTS", (1, 2), _CAMPOS_ARQUIVAMENTO),
+    ("SQL_ARQUIVAR_PERIODOS", (1, 2), _CAMPOS_ARQUIVAMENTO),
+    ("SQL_ARQUIVAR_ATIVIDADES", (1, 2), _CAMPOS_ARQUIVAMENTO),
+    ("SQL_LIMPAR_RESUMO_ARQUIVADO", (1, 2), _CAMPOS_ARQUIVAMENTO),
+    ("SQL_RESUMO_ARQUIVADO", (1, 2), _CAMPOS_ARQUIVAMENTO),
+    ("SQL_REMOVER_ATIVIDADES_ARQUIVADAS", (1, 2), _CAMPOS_ARQUIVAMENTO),
+    ("SQL_REMOVER_CASOS_ARQUIVADOS", (1, 2), _CAMPOS_ARQUIVAMENTO),
+]
+
+CONSULTAS_SEM_INDICE = {
+    "SQL_TODOS_USUARIOS": "lista completa, lida uma vez por geração do cache de usuários",
+    "SQL_NOMES_USUARIOS": "tabela pequena, lida inteira pela linha do tempo",
+    "SQL_DESCRICOES_TIPOS": "tabela pequena, lida inteira pela linha do tempo",
+    "SQL_RESUMO_REAL": "contagem completa, só na verificação e reconstrução do resumo",
+    "SQL_DIVERGENCIAS_RESUMO": "verificação completa do resumo, sob demanda",
+    "SQL_LIMPAR_RESUMO": "reconstrução completa do resumo, sob demanda",
+    "SQL_RECONSTRUIR_RESUMO": "reconstrução completa do resumo, sob demanda",
+    "SQL_LIMPAR_RESUMO_ORFAO": "só roda depois de remover atividades órfãs",
+    "SQL_ARQUIVO_TEM_PERIODOS": "LIMIT 1: só verifica se a tabela está vazia",
+    "SQL_TOTAL_RESUMO_ARQUIVADO": "recalcula o total geral do arquivo a cada lote arquivado",
+    "SQL_LER_ESQUEMA": "só fixa o instante copiado pela cópia de segurança",
+    "SQL_ALGUM_CASO": "dados de exemplo; para no primeiro caso",
+}
+
+# SQL que precisa estar em uma constante SQL_* ou função montar_sql_* (INSERT ... VALUES não filtra nada)
+_SQL_COM_FILTRO = re.compile(r"^\s*(SELECT|UPDATE|DELETE|WITH)\s+\S|^\s*INSERT\b.*\bSELECT\b", re.I | re.S)
+
+def _analisar_database(database):
+    """
+    Lê o código de database.py e devolve (sql_fora_do_registro, unidas): as linhas com SQL escrito
+    dentro das funções e os nomes das consultas executadas via _unir_esquemas.
+    """
+    fora, unidas = [], set()
+    for funcao in ast.parse(inspect.getsource(database)).body:
+        if not isinstance(funcao, ast.FunctionDef):
+            continue
+        for no in ast.walk(funcao):
+            if isinstance(no, ast.Call) and getattr(no.func, 'id', None) == '_unir_esquemas' and len(no.args) > 1:
+                modelo = no.args[1].value if isinstance(no.args[1], ast.Starred) else no.args[1]
+                unidas.add(getattr(getattr(modelo, 'func', modelo), 'id', None))
+            if funcao.name.startswith('montar_sql_'):
+                continue
+            if isinstance(no, ast.JoinedStr):
+                texto = "".join(parte.value if isinstance(parte, ast.Constant) else "x" for parte in no.values)
+            elif isinstance(no, ast.Constant) and isinstance(no.value, str):
+                texto = no.value
+            else:
+                continue
+            if _SQL_COM_FILTRO.match(texto):
+                fora.append((funcao.name, no.lineno))
+    return fora, unidas
+
+def _anexar_arquivo_vazio(conn):
+    """Anexa um banco de arquivo em memória, se `conn` não tiver um, para verificar as consultas nele."""
+    if not any(linha[1] == 'arquivo' for linha in conn.execute("PRAGMA database_list")):
+        conn.execute("ATTACH DATABASE ':memory:' AS arquivo")
+        for comando in ESQUEMA_ARQUIVO:
+            conn.execute(comando)
+
+def verificar_planos_de_consulta(conn):
+    """
+    Roda EXPLAIN QUERY PLAN em cada consulta de CONSULTAS_VERIFICADAS, nos dois esquemas quando a
+    consulta tem {esquema} (e na forma UNION ALL, se for executada assim), e devolve a lista de
+    (nome, detalhe) para cada varredura completa de tabela encontrada e para cada SQL de
+    database.py sem registro aqui. Lista vazia = tudo indexado.
+    """
+    import database
+    _anexar_arquivo_vazio(conn)
+    fora, unidas = _analisar_database(database)
+    problemas = [(funcao, f"SQL na linha {linha} de database.py fora de uma constante SQL_* ou função montar_sql_*")
+                 for funcao, linha in fora]
+    registradas = {registro[0] for registro in CONSULTAS_VERIFICADAS}
+    for nome in sorted(vars(database)):
+        if nome.startswith(('SQL_', 'montar_sql_')) and nome not in registradas and nome not in CONSULTAS_SEM_INDICE:
+            problemas.append((nome, "não registrada em CONSULTAS_VERIFICADAS nem em CONSULTAS_SEM_INDICE"))
+
+    for nome, exemplo, *campos in CONSULTAS_VERIFICADAS:
+        consulta = getattr(database, nome, None)
+        if consulta is None:
+            problemas.append((nome, "não existe em database.py"))
+            continue
+        if callable(consulta):
+            sql, params = consulta(**exemplo)
+        else:
+            sql, params = consulta.format(**campos[0]) if campos else consulta, exemplo
+        if '{esquema}' not in sql:
+            formas = [(sql, params)]
+        else:
+            formas = [(database.unir_esquemas(sql, [esquema]), params) for esquema in database.ESQUEMAS]
+            if nome in unidas:
+                formas.append((database.unir_esquemas(sql), list(params) * len(database.ESQUEMAS)))
+        for sql, params in formas:
+            for linha in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+                detalhe = linha[-1]
+                # Tabelas virtuais (FTS5) aparecem como "SCAN ... VIRTUAL TABLE INDEX", e as partes de um
+                # UNION ALL como "SCAN (subquery-N)", o que é esperado
+                if (detalhe.startswith("SCAN ") and not detalhe.startswith("SCAN (subquery-")
+                        and " USING " not in detalhe and " VIRTUAL TABLE " not in detalhe):
+                    problemas.append((nome, detalhe))
+    return problemas
+
+if __name__ == '__main__':
+    # Uso: python migracoes.py [caminho_do_banco]  (padrão: banco em memória)
+    conexao = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else ':memory:')
+    print(f"Migrações aplicadas: {aplicar_migracoes(conexao) or 'nenhuma'}")
+    encontrados = verificar_planos_de_consulta(conexao)
+    for nome, detalhe in encontrados:
+        print(f"{nome}: {detalhe}")
+    if encontrados:
+        sys.exit(1)
+    print("Todas as consultas registradas e sem varredura completa de tabela.")
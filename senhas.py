@@ -0,0 +1,120 @@
+"""
+Hash e verificação das senhas dos usuários.
+
+As senhas são gravadas com scrypt (hashlib), caro de propósito em CPU e memória (cerca de 16 MB e
+dezenas de milissegundos por cálculo). Para que uma rajada de logins, como na troca de turno, não
+ocupe todas as threads de requisição, as rotas calculam os hashes por meio de executar(): um pool
+fixo de config.SENHAS_TRABALHADORES threads por processo, com no máximo config.SENHAS_FILA_MAX
+cálculos aguardando a vez. Se a fila estiver cheia, ou a espera passar de
+config.SENHAS_ESPERA_MAX_SEGUNDOS, executar() lança SistemaOcupado e a rota responde 503.
+
+Hashes antigos (SHA-256 sem sal, 64 dígitos hexadecimais) continuam aceitos e são regravados com
+scrypt no primeiro login correto (ver database.verificar_login).
+"""
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent import futures
+import config
+import metricas
+
+# Parâmetros do scrypt dos novos hashes; hashes com outros parâmetros são refeitos no login
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+TAMANHO_SAL = 16
+TAMANHO_CHAVE = 32
+PREFIXO = "scrypt"
+
+RECUSADOS = metricas.registrar(metricas.Contador(
+    "sga_senhas_recusadas_total", "Cálculos de senha recusados por excesso de carga, por motivo."))
+ESPERA = metricas.registrar(metricas.Histograma(
+    "sga_senhas_espera_segundos", "Tempo na fila antes do cálculo de cada hash de senha.", metricas.BUCKETS_LATENCIA))
+
+class SistemaOcupado(Exception):
+    """Há cálculos de senha demais na fila; o usuário deve tentar de novo em instantes."""
+
+_lock = threading.Lock()
+_executor = None
+_vagas = None
+_pid_executor = None
+_hash_ficticio = None
+
+def _scrypt(senha, sal, n, r, p):
+    return hashlib.scrypt(senha.encode(), salt=sal, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=TAMANHO_CHAVE)
+
+def gerar_hash(senha):
+    """Hash no formato scrypt$N$r$p$sal$chave (sal e chave em hexadecimal)."""
+    sal = os.urandom(TAMANHO_SAL)
+    chave = _scrypt(senha, sal, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"{PREFIXO}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${sal.hex()}${chave.hex()}"
+
+def verificar(senha, hash_gravado):
+    """Retorna True se a senha confere com o hash gravado (scrypt ou SHA-256 antigo)."""
+    if not hash_gravado.startswith(PREFIXO + "$"):
+        return hmac.compare_digest(hashlib.sha256(senha.encode()).hexdigest(), hash_gravado)
+    try:
+        _, n, r, p, sal, chave = hash_gravado.split("$")
+        calculada = _scrypt(senha, bytes.fromhex(sal), int(n), int(r), int(p))
+        return hmac.compare_digest(calculada, bytes.fromhex(chave))
+    except ValueError:
+        print("Erro: hash de senha em formato inválido.")
+        return False
+
+def precisa_atualizar(hash_gravado):
+    """True para hashes SHA-256 antigos ou gerados com outros parâmetros do scrypt."""
+    return not hash_gravado.startswith(f"{PREFIXO}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+def hash_ficticio():
+    """Hash usado quando o código não existe, para que o login custe o mesmo nos dois casos."""
+    global _hash_ficticio
+    if _hash_ficticio is None:
+        _hash_ficticio = gerar_hash(os.urandom(16).hex())
+    return _hash_ficticio
+
+def _obter_executor():
+    """Cria o pool na primeira chamada do processo (threads não sobrevivem ao fork)."""
+    global _executor, _vagas, _pid_executor
+    with _lock:
+        if _pid_executor != os.getpid():
+            _executor = futures.ThreadPoolExecutor(max_workers=config.SENHAS_TRABALHADORES,
+                                                   thread_name_prefix="senhas")
+            _vagas = threading.BoundedSemaphore(config.SENHAS_TRABALHADORES + config.SENHAS_FILA_MAX)
+            _pid_executor = os.getpid()
+        return _executor, _vagas
+
+def _medir_espera(enfileirado, funcao, args):
+    ESPERA.observar(time.perf_counter() - enfileirado)
+    return funcao(*args)
+
+def executar(funcao, *args):
+    """
+    Executa funcao(*args) (gerar_hash ou verificar) no pool de senhas e devolve o resultado.
+    Lança SistemaOcupado se a fila estiver cheia ou se o cálculo não começar dentro do limite.
+    """
+    executor, vagas = _obter_executor()
+    if not vagas.acquire(blocking=False):
+        RECUSADOS.incrementar(motivo='fila_cheia')
+        raise SistemaOcupado()
+    try:
+        futuro = executor.submit(_medir_espera, time.perf_counter(), funcao, args)
+    except RuntimeError:
+        vagas.release()
+        raise
+    futuro.add_done_callback(lambda _: vagas.release())
+    try:
+        return futuro.result(timeout=config.SENHAS_ESPERA_MAX_SEGUNDOS)
+    except futures.TimeoutError:
+        # O limite vale para a espera na fila; um cálculo já iniciado termina em instantes
+        if not futuro.cancel():
+            return futuro.result()
+        RECUSADOS.incrementar(motivo='tempo_esgotado')
+        raise SistemaOcupado()
+
+def encerrar():
+    """Para o pool de senhas do processo, terminando os cálculos em andamento."""
+    with _lock:
+        if _executor is not None and _pid_executor == os.getpid():
+            _executor.shutdown(wait=True, cancel_futures=True)
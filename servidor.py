@@ -0,0 +1,203 @@
+"""
+Servidor de produção da aplicação (o `python app.py` é só para desenvolvimento).
+
+Uso:
+    python servidor.py [--host 0.0.0.0] [--porta 8000] [--processos N] [--threads N]
+
+O processo mestre abre o socket e cria, com fork, config.SERVIDOR_PROCESSOS processos de trabalho,
+cada um atendendo as requisições em um pool fixo de config.SERVIDOR_THREADS threads (servidor WSGI
+do werkzeug). Cada processo abre suas conexões e aplica as migrações depois do fork, pré-compila os
+templates e só então passa a aceitar conexões (ver app.iniciar_processo). O primeiro processo fica
+pronto antes dos demais serem criados, de modo que só ele executa migrações pendentes, e apenas ele
+roda a manutenção automática. Um processo que morrer é substituído.
+
+SIGTERM ou Ctrl+C encerram de forma ordenada: os processos param de aceitar conexões, terminam as
+requisições em andamento, gravam a auditoria pendente e saem; os que não terminarem em
+config.SERVIDOR_TEMPO_ENCERRAMENTO segundos são finalizados. Sem fork (Windows), roda um único
+processo com o pool de threads.
+"""
+import argparse
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+import config
+from app import app, iniciar_processo, encerrar_processo
+
+# Espera antes de recriar um processo que morreu, para não entrar em laço se ele falha ao iniciar
+ESPERA_RECRIACAO_SEGUNDOS = 1
+
+class _Manipulador(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Conexões keep-alive ociosas devolvem a thread ao pool depois disso
+    timeout = 5
+
+class ServidorWSGI(BaseWSGIServer):
+    """Servidor WSGI do werkzeug sobre um socket já aberto, com um pool fixo de threads."""
+    multithread = True
+
+    def __init__(self, sock, threads):
+        host, porta = sock.getsockname()[:2]
+        self._executor = None
+        super().__init__(host, porta, app, handler=_Manipulador, fd=sock.fileno())
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http-sga")
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        """Para de aceitar conexões e espera as requisições em andamento terminarem."""
+        super().server_close()
+        # O werkzeug também chama server_close() durante o __init__, antes de o pool existir
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+def _trabalhar(sock, threads, indice, aviso):
+    """Corpo de um processo de trabalho, já depois do fork."""
+    servidor = None
+    encerrando = threading.Event()
+
+    def encerrar(sinal, quadro):
+        encerrando.set()
+        if servidor is not None:
+            # shutdown() espera o laço de serve_forever terminar, então não pode rodar nesta thread
+            threading.Thread(target=servidor.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, encerrar)
+    # O Ctrl+C chega a todo o grupo de processos; quem coordena o encerramento é o mestre
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    iniciar_processo(manutencao_automatica=config.MANUTENCAO_AUTOMATICA and indice == 0)
+    servidor = ServidorWSGI(sock, threads)
+    if aviso is not None:
+        os.write(aviso, b".")
+    try:
+        if not encerrando.is_set():
+            servidor.serve_forever()
+    finally:
+        servidor.server_close()
+        encerrar_processo()
+
+def _criar_trabalhador(sock, threads, indice, aviso=None):
+    pid = os.fork()
+    if pid:
+        return pid
+    codigo = 0
+    try:
+        _trabalhar(sock, threads, indice, aviso)
+    except BaseException as e:
+        print(f"Erro no processo de trabalho {os.getpid()}: {e}")
+        codigo = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(codigo)
+
+def _esperar_pronto(pid, leitura):
+    """Espera o processo avisar que está pronto. Retorna False se ele morrer antes disso."""
+    while True:
+        if select.select([leitura], [], [], 0.5)[0]:
+            os.read(leitura, 1)
+            return True
+        if os.waitpid(pid, os.WNOHANG)[0]:
+            return False
+
+def _servir_sem_fork(sock, threads):
+    iniciar_processo()
+    servidor = ServidorWSGI(sock, threads)
+    try:
+        servidor.serve_forever()
+    finally:
+        encerrar_processo()
+
+def servir(host, porta, processos, threads):
+    sock = socket.create_server((host, porta), backlog=1024)
+    print(f"Servidor em http://{host}:{porta} com {processos} processo(s) de {threads} thread(s).")
+    if not hasattr(os, 'fork'):
+        return _servir_sem_fork(sock, threads)
+
+    pid_mestre = os.getpid()
+    trabalhadores = {}
+    encerrando = False
+    prazo = None
+
+    def encerrar(sinal, quadro):
+        nonlocal encerrando, prazo
+        if os.getpid() != pid_mestre or encerrando:
+            return
+        encerrando = True
+        prazo = time.monotonic() + config.SERVIDOR_TEMPO_ENCERRAMENTO
+        for pid in list(trabalhadores):
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+
+    def iniciar(indice, aviso=None):
+        pid = _criar_trabalhador(sock, threads, indice, aviso)
+        trabalhadores[pid] = indice
+        if encerrando:
+            os.kill(pid, signal.SIGTERM)
+        return pid
+
+    # O primeiro processo aplica as migrações pendentes sozinho; os demais são criados depois
+    leitura, escrita = os.pipe()
+    primeiro = iniciar(0, escrita)
+    pronto = _esperar_pronto(primeiro, leitura)
+    os.close(leitura)
+    os.close(escrita)
+    if not pronto:
+        trabalhadores.pop(primeiro)
+        if not encerrando:
+            print("O primeiro processo de trabalho falhou ao iniciar.")
+            return 1
+    for indice in range(1, processos if not encerrando else 0):
+        iniciar(indice)
+
+    # Sem bloquear em os.wait(): ele é retomado depois do sinal (PEP 475), e o prazo do
+    # encerramento, contado a partir do SIGTERM, nunca seria conferido se nenhum processo saísse
+    while trabalhadores:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if not pid:
+            if encerrando and time.monotonic() >= prazo:
+                break
+            time.sleep(0.1)
+            continue
+        indice = trabalhadores.pop(pid, None)
+        if indice is None or encerrando:
+            continue
+        print(f"Processo de trabalho {pid} terminou (status {status}); criando outro.")
+        time.sleep(ESPERA_RECRIACAO_SEGUNDOS)
+        iniciar(indice)
+
+    for pid in trabalhadores:
+        print(f"Processo de trabalho {pid} não terminou a tempo; finalizando.")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    sock.close()
+    print("Servidor encerrado.")
+    return 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor de produção do SGA.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--porta", type=int, default=8000)
+    parser.add_argument("--processos", type=int, default=config.SERVIDOR_PROCESSOS)
+    parser.add_argument("--threads", type=int, default=config.SERVIDOR_THREADS)
+    args = parser.parse_args()
+    sys.exit(servir(args.host, args.porta, args.processos, args.threads))
@@ -0,0 +1,159 @@
+"""
+Fila de geração dos PDFs dos relatórios, fora das requisições.
+
+A rota apenas registra a tarefa na tabela tarefas_pdf e responde na hora; um grupo de threads
+trabalhadoras (config.PDF_TRABALHADORES por processo) reserva as tarefas pendentes no banco,
+gera o PDF e o grava em disco. Como a fila fica no SQLite, vários processos podem dividir o
+trabalho, e tarefas de um processo que caiu voltam para a fila após TEMPO_LIMITE_SEGUNDOS.
+
+Cada tarefa corresponde a uma versão do caso (casos.versao muda a cada alteração nele ou em
+suas atividades): pedir de novo o PDF de um relatório que não mudou devolve o arquivo já gerado.
+"""
+import atexit
+import os
+import threading
+import time
+import config
+import database as db
+import exportacao
+import metricas
+
+# Espera máxima por novas tarefas (as de outros processos só são vistas nessa verificação)
+INTERVALO_VERIFICACAO_SEGUNDOS = 2
+TEMPO_LIMITE_SEGUNDOS = 600
+
+TAREFAS = metricas.registrar(metricas.Contador("sga_pdf_tarefas_total", "Tarefas de PDF finalizadas, por status."))
+DURACAO = metricas.registrar(metricas.Histograma("sga_pdf_geracao_duracao_segundos", "Tempo de geração de cada PDF.",
+                                                 metricas.BUCKETS_LATENCIA))
+
+_aviso = threading.Event()
+_lock = threading.Lock()
+_trabalhadores = []
+
+# Campos de cada atividade no PDF, na ordem em que aparecem: (chave, rótulo)
+CAMPOS_ATIVIDADE_PDF = [
+    ("realizado_por_nome", "Realizado por"),
+    ("situacao", "Situação"),
+    ("testes_realizados", "Testes realizados"),
+    ("extensao_exames", "Extensão dos exames"),
+    ("criterio_amostragem", "Critério da amostragem"),
+    ("observacao_resumo", "Observação / Resumo"),
+    ("nao_conformidade", "Não conformidade"),
+    ("recomendacao", "Recomendação"),
+    ("data_p_solucao", "Data p/ solução"),
+    ("data_registro", "Data de registro"),
+]
+
+def pasta_pdfs():
+    """Pasta dos PDFs gerados, ao lado do banco principal: gerenciador_pdfs/."""
+    return os.path.splitext(db.DB_NAME)[0] + '_pdfs'
+
+def caminho_pdf(tarefa):
+    return os.path.join(pasta_pdfs(), tarefa['arquivo'])
+
+def montar_pdf_relatorio(caso, atividades):
+    """Monta o PDF (bytes) com o cabeçalho do caso e suas atividades."""
+    doc = exportacao.DocumentoPDF(rodape=f"SGA - Relatório {caso['numero_relatorio'] or caso['id']}")
+    doc.paragrafo(caso['titulo'], tamanho=14, negrito=True)
+    doc.espaco(4)
+    doc.paragrafo(f"Nº Relatório: {caso['numero_relatorio']}    Tipo: {caso['tipo']}    Situação: {caso['status']}")
+    doc.paragrafo(f"Período: de {caso['data_inicio']} até {caso['data_final'] or '...'}")
+    doc.espaco(12)
+    for ativ in atividades:
+        doc.paragrafo(f"Atividade nº {ativ['id']} - {ativ['atividade_desc'] or ''}", tamanho=10, negrito=True)
+        if ativ['periodo_inicio'] or ativ['periodo_fim']:
+            doc.paragrafo(f"Período: de {ativ['periodo_inicio'] or '...'} até {ativ['periodo_fim'] or '...'}")
+        for chave, rotulo in CAMPOS_ATIVIDADE_PDF:
+            if ativ.get(chave):
+                doc.paragrafo(f"{rotulo}: {ativ[chave]}")
+        if ativ.get('reincidente'):
+            doc.paragrafo("Reincidente: Sim")
+        doc.espaco()
+    if not atividades:
+        doc.paragrafo("Nenhuma atividade registrada.")
+    return doc.gerar()
+
+def solicitar(id_caso):
+    """
+    Pede o PDF da versão atual do caso e devolve a tarefa (dict), ou None se o caso não existir.
+    Se essa versão já foi gerada, a tarefa volta com status CONCLUIDA e nada é refeito.
+    """
+    versao = db.buscar_versao_caso(id_caso)
+    if versao is None:
+        return None
+    tarefa = db.solicitar_tarefa_pdf(id_caso, versao)
+    if tarefa['status'] == 'CONCLUIDA' and not os.path.exists(caminho_pdf(tarefa)):
+        db.reabrir_tarefa_pdf(tarefa['id'])
+        tarefa = db.buscar_tarefa_pdf(tarefa['id'])
+    if tarefa['status'] == 'PENDENTE':
+        iniciar_trabalhadores()
+        _aviso.set()
+    return tarefa
+
+def processar_tarefa(tarefa):
+    """Gera e grava o PDF de uma tarefa reservada, registrando a conclusão ou o erro."""
+    inicio = time.perf_counter()
+    try:
+        caso = db.buscar_caso_por_id(tarefa['caso_id'])
+        atividades = db.buscar_atividades_completas_por_caso_id(tarefa['caso_id']) if caso else []
+        # A versão é conferida antes e depois das leituras: se mudou, o PDF misturaria duas versões
+        if not caso or caso['versao'] != tarefa['versao'] or db.buscar_versao_caso(caso['id']) != tarefa['versao']:
+            db.falhar_tarefa_pdf(tarefa['id'], "O relatório foi alterado durante a geração. Solicite o PDF novamente.")
+            TAREFAS.incrementar(status='ERRO')
+            return
+        conteudo = montar_pdf_relatorio(caso, atividades)
+        arquivo = f"relatorio_{caso['id']}_v{tarefa['versao']}.pdf"
+        os.makedirs(pasta_pdfs(), exist_ok=True)
+        caminho = os.path.join(pasta_pdfs(), arquivo)
+        with open(caminho + '.tmp', 'wb') as saida:
+            saida.write(conteudo)
+        os.replace(caminho + '.tmp', caminho)
+        for antigo in db.concluir_tarefa_pdf(tarefa['id'], arquivo):
+            try:
+                os.remove(os.path.join(pasta_pdfs(), antigo))
+            except FileNotFoundError:
+                pass
+        TAREFAS.incrementar(status='CONCLUIDA')
+    except Exception as e:
+        print(f"Erro ao gerar o PDF do relatório {tarefa['caso_id']}: {e}")
+        db.falhar_tarefa_pdf(tarefa['id'], str(e))
+        TAREFAS.incrementar(status='ERRO')
+    finally:
+        DURACAO.observar(time.perf_counter() - inicio)
+
+def _laco_trabalhador(parar):
+    while not parar.is_set():
+        try:
+            tarefa = db.reservar_tarefa_pdf(TEMPO_LIMITE_SEGUNDOS)
+        except Exception as e:
+            print(f"Erro ao reservar tarefa de PDF: {e}")
+            tarefa = None
+        if tarefa is None:
+            if _aviso.wait(INTERVALO_VERIFICACAO_SEGUNDOS):
+                _aviso.clear()
+            continue
+        processar_tarefa(tarefa)
+
+def iniciar_trabalhadores(quantidade=None):
+    """Inicia (uma vez por processo) as threads que geram os PDFs."""
+    with _lock:
+        if _trabalhadores:
+            return
+        parar = threading.Event()
+        for i in range(quantidade or config.PDF_TRABALHADORES):
+            thread = threading.Thread(target=_laco_trabalhador, args=(parar,), name=f"pdf-sga-{i + 1}", daemon=True)
+            thread.parar = parar
+            thread.start()
+            _trabalhadores.append(thread)
+
+@atexit.register
+def encerrar(tempo_limite=5):
+    """Para as threads; uma geração interrompida volta para a fila após TEMPO_LIMITE_SEGUNDOS."""
+    with _lock:
+        threads = list(_trabalhadores)
+        _trabalhadores.clear()
+    for thread in threads:
+        thread.parar.set()
+    _aviso.set()
+    for thread in threads:
+        thread.join(tempo_limite)
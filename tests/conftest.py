@@ -0,0 +1,29 @@
+import os
+import queue
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'testes')
+
+import config
+import database as db
+
+@pytest.fixture
+def cliente_admin(tmp_path, monkeypatch):
+    """Test client do Flask já logado como Admin, sobre um banco novo em uma pasta temporária."""
+    monkeypatch.setattr(config, 'MANUTENCAO_AUTOMATICA', False)
+    monkeypatch.setattr(db, 'DB_NAME', str(tmp_path / 'teste.db'))
+    monkeypatch.setattr(db, '_pool', queue.LifoQueue(maxsize=db.POOL_MAX_CONEXOES))
+    db._cache_usuarios.limpar()
+    db._geracao_usuarios.update(valor=None, lida_em=0.0)
+    db.inicializar_banco()
+    db.adicionar_usuario("ADM01", "ADMIN DOS TESTES", "admin.testes", "senha-admin", "Admin")
+    db.adicionar_caso_exemplo()
+    from app import app
+    cliente = app.test_client()
+    resposta = cliente.post('/login', data={'codigo': 'ADM01', 'senha': 'senha-admin'})
+    assert resposta.status_code == 302
+    yield cliente
+    while not db._pool.empty():
+        db._pool.get_nowait().close()
@@ -0,0 +1,13 @@
+from cache import CacheLRU
+
+def test_cache_lru_conta_texto_em_bytes_utf8():
+    cache = CacheLRU(max_bytes=10)
+    cache.guardar("a", "ção")  # 3 caracteres, 5 bytes
+    cache.guardar("b", "ééé")  # 3 caracteres, 6 bytes: ultrapassa o limite e descarta "a"
+    assert cache.obter("a") is None
+    assert cache.obter("b") == "ééé"
+
+def test_cache_lru_ignora_valor_maior_que_o_limite():
+    cache = CacheLRU(max_bytes=4)
+    cache.guardar("a", "ééé")
+    assert len(cache) == 0
@@ -0,0 +1,15 @@
+import database as db
+
+def test_criar_atividade_json_sem_campos_opcionais(cliente_admin):
+    resposta = cliente_admin.post('/relatorio/1/atividades', json={
+        "atividade_desc": "Coleta de amostras para classificação", "situacao": "ABERTO"})
+    assert resposta.status_code == 201, resposta.get_json()
+    atividade = db.buscar_atividade_por_id(resposta.get_json()["id"])
+    for campo in ("testes_realizados", "observacao_resumo", "extensao_exames", "criterio_amostragem"):
+        assert atividade[campo] == ""
+
+def test_relatorio_nao_mostra_none_em_atividade_criada_por_json(cliente_admin):
+    resposta = cliente_admin.post('/relatorio/1/atividades', json={
+        "atividade_desc": "Coleta de amostras para classificação", "situacao": "ABERTO"})
+    assert resposta.status_code == 201
+    assert "None" not in cliente_admin.get('/relatorio/1').get_data(as_text=True)
@@ -0,0 +1,27 @@
+import database as db
+import importacao
+
+def test_normalizar_registros_converte_escalares():
+    registros = importacao.normalizar_registros([{"codigo": 28686, "senha": 123, "reincidente": True, "x": None}])
+    assert registros == [{"codigo": "28686", "senha": "123", "reincidente": "1", "x": ""}]
+
+def test_importar_usuarios_por_corpo_json_com_numeros(cliente_admin):
+    resposta = cliente_admin.post('/admin/usuarios/importar', json=[
+        {"codigo": 28686, "nome_completo": "Ana Souza", "senha": 123, "role": "Auditor"}])
+    assert resposta.status_code == 200, resposta.get_json()
+    assert resposta.get_json() == {"inseridos": 1, "erros": []}
+    assert db.verificar_login("28686", "123") is not None
+
+def test_importar_atividades_por_corpo_json_com_numeros(cliente_admin):
+    resposta = cliente_admin.post('/relatorio/1/atividades/importar', json=[
+        {"atividade_desc": "Coleta de amostras para classificação", "situacao": "ABERTO",
+         "reincidente": 1, "extensao_exames": 12}])
+    assert resposta.status_code == 200, resposta.get_json()
+    atividade = db.buscar_atividades_completas_por_caso_id(1)[-1]
+    assert (atividade["reincidente"], atividade["extensao_exames"]) == (1, "12")
+
+def test_importar_por_corpo_json_recusa_listas_e_objetos(cliente_admin):
+    resposta = cliente_admin.post('/admin/usuarios/importar', json=[
+        {"codigo": ["x"], "nome_completo": "B C", "senha": "s", "role": "Auditor"}])
+    assert resposta.status_code == 400
+    assert resposta.get_json()["erros"][0]["linha"] == 1
@@ -0,0 +1,70 @@
+"""
+Regras de validação compartilhadas entre os formulários e as importações em lote.
+Cada função devolve a lista de mensagens de erro (vazia quando os dados são válidos).
+"""
+from datetime import datetime
+import config
+
+# Formatos aceitos nas datas digitadas ou importadas; todas são gravadas como AAAA-MM-DD
+FORMATOS_DATA = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%d.%m.%Y"]
+
+def normalizar_data(valor):
+    """
+    Converte uma data em um dos FORMATOS_DATA (com ou sem horário depois de um espaço ou 'T')
+    para AAAA-MM-DD. Valores vazios viram None; lança ValueError se a data não for reconhecida.
+    """
+    if valor is None:
+        return None
+    texto = str(valor).strip().replace('T', ' ').split(' ')[0]
+    if not texto:
+        return None
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    raise ValueError(f"Data inválida: {valor}")
+
+def validar_atividade(dados):
+    """Valida a atividade e normaliza, em `dados`, as datas do período para AAAA-MM-DD."""
+    erros = []
+    if not dados.get('atividade_desc'):
+        erros.append("O campo 'Atividade' é obrigatório.")
+    if not dados.get('situacao'):
+        erros.append("O campo 'Situação da Atividade' é obrigatório.")
+    datas_validas = True
+    for campo, rotulo in (('periodo_inicio', 'De'), ('periodo_fim', 'Até')):
+        try:
+            dados[campo] = normalizar_data(dados.get(campo))
+        except ValueError:
+            datas_validas = False
+            erros.append(f"A data '{rotulo}' do período é inválida. Use AAAA-MM-DD ou DD/MM/AAAA.")
+    inicio = dados.get('periodo_inicio')
+    fim = dados.get('periodo_fim')
+    if datas_validas and inicio and fim and inicio > fim:
+        erros.append("A data 'De' do período não pode ser posterior à data 'Até'.")
+    return erros
+
+def gerar_username(nome):
+    """Gera o username 'primeiro.ultimo' a partir do nome completo."""
+    if not nome:
+        return ""
+    partes_nome = nome.lower().split()
+    primeiro_nome = partes_nome[0]
+    return f"{primeiro_nome}.{partes_nome[-1]}" if len(partes_nome) > 1 else primeiro_nome
+
+def preparar_usuario(codigo, nome, senha, role):
+    """
+    Normaliza os dados de um novo usuário como no formulário de criação e os valida.
+    Retorna (dados, erros), onde dados traz codigo, nome_completo, username, senha e role.
+    """
+    codigo = (codigo or '').strip().upper()
+    nome = (nome or '').strip().upper()
+    dados = {'codigo': codigo, 'nome_completo': nome, 'username': gerar_username(nome),
+             'senha': senha, 'role': role}
+    erros = []
+    if not all([codigo, nome, senha, role]):
+        erros.append('Todos os campos são obrigatórios.')
+    elif role not in config.LISTA_ROLES:
+        erros.append(f'Papel "{role}" inválido.')
+    return dados, erros